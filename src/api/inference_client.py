@@ -0,0 +1,300 @@
+"""
+Client of the inference host (`src.api.inference_host`).
+
+The API workers of the inference host mode hold no model: the embeddings
+model, the FAISS index, the scanners and the reranker are proxies forwarding
+their calls to the host over its Unix socket. Messages are JSON objects
+prefixed with their length, and a single connection per worker multiplexes
+the calls of all its threads, matched to their response by id.
+"""
+
+import itertools
+import json
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+from src.config import settings
+
+HEADER = struct.Struct("!I")
+
+
+class InferenceHostError(RuntimeError):
+    """A call failed on the inference host, or the host is unreachable."""
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Document):
+        return document_to_dict(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    data = json.dumps(message, default=_to_json).encode("utf-8")
+    return HEADER.pack(len(data)) + data
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Read a message, None if the connection was closed."""
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exactly(sock, HEADER.unpack(header)[0])
+    return None if data is None else json.loads(data)
+
+
+def document_to_dict(doc: Document) -> Dict[str, Any]:
+    return {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+
+
+def document_from_dict(data: Dict[str, Any]) -> Document:
+    return Document(**data)
+
+
+class InferenceClient:
+    """
+    Thread-safe client of the inference host.
+
+    Args:
+        path (str): Path of the Unix socket of the host.
+        timeout (float): Maximum time to wait for a response.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.INFERENCE_HOST_SOCKET,
+        timeout: float = settings.INFERENCE_HOST_TIMEOUT_SECONDS,
+    ):
+        self.path = path
+        self.timeout = timeout
+        self.description: Dict[str, Any] = {}
+        self._sock: Optional[socket.socket] = None
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def connect(
+        self, wait_seconds: float = settings.INFERENCE_HOST_CONNECT_TIMEOUT_SECONDS
+    ) -> "InferenceClient":
+        """
+        Connect to the host, waiting for it to listen (it only does once its
+        models are loaded), and read its description.
+
+        Raises:
+            InferenceHostError: If the host does not listen within
+                `wait_seconds`.
+        """
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            try:
+                with self._lock:
+                    self._open()
+                break
+            except OSError as e:
+                if time.monotonic() > deadline:
+                    raise InferenceHostError(
+                        f"No inference host listening on {self.path}."
+                    ) from e
+                time.sleep(0.5)
+        self.description = self.call("describe")
+        logger.info(f"Connected to the inference host on {self.path}.")
+        return self
+
+    def _open(self) -> socket.socket:
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            self._sock = sock
+            threading.Thread(
+                target=self._read_loop, args=(sock,), name="inference-host", daemon=True
+            ).start()
+        return self._sock
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        try:
+            while True:
+                message = read_message(sock)
+                if message is None:
+                    break
+                future = self._pending.pop(message["id"], None)
+                if future is None:
+                    continue
+                if "error" in message:
+                    future.set_exception(InferenceHostError(message["error"]))
+                else:
+                    future.set_result(message["result"])
+        except OSError:
+            pass
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            pending, self._pending = self._pending, {}
+        sock.close()
+        for future in pending.values():
+            future.set_exception(InferenceHostError("Inference host disconnected."))
+
+    def call(self, method: str, *args: Any) -> Any:
+        """
+        Call a method of the host.
+
+        Raises:
+            InferenceHostError: If the call failed or timed out.
+        """
+        future: Future = Future()
+        data_id = next(self._ids)
+        try:
+            with self._lock:
+                sock = self._open()
+                self._pending[data_id] = future
+                sock.sendall(
+                    encode_message({"id": data_id, "method": method, "args": args})
+                )
+        except OSError as e:
+            self._pending.pop(data_id, None)
+            raise InferenceHostError(f"Failed to call the inference host: {e}") from e
+        try:
+            return future.result(self.timeout)
+        except TimeoutError as e:
+            self._pending.pop(data_id, None)
+            raise InferenceHostError(f"Inference host call {method} timed out.") from e
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sock is not None:
+                self._sock.shutdown(socket.SHUT_RDWR)
+
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings model of the inference host."""
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.call("embed_documents", texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.call("embed_query", text)
+
+
+class _RemoteIndex:
+    def __init__(self, client: InferenceClient, d: int, ntotal: int):
+        self.client = client
+        self.d = d
+        self.ntotal = ntotal
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, positions = self.client.call("index_search", vectors, k)
+        return (
+            np.asarray(distances, dtype=np.float32).reshape(len(vectors), k),
+            np.asarray(positions, dtype=np.int64).reshape(len(vectors), k),
+        )
+
+
+class _RemoteDocstore:
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    def search(self, position: int) -> Document:
+        return document_from_dict(self.client.call("documents", [position])[0])
+
+
+class _Positions:
+    """Index positions stand for the document ids of the remote docstore."""
+
+    def __getitem__(self, position: int) -> int:
+        return int(position)
+
+
+class RemoteVectorStore:
+    """
+    FAISS vector store of the inference host, with the attributes read by
+    `search_positions`, `cosine_similarities` and the docstore lookups.
+    """
+
+    def __init__(self, client: InferenceClient):
+        from langchain_community.vectorstores.utils import DistanceStrategy
+
+        description = client.description
+        self.embeddings = RemoteEmbeddings(client)
+        self.index = _RemoteIndex(client, description["dimension"], description["size"])
+        self.docstore = _RemoteDocstore(client)
+        self.index_to_docstore_id = _Positions()
+        self.distance_strategy = DistanceStrategy(description["distance_strategy"])
+        self._normalize_L2 = description["normalize_L2"]
+
+
+class RemoteRetriever:
+    """Retriever of the inference host, which batches the concurrent calls."""
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+        self.vectorstore = RemoteVectorStore(client)
+        self.search_kwargs = {"k": client.description["k"]}
+
+    def batch_invoke(self, questions: List[str]) -> List[List[Document]]:
+        return [
+            [document_from_dict(doc) for doc in docs]
+            for docs in self.client.call("retrieve", questions)
+        ]
+
+    def invoke(self, question: str, *args, **kwargs) -> List[Document]:
+        return self.batch_invoke([question])[0]
+
+
+class RemoteScannerEngine:
+    """
+    Scanner engine of the inference host.
+
+    Args:
+        client (InferenceClient): The host client.
+        kind (str): "input" or "output".
+    """
+
+    def __init__(self, client: InferenceClient, kind: str):
+        self.client = client
+        self.kind = kind
+
+    def scan_prompt(self, prompt: str) -> Tuple[str, Dict[str, bool], Dict[str, float]]:
+        return tuple(self.client.call("scan_prompt", prompt))
+
+    def scan_output(
+        self, prompt: str, output: str
+    ) -> Tuple[str, Dict[str, bool], Dict[str, float]]:
+        return tuple(self.client.call("scan_output", prompt, output))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return self.client.call("scanner_stats", self.kind)
+
+
+class RemoteReranker:
+    """Cross-encoder reranker of the inference host."""
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    def score(self, question: str, docs: List[Dict[str, Any]]) -> List[float]:
+        return self.client.call("rerank", question, docs)
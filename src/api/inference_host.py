@@ -0,0 +1,227 @@
+"""
+Inference host: the process owning the models of the API workers.
+
+In the inference host mode (`settings.INFERENCE_HOST_ENABLED`), a single
+process loads the FAISS index, the embeddings model, the scanners and the
+reranker, and the API workers call it over a Unix socket
+(`src.api.inference_client`). Adding workers then adds HTTP concurrency
+without one more copy of the model weights and the index.
+
+The calls of all the workers meet in the host, where concurrent retrievals,
+index searches and query embeddings are micro-batched with a
+`BatchingPipeline`, like the transformers pipelines of the scanner engines.
+
+Usage:
+    python -m src.api.inference_host
+"""
+
+import asyncio
+import json
+import os
+import signal
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from src.api.inference_client import HEADER, document_to_dict, encode_message
+from src.config import settings
+from src.graph.scanner_engine import BatchingPipeline, ScannerEngine
+from src.graph.utils import batch_similarity_search
+
+
+class InferenceHost:
+    """
+    Serve the models of a model `Startup` to the API workers.
+
+    Args:
+        startup (Startup): The components with the models, see
+            `src.api.startup.create_model_startup`.
+        max_batch_size (int): Maximum number of inputs per batch.
+        max_wait_ms (float): Maximum time to wait for a batch to fill up.
+    """
+
+    def __init__(
+        self,
+        startup,
+        max_batch_size: int = settings.INFERENCE_HOST_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.INFERENCE_HOST_MAX_WAIT_MS,
+    ):
+        self.startup = startup
+        self.retriever = startup.get("retriever")
+        self.vectorstore = self.retriever.vectorstore
+        self.embeddings = self.vectorstore.embeddings
+        self.input_scanners = ScannerEngine.of(startup.get("input_scanners"))
+        self.output_scanners = ScannerEngine.of(startup.get("output_scanners"))
+        self.reranker = (
+            startup.get("reranker") if "reranker" in startup.components else None
+        )
+        self._retrieve = BatchingPipeline(
+            self._retrieve_batch, max_batch_size, max_wait_ms
+        )
+        self._search = BatchingPipeline(self._search_batch, max_batch_size, max_wait_ms)
+        self._embed_query = BatchingPipeline(
+            self._embed_query_batch, max_batch_size, max_wait_ms
+        )
+        # Requests wait on the batching pipelines, so many are in flight
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.INFERENCE_HOST_THREADS,
+            thread_name_prefix="inference-host",
+        )
+        self.methods: Dict[str, Callable[..., Any]] = {
+            "describe": self.describe,
+            "embed_query": self.embed_query,
+            "embed_documents": self.embeddings.embed_documents,
+            "index_search": self.index_search,
+            "documents": self.documents,
+            "retrieve": self.retrieve,
+            "scan_prompt": self.input_scanners.scan_prompt,
+            "scan_output": self.output_scanners.scan_output,
+            "scanner_stats": self.scanner_stats,
+            "rerank": self.rerank,
+            "status": self.status,
+        }
+
+    def _retrieve_batch(self, questions: List[str], **kwargs) -> list:
+        k = self.retriever.k
+        if hasattr(self.retriever.retriever, "batch_invoke"):
+            results = self.retriever.retriever.batch_invoke(questions)
+        else:
+            results = [
+                [doc for doc, _ in docs_and_scores]
+                for docs_and_scores in batch_similarity_search(
+                    self.vectorstore, questions, k
+                )
+            ]
+        return [[document_to_dict(doc) for doc in docs] for docs in results]
+
+    def _search_batch(self, vectors: List[List[float]], k: int, **kwargs) -> list:
+        distances, positions = self.vectorstore.index.search(
+            np.asarray(vectors, dtype=np.float32), k
+        )
+        return list(zip(distances.tolist(), positions.tolist()))
+
+    def _embed_query_batch(self, texts: List[str], **kwargs) -> list:
+        if hasattr(self.embeddings, "embed_queries"):
+            return self.embeddings.embed_queries(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def describe(self) -> Dict[str, Any]:
+        """Attributes of the index read by the proxies of the workers."""
+        return {
+            "dimension": self.vectorstore.index.d,
+            "size": self.vectorstore.index.ntotal,
+            "distance_strategy": self.vectorstore.distance_strategy.value,
+            "normalize_L2": self.vectorstore._normalize_L2,
+            "k": self.retriever.k,
+        }
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_query([text])[0]
+
+    def index_search(self, vectors: List[List[float]], k: int) -> List[list]:
+        rows = self._search(vectors, k=k)
+        return [[row[0] for row in rows], [row[1] for row in rows]]
+
+    def documents(self, positions: List[int]) -> List[Dict[str, Any]]:
+        docstore = self.vectorstore.docstore
+        ids = self.vectorstore.index_to_docstore_id
+        return [document_to_dict(docstore.search(ids[p])) for p in positions]
+
+    def retrieve(self, questions: List[str]) -> list:
+        return self._retrieve(questions)
+
+    def scanner_stats(self, kind: str) -> Dict[str, Dict[str, float]]:
+        engine = self.input_scanners if kind == "input" else self.output_scanners
+        return engine.stats()
+
+    def rerank(self, question: str, docs: List[Dict[str, Any]]) -> List[float]:
+        if self.reranker is None:
+            raise RuntimeError("Reranking is not enabled on the inference host.")
+        return self.reranker.score(question, docs)
+
+    def status(self) -> Dict[str, Any]:
+        return self.startup.status()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer) -> None:
+        loop = asyncio.get_running_loop()
+
+        async def respond(message: Dict[str, Any]) -> None:
+            response: Dict[str, Any] = {"id": message["id"]}
+            try:
+                method = self.methods.get(message["method"])
+                if method is None:
+                    raise ValueError(f"Unknown method {message['method']}.")
+                response["result"] = await loop.run_in_executor(
+                    self._executor, method, *message["args"]
+                )
+            except Exception as e:
+                logger.exception(f"Inference host call {message['method']} failed.")
+                response["error"] = repr(e)
+            writer.write(encode_message(response))
+            await writer.drain()
+
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                data = await reader.readexactly(HEADER.unpack(header)[0])
+                task = asyncio.create_task(respond(json.loads(data)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, path: str = settings.INFERENCE_HOST_SOCKET) -> None:
+        """Serve the workers on a Unix socket until cancelled."""
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._handle, path=path)
+        # Stop serving (and remove the socket) on SIGTERM
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, asyncio.current_task().cancel
+        )
+        # Only the user running the API may call the host
+        os.chmod(path, 0o600)
+        logger.info(f"Inference host listening on {path}.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def run_host(
+    path: str = settings.INFERENCE_HOST_SOCKET,
+    listening: Optional[socket.socket] = None,
+) -> None:
+    """
+    Load and warm up the models, then serve them on `path`.
+
+    Args:
+        path (str): Path of the Unix socket.
+        listening (Optional[socket.socket]): Socket of the parent to close, when
+            run in a process forked by `src.api.serve`.
+    """
+    from src.api.startup import create_model_startup
+
+    if listening is not None:
+        listening.close()
+    startup = create_model_startup()
+    startup.warm_up()
+    host = InferenceHost(startup)
+    try:
+        asyncio.run(host.serve(path))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Inference host stopped.")
+
+
+if __name__ == "__main__":
+    run_host()
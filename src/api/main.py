@@ -2,20 +2,34 @@
 This module contains the FastAPI application that serves the RAG Graph API.
 """
 
+import asyncio
 import os
+import time
 import warnings
 from contextlib import asynccontextmanager
+from typing import List
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from llm_guard.input_scanners import PromptInjection, TokenLimit, Toxicity
 from loguru import logger
 from pydantic import BaseModel
 from starlette.responses import FileResponse
 
-from src.graph.graph import create_workflow
-from src.graph.utils import load_faiss_index
+from src.api.startup import startup
+from src.api.streaming import stream_answer_events
+from src.config import settings
+from src.graph.admission import Overloaded, admit, request_scope
+from src.graph.batch import abatch_answer
+from src.graph.executor import shutdown_cpu_executor
+from src.graph.llm import llm_registry
+from src.graph.metrics import (
+    ADMISSIONS,
+    REQUEST_DURATION,
+    registry,
+    server_timing,
+    trace_request,
+)
 
 warnings.filterwarnings("ignore")
 
@@ -24,36 +38,73 @@ class Question(BaseModel):
     question: str
 
 
-# create empty dictionnary to store the embdeddings and the faiss index
+class Questions(BaseModel):
+    questions: List[str]
 
-api_context = {}
+
+def _component(name: str):
+    """
+    Get a loaded and warm component of the API.
+
+    Raises:
+        HTTPException: 503 while the component is loading in the background.
+    """
+    component = startup.components.get(name)
+    if component is None or component.state != "ready":
+        raise HTTPException(
+            status_code=503,
+            detail="The models are loading, retry later.",
+            headers={"Retry-After": "5"},
+        )
+    return component.value
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    """Reject a request finding a downstream without capacity left."""
+    logger.warning(str(e))
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _admit() -> bool:
+    """
+    Admit a new request, returning whether it runs in the degraded mode.
+
+    Raises:
+        HTTPException: 429 if the LLM queue is full.
+    """
+    try:
+        return admit()
+    except Overloaded as e:
+        raise _overloaded(e)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Async context manager to handle the lifespan events of the FastAPI application."""
-    try:
-        # Load the FAISS index
-        faisss_index = load_faiss_index()
-        input_scanners = [
-            PromptInjection(),
-            TokenLimit(),
-            Toxicity(),
-        ]
-        # Create the workflow
-        logger.info("Creating the workflow...")
-        api_context["workflow"] = create_workflow(
-            faisss_index, input_scanners
-        ).compile()
-        yield
-    except Exception:
-        logger.exception("Failed to load FAISS index and create the workflow.")
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to load FAISS index and create the workflow.",
-        )
-    del faisss_index
-    del api_context["workflow"]
+    # Build the pooled LLM clients once for the lifetime of the app
+    llm_registry.warmup()
+    if settings.STARTUP_WARMUP == "background":
+        logger.info("Loading the models in the background...")
+        startup.warm_up_in_background()
+    else:
+        try:
+            logger.info("Loading the models and creating the workflow...")
+            startup.warm_up()
+        except RuntimeError:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to load FAISS index and create the workflow.",
+            )
+    yield
+    semantic_cache = startup.components.get("semantic_cache")
+    if semantic_cache is not None and semantic_cache.value is not None:
+        semantic_cache.value.save()
+    shutdown_cpu_executor()
+    await llm_registry.aclose()
     logger.info("Workflow deleted.")
 
 
@@ -73,22 +124,59 @@ def read_root():
 
 
 @app.post("/answer")
-async def answer(question: Question):
+async def answer(question: Question, request: Request):
     """
     Answer the question.
 
+    With the `settings.METRICS_TRACE_HEADER` request header set, the duration
+    of each stage is returned in the `Server-Timing` response header.
+
+    The request is rejected with a 429 or 503 (and a Retry-After header) when
+    the LLM or the scanners have no capacity left, see `src.graph.admission`,
+    and its workflow is cancelled after
+    `settings.ADMISSION_REQUEST_TIMEOUT_SECONDS` (504). Requests answered in
+    the degraded mode have the `X-Degraded` response header.
+
     Args:
         question (Question): The question.
 
     Returns:
         JSONResponse: The response.
     """
+    graph = _component("workflow")
+    degraded = _admit()
+    timeout = settings.ADMISSION_REQUEST_TIMEOUT_SECONDS or None
     try:
         # Run the workflow
-        graph = api_context["workflow"]
-        state = graph.invoke({"question": question.question})
-        logger.info(f"Response: {state}")
-        return JSONResponse(content=state)
+        start = time.perf_counter()
+        with trace_request() as trace, request_scope(timeout, degraded):
+            state = await asyncio.wait_for(
+                graph.ainvoke({"question": question.question}), timeout
+            )
+        elapsed = time.perf_counter() - start
+        REQUEST_DURATION.observe(elapsed, "/answer")
+        logger.info(
+            f"Answered in {elapsed * 1000:.0f} ms: "
+            f"question {state.get('question_status')}, "
+            f"on topic {state.get('on_topic')}, "
+            f"answer {state.get('answer_status')} "
+            f"({state.get('answer_path')}{', degraded' if degraded else ''})"
+        )
+        headers = {}
+        if request.headers.get(settings.METRICS_TRACE_HEADER):
+            headers["Server-Timing"] = server_timing(trace, elapsed)
+        if degraded:
+            headers["X-Degraded"] = "true"
+        return JSONResponse(content=state, headers=headers)
+    except Overloaded as e:
+        raise _overloaded(e)
+    except asyncio.TimeoutError:
+        ADMISSIONS.inc("request", "timeout")
+        logger.warning(f"Cancelled the workflow after {timeout} s.")
+        raise HTTPException(
+            status_code=504,
+            detail="Answering the question took too long.",
+        )
     except Exception:
         logger.exception("Failed to answer the question.")
         raise HTTPException(
@@ -97,6 +185,100 @@ async def answer(question: Question):
         )
 
 
+@app.post("/answer/batch")
+async def answer_batch(questions: Questions):
+    """
+    Answer many questions in one call.
+
+    The retrieval of all the questions is batched, and the questions run
+    through the workflow with bounded concurrency.
+
+    The batch is admitted like an `/answer` request, and is rejected (429 or
+    503) if any question finds no capacity left. The timeout of `/answer`
+    applies to each question: a question running longer gets a timeout error
+    in its result, the others are answered.
+
+    Args:
+        questions (Questions): The questions.
+
+    Returns:
+        JSONResponse: The final state of each question, in order.
+    """
+    graph = _component("workflow")
+    degraded = _admit()
+    results = [None] * len(questions.questions)
+    try:
+        start = time.perf_counter()
+        async for idx, state in abatch_answer(
+            graph,
+            _component("retriever"),
+            questions.questions,
+            raise_overloaded=True,
+            timeout=settings.ADMISSION_REQUEST_TIMEOUT_SECONDS or None,
+            degraded=degraded,
+        ):
+            results[idx] = state
+        REQUEST_DURATION.observe(time.perf_counter() - start, "/answer/batch")
+        headers = {"X-Degraded": "true"} if degraded else {}
+        return JSONResponse(content={"results": results}, headers=headers)
+    except Overloaded as e:
+        raise _overloaded(e)
+    except Exception:
+        logger.exception("Failed to answer the questions.")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to answer the questions.",
+        )
+
+
+@app.post("/answer/stream")
+async def answer_stream(question: Question):
+    """
+    Answer the question, streaming the progress of the workflow and the answer
+    tokens as Server-Sent Events.
+
+    Args:
+        question (Question): The question.
+
+    Returns:
+        StreamingResponse: The event stream.
+    """
+    graph = _component("workflow")
+    degraded = _admit()
+    return StreamingResponse(
+        stream_answer_events(graph, question.question, degraded),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Get the semantic cache counters."""
+    if "semantic_cache" not in startup.components:
+        return JSONResponse(content={"enabled": False})
+    semantic_cache = _component("semantic_cache")
+    return JSONResponse(content={"enabled": True, **semantic_cache.stats()})
+
+
+@app.get("/metrics")
+def metrics():
+    """Get the metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/health")
 def health():
     return JSONResponse(content={"status": "ok"})
+
+
+@app.get("/ready")
+def ready():
+    """
+    Get the loading state of each model and of the workflow, with a 503 status
+    until they are all loaded and warm.
+    """
+    status = startup.status()
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
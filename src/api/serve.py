@@ -0,0 +1,166 @@
+"""
+Pre-forking server of the API.
+
+The parent process imports the application and loads the models, then forks
+the workers, which share the model weights and the index copy-on-write instead
+of loading one copy each (`uvicorn --workers` spawns fresh interpreters that
+load everything again). Each worker warms the models up and creates the
+workflow, its thread pools and the HTTP clients after the fork, in its
+lifespan. The semantic cache is per worker too, loaded after the fork from
+(and saved to) a directory of its own under `settings.SEMANTIC_CACHE_PATH`.
+
+The workers accept the connections on a socket bound by the parent. A
+SIGINT/SIGTERM to the parent stops the workers.
+
+In the inference host mode (`settings.INFERENCE_HOST_ENABLED`), the parent
+forks the inference host first, which loads the models once for all the
+workers, and nothing is preloaded: the workers only hold proxies of the
+models, connected to the host after the fork.
+
+Usage:
+    python -m src.api.serve --workers 4
+    python -m src.api.serve --workers 4 --no-preload
+    INFERENCE_HOST_ENABLED=true python -m src.api.serve --workers 8
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+from typing import Callable, List
+
+from loguru import logger
+
+from src.config import settings
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, index: int) -> None:
+    import uvicorn
+
+    if settings.SEMANTIC_CACHE_PATH:
+        # Each worker has its own semantic cache, persisted in its own directory
+        settings.SEMANTIC_CACHE_PATH = os.path.join(
+            settings.SEMANTIC_CACHE_PATH, f"worker-{index}"
+        )
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def _fork(target: Callable[[], None], name: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            target()
+        except BaseException:
+            logger.exception(f"{name} failed.")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def _stop(pids: List[int]) -> None:
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def _wait(pids: List[int]) -> int:
+    """Wait for the workers, returning the first non-zero exit status."""
+    status = 0
+    for pid in pids:
+        try:
+            _, code = os.waitpid(pid, 0)
+        except ChildProcessError:
+            continue
+        if code and not status:
+            status = os.waitstatus_to_exitcode(code)
+    return status
+
+
+def serve(
+    host: str = settings.SERVE_HOST,
+    port: int = settings.SERVE_PORT,
+    workers: int = settings.SERVE_WORKERS,
+    preload: bool = settings.SERVE_PRELOAD,
+) -> int:
+    """
+    Serve the API with `workers` processes forked from this one.
+
+    Args:
+        host (str): Address to bind.
+        port (int): Port to bind.
+        workers (int): Number of worker processes.
+        preload (bool): Load the models before forking the workers.
+
+    Returns:
+        int: The exit status.
+    """
+    sock = _bind(host, port)
+    host_pids = []
+    if settings.INFERENCE_HOST_ENABLED:
+        from src.api.inference_host import run_host
+
+        host_pids.append(_fork(lambda: run_host(listening=sock), "Inference host"))
+        preload = False
+    from src.api.main import app
+    from src.api.startup import startup
+
+    if preload:
+        startup.preload()
+    # Move the objects created so far out of the collected generations, so
+    # that the garbage collector of the workers does not write to (and copy)
+    # the pages they share with the parent
+    gc.freeze()
+
+    pids = [
+        _fork(lambda i=i: _run_worker(app, sock, i), "Worker") for i in range(workers)
+    ]
+    logger.info(f"Serving on http://{host}:{port} with {workers} workers {pids}.")
+
+    def stop(signum, frame):
+        _stop(pids)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    status = _wait(pids)
+    sock.close()
+    # The host serves the workers until they are all gone
+    _stop(host_pids)
+    _wait(host_pids)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with forked workers.")
+    parser.add_argument("--host", default=settings.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS)
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=settings.SERVE_PRELOAD,
+    )
+    args = parser.parse_args()
+    sys.exit(serve(args.host, args.port, args.workers, args.preload))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Model loading and readiness of the API.
+
+The models and the workflow are components loaded on first use, each one
+reporting its state on `/ready`:
+
+    pending -> loading -> loaded -> warming -> ready (or failed)
+
+Loading builds the model, warming up runs one inference on it (if
+`settings.STARTUP_WARMUP_INFERENCE`) so that the first request does not pay
+the lazy initializations of the runtime. `preload` only loads: it runs in the
+parent process of `src.api.serve` before the workers are forked, and starting
+the PyTorch/ONNX Runtime thread pools there would not survive the fork.
+
+In the inference host mode (`settings.INFERENCE_HOST_ENABLED`), the models are
+loaded by the host process (`create_model_startup`) and the API components
+are proxies calling it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from src.config import settings
+
+WARMUP_QUESTION = "How can I cancel my order?"
+WARMUP_ANSWER = "You can cancel your order from the Order History page."
+
+
+class Component:
+    """
+    A model or object loaded once and shared by the requests.
+
+    Args:
+        name (str): Name reported by `/ready`.
+        load (Callable[[], Any]): Function creating the component.
+        warm (Optional[Callable[[Any], None]]): Function running one inference
+            on the component.
+        preload (bool): Whether the component can be loaded before a fork.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        load: Callable[[], Any],
+        warm: Optional[Callable[[Any], None]] = None,
+        preload: bool = True,
+    ):
+        self.name = name
+        self._load = load
+        self._warm = warm
+        self.preload = preload
+        self.state = "pending"
+        self.value: Any = None
+        self.error: Optional[str] = None
+        self.seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, warm: bool = True) -> Any:
+        """
+        Get the component, loading (and warming up) it on first use.
+
+        Raises:
+            RuntimeError: If the component failed to load.
+        """
+        if self.state == "ready" or (self.state == "loaded" and not warm):
+            return self.value
+        with self._lock:
+            if self.state == "failed":
+                raise RuntimeError(f"{self.name} failed to load: {self.error}")
+            try:
+                if self.state == "pending":
+                    self.state = "loading"
+                    start = time.perf_counter()
+                    self.value = self._load()
+                    self.seconds["load"] = time.perf_counter() - start
+                    self.state = "loaded"
+                if warm and self.state == "loaded":
+                    self.state = "warming"
+                    start = time.perf_counter()
+                    if self._warm is not None and settings.STARTUP_WARMUP_INFERENCE:
+                        self._warm(self.value)
+                    self.seconds["warm"] = time.perf_counter() - start
+                    self.state = "ready"
+            except Exception as e:
+                self.state = "failed"
+                self.error = repr(e)
+                logger.exception(f"Failed to load {self.name}.")
+                raise RuntimeError(f"{self.name} failed to load: {self.error}") from e
+        return self.value
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"state": self.state}
+        status.update({f"{step}_s": round(s, 3) for step, s in self.seconds.items()})
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+
+class Startup:
+    """Components of the API, loaded in registration order."""
+
+    def __init__(self):
+        self.components: Dict[str, Component] = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(
+        self,
+        name: str,
+        load: Callable[[], Any],
+        warm: Optional[Callable[[Any], None]] = None,
+        preload: bool = True,
+    ) -> None:
+        self.components[name] = Component(name, load, warm, preload)
+
+    def get(self, name: str, warm: bool = True) -> Any:
+        return self.components[name].get(warm)
+
+    def preload(self) -> None:
+        """Load the components that can be shared with forked processes."""
+        start = time.perf_counter()
+        for component in self.components.values():
+            if component.preload:
+                component.get(warm=False)
+        logger.info(f"Preloaded in {time.perf_counter() - start:.1f} s.")
+
+    def warm_up(self) -> None:
+        """Load and warm up all the components."""
+        start = time.perf_counter()
+        for component in self.components.values():
+            component.get()
+        logger.info(f"Warmed up in {time.perf_counter() - start:.1f} s.")
+
+    def warm_up_in_background(self) -> threading.Thread:
+        """Load and warm up all the components in a daemon thread."""
+
+        def run():
+            try:
+                self.warm_up()
+            except RuntimeError:
+                pass
+
+        self._thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    @property
+    def ready(self) -> bool:
+        return all(c.state == "ready" for c in self.components.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "components": {
+                name: component.status() for name, component in self.components.items()
+            },
+        }
+
+
+def _warm_embeddings(embeddings) -> None:
+    embeddings.embed_query(WARMUP_QUESTION)
+
+
+def _warm_input_scanners(scanners) -> None:
+    from llm_guard import scan_prompt
+
+    scan_prompt(scanners, WARMUP_QUESTION, fail_fast=False)
+
+
+def _warm_output_scanners(scanners) -> None:
+    from llm_guard import scan_output
+
+    scan_output(scanners, WARMUP_QUESTION, WARMUP_ANSWER, fail_fast=False)
+
+
+def _warm_reranker(reranker) -> None:
+    reranker.score(WARMUP_QUESTION, [{"question": WARMUP_QUESTION, "answer": ""}])
+
+
+def add_model_components(startup: Startup) -> None:
+    """
+    Register the models: the embeddings model, the FAISS index, the scanners
+    and the reranker.
+    """
+    from src.embeddings import CachedEmbeddings, shared_embeddings_model
+    from src.graph.answer_check_node import default_output_scanners
+    from src.graph.batch import PrefetchingRetriever
+    from src.graph.metrics import register_cache
+    from src.graph.question_check_node import default_input_scanners
+    from src.graph.utils import load_faiss_index
+
+    def load_embeddings():
+        embeddings = shared_embeddings_model()
+        if isinstance(embeddings, CachedEmbeddings):
+            register_cache("embeddings", embeddings)
+        return embeddings
+
+    startup.add("embeddings", load_embeddings, _warm_embeddings)
+    startup.add(
+        "retriever",
+        lambda: PrefetchingRetriever(load_faiss_index()),
+        lambda retriever: retriever.invoke(WARMUP_QUESTION),
+    )
+    startup.add("input_scanners", default_input_scanners, _warm_input_scanners)
+    startup.add("output_scanners", default_output_scanners, _warm_output_scanners)
+    if settings.RERANK_ENABLED:
+        from src.graph.rerank_node import Reranker
+
+        startup.add("reranker", Reranker, _warm_reranker)
+
+
+def add_remote_components(startup: Startup) -> None:
+    """
+    Register proxies of the models of the inference host in place of the
+    models. The connection and its reader thread do not survive a fork, so
+    they are not preloaded.
+    """
+    from src.api import inference_client as remote
+    from src.graph.batch import PrefetchingRetriever
+
+    def client() -> "remote.InferenceClient":
+        return startup.get("inference_host")
+
+    startup.add(
+        "inference_host",
+        lambda: remote.InferenceClient().connect(),
+        lambda client: client.call("status"),
+        preload=False,
+    )
+    startup.add(
+        "retriever",
+        lambda: PrefetchingRetriever(remote.RemoteRetriever(client())),
+        preload=False,
+    )
+    startup.add(
+        "input_scanners",
+        lambda: remote.RemoteScannerEngine(client(), "input"),
+        preload=False,
+    )
+    startup.add(
+        "output_scanners",
+        lambda: remote.RemoteScannerEngine(client(), "output"),
+        preload=False,
+    )
+    if settings.RERANK_ENABLED:
+        startup.add("reranker", lambda: remote.RemoteReranker(client()), preload=False)
+
+
+def create_model_startup() -> Startup:
+    """Register the models only, for the inference host."""
+    startup = Startup()
+    add_model_components(startup)
+    return startup
+
+
+def create_startup() -> Startup:
+    """
+    Register the components of the API: the models first (or their proxies,
+    in the inference host mode), then the workflow built on them.
+    """
+    from src.graph.metrics import register_cache
+
+    startup = Startup()
+    if settings.INFERENCE_HOST_ENABLED:
+        add_remote_components(startup)
+    else:
+        add_model_components(startup)
+    if settings.SEMANTIC_CACHE_ENABLED:
+        from src.graph.semantic_cache import SemanticCache
+
+        def load_semantic_cache():
+            # Same embeddings model as the FAISS index
+            semantic_cache = SemanticCache(
+                startup.get("retriever", warm=False).vectorstore.embeddings,
+                path=settings.SEMANTIC_CACHE_PATH,
+            )
+            register_cache("semantic", semantic_cache)
+            return semantic_cache
+
+        # Each forked worker loads and persists its own cache, see src.api.serve
+        startup.add("semantic_cache", load_semantic_cache, preload=False)
+
+    def create_app_workflow():
+        from src.graph.graph import create_workflow
+
+        return create_workflow(
+            startup.get("retriever"),
+            startup.get("input_scanners"),
+            startup.get("output_scanners"),
+            semantic_cache=(
+                startup.get("semantic_cache")
+                if settings.SEMANTIC_CACHE_ENABLED
+                else None
+            ),
+            reranker=startup.get("reranker") if settings.RERANK_ENABLED else None,
+        ).compile()
+
+    # Its scanner engines start threads, which do not survive a fork
+    startup.add("workflow", create_app_workflow, preload=False)
+    return startup
+
+
+# Components of the API process, shared with the workers forked after preload
+startup = create_startup()
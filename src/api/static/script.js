@@ -1,3 +1,41 @@
+const PROGRESS_LABELS = {
+    scan_question: "Checking your question...",
+    cache_lookup: "Looking for a known answer...",
+    topic_classifier: "Understanding your request...",
+    retrieve_docs: "Searching the knowledge base...",
+    join_gates: "Checking your request...",
+    direct_answer: "Looking for a known answer...",
+    rerank_docs: "Ranking the articles...",
+    docs_grader: "Selecting relevant articles...",
+};
+
+// Parse a Server-Sent Events stream and call onEvent(event, data) for each event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = "message";
+            let data = "";
+            for (const line of rawEvent.split("\n")) {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
 document.getElementById("chat-form").addEventListener("submit", async (e) => {
     e.preventDefault();
 
@@ -16,15 +54,22 @@ document.getElementById("chat-form").addEventListener("submit", async (e) => {
     userMessage.style.color = "#1976d2"; // Blue for user messages
     responseContainer.appendChild(userMessage);
 
-    // Add a loading spinner
-    const loadingMessage = document.createElement("p");
-    loadingMessage.textContent = "Bot: Thinking...";
-    loadingMessage.style.color = "#888";
-    responseContainer.appendChild(loadingMessage);
+    // Bot message, updated with progress and then with the streamed answer
+    const botMessage = document.createElement("p");
+    botMessage.textContent = "Bot: Thinking...";
+    botMessage.style.color = "#888";
+    responseContainer.appendChild(botMessage);
+
+    let answer = "";
+    const showAnswer = (text, color = "#333") => {
+        botMessage.textContent = `Bot: ${text}`;
+        botMessage.style.color = color;
+        responseContainer.scrollTop = responseContainer.scrollHeight;
+    };
 
     try {
-        // Send question to the FastAPI backend
-        const response = await fetch("/answer", {
+        // Send question to the FastAPI backend and stream the answer
+        const response = await fetch("/answer/stream", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -36,27 +81,29 @@ document.getElementById("chat-form").addEventListener("submit", async (e) => {
             throw new Error("Failed to get a response from the chatbot.");
         }
 
-        const data = await response.json();
-
-        // Remove the loading message
-        responseContainer.removeChild(loadingMessage);
-
-        // Add chatbot's response to the response container
-        const botMessage = document.createElement("p");
-        botMessage.textContent = `Bot: ${data.llm_output || data.message}`;
-        botMessage.style.color = "#333";
-        responseContainer.appendChild(botMessage);
+        await readEventStream(response, (event, data) => {
+            if (event === "progress" && !answer && PROGRESS_LABELS[data.node]) {
+                showAnswer(PROGRESS_LABELS[data.node], "#888");
+            } else if (event === "token") {
+                answer += data.token;
+                showAnswer(answer);
+            } else if (event === "retract") {
+                answer = data.llm_output;
+                showAnswer(answer);
+            } else if (event === "answer") {
+                showAnswer(data.llm_output || data.message);
+            } else if (event === "error") {
+                throw new Error(data.detail);
+            }
+        });
     } catch (error) {
         console.error(error);
 
-        // Remove the loading message
-        responseContainer.removeChild(loadingMessage);
-
         // Display error message
-        const errorMessage = document.createElement("p");
-        errorMessage.textContent = "Bot: Sorry, I'm having trouble answering your question. Please try again later.";
-        errorMessage.style.color = "#ff0000";
-        responseContainer.appendChild(errorMessage);
+        showAnswer(
+            "Sorry, I'm having trouble answering your question. Please try again later.",
+            "#ff0000"
+        );
     }
 
     // Scroll to the bottom of the response container
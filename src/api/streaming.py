@@ -0,0 +1,80 @@
+"""
+Server-Sent Events streaming of the workflow progress and answer tokens.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict
+
+from loguru import logger
+
+from src.config import settings
+from src.graph.admission import Overloaded, request_scope
+
+# Node streaming the answer tokens
+ANSWER_NODE = "generate_answer"
+
+RETRACTED_ANSWER = (
+    "Sorry, I could not produce a reliable answer to your question. "
+    "Please rephrase it or contact our support team."
+)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_answer_events(
+    graph, question: str, degraded: bool = False
+) -> AsyncIterator[str]:
+    """
+    Run the workflow and stream its events.
+
+    Events:
+        progress: a node finished, `{"node": ...}`
+        token: an answer token from the answer node, `{"token": ...}`
+        retract: the streamed answer failed the output scanners and must be
+            replaced, `{"llm_output": ...}`
+        answer: the final state, sent last
+        error: the workflow failed, `{"detail": ...}`, with the `retry_after`
+            seconds if a downstream had no capacity left for the request
+
+    Output scanning runs as a final gate: tokens are sent as soon as they are
+    generated, and a `retract` event follows if `check_answer` rejects them.
+
+    Args:
+        graph: The compiled workflow.
+        question (str): The user question.
+        degraded (bool): Run the request in the degraded mode, see
+            `src.graph.admission`.
+    """
+    state: Dict[str, Any] = {"question": question}
+    # The tokens keep the stream busy, the timeout only bounds the waits for
+    # the downstreams
+    timeout = settings.ADMISSION_REQUEST_TIMEOUT_SECONDS or None
+    try:
+        with request_scope(timeout, degraded):
+            async for mode, chunk in graph.astream(
+                {"question": question}, stream_mode=["updates", "messages"]
+            ):
+                if mode == "messages":
+                    message, metadata = chunk
+                    node = metadata.get("langgraph_node")
+                    if node == ANSWER_NODE and message.content:
+                        yield format_sse("token", {"token": message.content})
+                    continue
+                for node, update in chunk.items():
+                    if update:
+                        state.update(update)
+                    yield format_sse("progress", {"node": node})
+
+        if state.get("answer_status") == "invalid":
+            state["llm_output"] = RETRACTED_ANSWER
+            yield format_sse("retract", {"llm_output": RETRACTED_ANSWER})
+        yield format_sse("answer", state)
+    except Overloaded as e:
+        logger.warning(str(e))
+        yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+    except Exception:
+        logger.exception("Failed to stream the answer.")
+        yield format_sse("error", {"detail": "Failed to answer the question."})
@@ -0,0 +1,147 @@
+"""
+Load test of the admission control of /answer against a stub LLM.
+
+The API answers with a workflow built on stub scanners, a small FAISS index
+of the stub documents with stub embeddings, and the fake LLM server, which
+generates `--llm-concurrency` completions at a time like a single Ollama
+backend. Requests arrive at a fixed rate above the capacity of the backend
+(open loop) and go through the API in process, with admission control off,
+on, and on with the degraded mode. A fraction of the questions are indexed
+questions, answered directly without the LLM.
+
+Reports the status codes, the latency percentiles of the answered requests
+and the p99 latency of all the responses, rejections included.
+
+Usage:
+    python -m src.benchmarks.admission_load --rate 40 --duration 10
+    python -m src.benchmarks.admission_load --llm-latency-ms 500 --llm-concurrency 2
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+
+from src.benchmarks.fake_llm_server import FakeLLMServer
+from src.benchmarks.stubs import STUB_DOCUMENTS, serve_workflow, stub_workflow
+from src.config import settings
+
+
+def configure(mode: str, args) -> None:
+    """Set the admission control of the API for a mode: off, on or degraded."""
+    from src.graph.admission import LLM, SCANNERS, Limiter, limiters
+
+    limiters.clear()
+    settings.ADMISSION_REQUEST_TIMEOUT_SECONDS = 0
+    settings.ADMISSION_DEGRADED_MODE = mode == "degraded"
+    if mode == "off":
+        return
+    settings.ADMISSION_REQUEST_TIMEOUT_SECONDS = args.request_timeout
+    limiters[LLM] = Limiter(
+        LLM, args.llm_max_in_flight, args.llm_max_queue, args.queue_timeout
+    )
+    limiters[SCANNERS] = Limiter(
+        SCANNERS,
+        settings.ADMISSION_SCANNERS_MAX_IN_FLIGHT,
+        settings.ADMISSION_SCANNERS_MAX_QUEUE,
+        args.queue_timeout,
+    )
+
+
+async def run_load(
+    client, rate: float, duration: float, direct_fraction: float
+) -> List[Tuple[int, float]]:
+    """
+    Send questions at `rate` per second for `duration` seconds.
+
+    Returns:
+        List[Tuple[int, float]]: The status code and latency of each request.
+    """
+    rng = np.random.default_rng(0)
+
+    async def one(i: int) -> Tuple[int, float]:
+        if rng.random() < direct_fraction:
+            question = STUB_DOCUMENTS[i % len(STUB_DOCUMENTS)]["question"]
+        else:
+            # Unique questions so that the topic cache does not hide LLM calls
+            question = f"Where is the parcel I ordered? #{i}"
+        start = time.perf_counter()
+        response = await client.post("/answer", json={"question": question})
+        return response.status_code, time.perf_counter() - start
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * duration)):
+        await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        tasks.append(asyncio.create_task(one(i)))
+    return await asyncio.gather(*tasks)
+
+
+def report(mode: str, results: List[Tuple[int, float]]) -> None:
+    codes = Counter(code for code, _ in results)
+    answered = np.asarray([latency for code, latency in results if code == 200])
+    everything = np.asarray([latency for _, latency in results])
+    p50, p95, p99 = (
+        np.percentile(answered, [50, 95, 99]) * 1000 if len(answered) else [0.0] * 3
+    )
+    print(
+        f"{mode:<9} {codes[200]:>5} {codes[429]:>5} {codes[503]:>5} {codes[504]:>5} "
+        f"{codes[500]:>5} {p50:>8.0f} {p95:>8.0f} {p99:>8.0f} "
+        f"{np.percentile(everything, 99) * 1000:>9.0f}"
+    )
+
+
+async def main_async(args):
+    import httpx
+
+    settings.DIRECT_ANSWER_ENABLED = True
+    app = serve_workflow(stub_workflow(args.scanner_latency_ms))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://api", timeout=None
+    ) as client:
+        configure("off", args)
+        await client.post("/answer", json={"question": "warm up"})
+        print(
+            f"{'admission':<9} {'200':>5} {'429':>5} {'503':>5} {'504':>5} "
+            f"{'500':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'p99 all':>9}"
+        )
+        for mode in ("off", "on", "degraded"):
+            configure(mode, args)
+            results = await run_load(
+                client, args.rate, args.duration, args.direct_fraction
+            )
+            report(mode, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the admission control.")
+    parser.add_argument("--rate", type=float, default=40.0, help="Requests per second.")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--direct-fraction", type=float, default=0.2)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--scanner-latency-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--llm-max-in-flight", type=int, default=settings.ADMISSION_LLM_MAX_IN_FLIGHT
+    )
+    parser.add_argument(
+        "--llm-max-queue", type=int, default=settings.ADMISSION_LLM_MAX_QUEUE
+    )
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    parser.add_argument("--request-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with FakeLLMServer(
+        latency_ms=args.llm_latency_ms, max_concurrency=args.llm_concurrency
+    ) as server:
+        os.environ["OLLAMA_HOST"] = server.url
+        asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
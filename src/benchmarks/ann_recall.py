@@ -0,0 +1,212 @@
+"""
+Recall@k vs latency benchmark of the FAISS index types.
+
+Each index type is built from the same base vectors and compared with the
+exact flat index on held-out queries: recall@k is the fraction of the exact
+top-k neighbours found, latency is measured per single-query search (the
+request path) and as batch throughput.
+
+The vectors come from the FAISS index built by `src.indexing.preprocess`
+(re-embedded from the embedding cache if the index is not flat), or are
+synthetic clustered vectors to model a larger knowledge base.
+
+Usage:
+    python -m src.benchmarks.ann_recall --queries 500 --k 5
+    python -m src.benchmarks.ann_recall --synthetic 1000000 --dim 384
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List, Tuple
+
+import faiss
+import numpy as np
+
+from src.config import settings
+from src.indexing.ann import build_index, configure_search
+
+# (name, build spec, search parameter sweep)
+CONFIGS: List[Tuple[str, Dict[str, Any], List[Dict[str, int]]]] = [
+    ("flat", {"type": "flat"}, [{}]),
+    (
+        "ivf",
+        {"type": "ivf", "compression": "none", "nlist": settings.FAISS_IVF_NLIST},
+        [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+    ),
+    (
+        "ivf+sq8",
+        {"type": "ivf", "compression": "sq8", "nlist": settings.FAISS_IVF_NLIST},
+        [{"nprobe": nprobe} for nprobe in (4, 16, 64)],
+    ),
+    (
+        "ivf+pq",
+        {
+            "type": "ivf",
+            "compression": "pq",
+            "nlist": settings.FAISS_IVF_NLIST,
+            "pq_m": settings.FAISS_PQ_M,
+            "pq_nbits": settings.FAISS_PQ_NBITS,
+        },
+        [{"nprobe": nprobe} for nprobe in (4, 16, 64)],
+    ),
+    (
+        "hnsw",
+        {
+            "type": "hnsw",
+            "compression": "none",
+            "m": settings.FAISS_HNSW_M,
+            "ef_construction": settings.FAISS_HNSW_EF_CONSTRUCTION,
+        },
+        [{"ef_search": ef} for ef in (16, 64, 256)],
+    ),
+    (
+        "hnsw+sq8",
+        {
+            "type": "hnsw",
+            "compression": "sq8",
+            "m": settings.FAISS_HNSW_M,
+            "ef_construction": settings.FAISS_HNSW_EF_CONSTRUCTION,
+        },
+        [{"ef_search": ef} for ef in (16, 64, 256)],
+    ),
+]
+
+
+def load_index_vectors() -> np.ndarray:
+    """Get the vectors of the FAISS index built by the indexing pipeline."""
+    from src.embeddings import get_embeddings_model
+    from src.indexing.ann import stored_vectors
+    from src.indexing.store import load_editable_index
+
+    vector_store = load_editable_index(
+        settings.FAISS_INDEX_PATH, get_embeddings_model(lazy=True)
+    )
+    return stored_vectors(vector_store)
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 1000) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, n)]
+    vectors += 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, expected: np.ndarray) -> float:
+    """Mean fraction of the expected neighbours found, per query."""
+    k = expected.shape[1]
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / (len(expected) * k)
+
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int) -> Dict[str, Any]:
+    """Search the queries one by one, then as a single batch."""
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found[i] = ids[0]
+    start = time.perf_counter()
+    index.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "found": found,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "batch_qps": len(queries) / batch_seconds,
+    }
+
+
+def run(vectors: np.ndarray, n_queries: int, k: int) -> List[Dict[str, Any]]:
+    """
+    Compare the index types on held-out queries.
+
+    Args:
+        vectors (np.ndarray): The (n, dim) vectors.
+        n_queries (int): Number of vectors held out as queries.
+        k (int): Number of neighbours.
+
+    Returns:
+        List[Dict[str, Any]]: One result row per index type and search setting.
+    """
+    order = np.random.default_rng(1).permutation(len(vectors))
+    queries = np.ascontiguousarray(vectors[order[:n_queries]])
+    base = np.ascontiguousarray(vectors[order[n_queries:]])
+
+    rows = []
+    expected = None
+    for name, spec, sweep in CONFIGS:
+        try:
+            start = time.perf_counter()
+            index = build_index(base, spec)
+            build_seconds = time.perf_counter() - start
+        except ValueError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+        for params in sweep:
+            configure_search(index, params.get("nprobe"), params.get("ef_search"))
+            result = measure(index, queries, k)
+            if expected is None:
+                expected = result["found"]
+            rows.append(
+                {
+                    "index": name,
+                    "params": ",".join(
+                        f"{key}={value}" for key, value in params.items()
+                    )
+                    or "-",
+                    "build_s": build_seconds,
+                    "size_mb": size_mb,
+                    f"recall@{k}": recall_at_k(result["found"], expected),
+                    "p50_ms": result["p50_ms"],
+                    "p95_ms": result["p95_ms"],
+                    "batch_qps": result["batch_qps"],
+                }
+            )
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    headers = list(rows[0])
+    cells = [
+        [
+            f"{value:.3f}" if isinstance(value, float) else str(value)
+            for value in row.values()
+        ]
+        for row in rows
+    ]
+    widths = [max(len(h), *(len(c[i]) for c in cells)) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in cells:
+        print("  ".join(c.ljust(w) for c, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FAISS index types.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=settings.FAISS_TOP_K)
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Number of synthetic vectors, 0 uses the FAISS index.",
+    )
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        vectors = load_index_vectors()
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, k={args.k}")
+    print_table(run(vectors, args.queries, args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Import time and startup time and memory of the API workers.
+
+Import: each module is imported in a fresh interpreter, reporting the import
+time and the heavy libraries it pulled in.
+
+Startup: like `src.api.serve`, a process forks several workers which load and
+warm up the models (`startup.warm_up`), with and without loading the models
+in the parent before the fork. Reports the preload time, the time for each
+worker to be ready, and the memory of the workers once all are ready: USS
+(memory private to the worker) and total PSS (resident memory with the pages
+shared between processes split between them).
+
+With `--host`, also measures the inference host mode: the models are loaded
+once by a host process and the workers only hold proxies, the total PSS then
+includes the host.
+
+Usage:
+    python -m src.benchmarks.api_startup --workers 4
+    python -m src.benchmarks.api_startup --skip-startup
+    python -m src.benchmarks.api_startup --workers 8 --host
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+IMPORTED_MODULES = ["src.config", "src.graph.graph", "src.api.main"]
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "onnxruntime",
+    "llm_guard",
+    "langchain_openai",
+    "langchain_ollama",
+]
+
+
+def _import_child(module: str) -> None:
+    import importlib
+
+    start = time.perf_counter()
+    importlib.import_module(module)
+    elapsed = time.perf_counter() - start
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(json.dumps({"import_s": elapsed, "heavy": heavy}), flush=True)
+
+
+def measure_import(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "src.benchmarks.api_startup", "--import-child", module],
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _startup_child(workers: int, preload: bool, host: bool) -> None:
+    """Fork the workers, wait for them to be ready and measure them."""
+    import gc
+
+    import psutil
+
+    host_pids = []
+    if host:
+        from src.api.inference_host import run_host
+        from src.api.serve import _fork
+
+        host_pids.append(_fork(run_host, "Inference host"))
+    from src.api.startup import startup
+
+    start = time.perf_counter()
+    if preload:
+        startup.preload()
+    preload_s = time.perf_counter() - start
+    gc.freeze()
+
+    ready_read, ready_write = os.pipe()
+    stop_read, stop_write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            os.close(stop_write)
+            worker_start = time.perf_counter()
+            startup.warm_up()
+            report = {"pid": os.getpid(), "ready_s": time.perf_counter() - worker_start}
+            os.write(ready_write, (json.dumps(report) + "\n").encode())
+            # Stay alive until measured
+            os.read(stop_read, 1)
+            os._exit(0)
+        pids.append(pid)
+    os.close(ready_write)
+    os.close(stop_read)
+
+    with os.fdopen(ready_read) as ready:
+        reports = [json.loads(ready.readline()) for _ in range(workers)]
+    memory = [psutil.Process(pid).memory_full_info() for pid in pids]
+    host_memory = [psutil.Process(pid).memory_full_info() for pid in host_pids]
+    os.close(stop_write)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    for pid in host_pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    print(
+        json.dumps(
+            {
+                "preload": preload,
+                "preload_s": preload_s,
+                "ready_s": float(np.mean([report["ready_s"] for report in reports])),
+                "uss_mb": float(np.mean([info.uss for info in memory])) / 2**20,
+                "total_pss_mb": sum(info.pss for info in memory + host_memory) / 2**20,
+            }
+        ),
+        flush=True,
+    )
+
+
+def measure_startup(workers: int, preload: bool, host: bool = False) -> dict:
+    command = [
+        sys.executable,
+        "-m",
+        "src.benchmarks.api_startup",
+        "--startup-child",
+        str(workers),
+        "--preload" if preload else "--no-preload",
+    ]
+    env = dict(os.environ)
+    if host:
+        command.append("--host")
+        env["INFERENCE_HOST_ENABLED"] = "true"
+    output = subprocess.run(
+        command,
+        env=env,
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API startup.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument(
+        "--host", action="store_true", help="Also measure the inference host mode."
+    )
+    parser.add_argument("--import-child", help=argparse.SUPPRESS)
+    parser.add_argument("--startup-child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--preload", action=argparse.BooleanOptionalAction, help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.import_child:
+        _import_child(args.import_child)
+        return
+    if args.startup_child:
+        _startup_child(args.startup_child, args.preload, args.host)
+        return
+
+    print(f"{'module':<16} {'import s':>8}  heavy modules imported")
+    for module in IMPORTED_MODULES:
+        result = measure_import(module)
+        print(
+            f"{module:<16} {result['import_s']:>8.2f}  "
+            f"{', '.join(result['heavy']) or '-'}"
+        )
+    if args.skip_startup:
+        return
+
+    print(f"\n{args.workers} workers")
+    print(
+        f"{'mode':<8} {'preload s':>9} {'worker ready s':>14} "
+        f"{'USS MB':>8} {'total PSS MB':>13}"
+    )
+    modes = [("fork", False, False), ("preload", True, False)]
+    if args.host:
+        modes.append(("host", False, True))
+    for name, preload, host in modes:
+        result = measure_startup(args.workers, preload, host)
+        print(
+            f"{name:<8} {result['preload_s']:>9.1f} "
+            f"{result['ready_s']:>14.1f} {result['uss_mb']:>8.0f} "
+            f"{result['total_pss_mb']:>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
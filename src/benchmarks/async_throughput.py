@@ -0,0 +1,93 @@
+"""
+Load benchmark comparing blocking and async execution of the workflow.
+
+The workflow is compiled with stub scanners and a stub retriever, and every
+LLM call goes to the fake LLM server. Two request handlers are compared:
+
+- blocking: `graph.invoke` inside an `async def` handler (the former /answer)
+- async: `await graph.ainvoke` (the current /answer)
+
+Usage:
+    python -m src.benchmarks.async_throughput --requests 64 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from src.benchmarks.fake_llm_server import FakeLLMServer
+from src.benchmarks.stubs import StubRetriever, StubScanner
+
+QUESTIONS = [
+    "How can I cancel my order?",
+    "I wnat to return a package",
+    "How do I get a refund for a damaged product?",
+    "I can't log in to my account",
+]
+
+
+def build_graph(scanner_latency_ms: float, retriever_latency_ms: float):
+    """Compile the workflow with stubbed scanners and retriever."""
+    from src.graph.graph import create_workflow
+
+    input_scanners = [StubScanner(scanner_latency_ms) for _ in range(3)]
+    output_scanners = [StubScanner(scanner_latency_ms) for _ in range(3)]
+    retriever = StubRetriever(retriever_latency_ms)
+    return create_workflow(retriever, input_scanners, output_scanners).compile()
+
+
+async def run_load(handler, requests: int, concurrency: int) -> float:
+    """
+    Send `requests` questions through `handler` with bounded concurrency.
+
+    Returns:
+        float: Throughput in requests per second.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            # Unique questions so that the topic cache does not hide LLM calls
+            await handler({"question": f"{QUESTIONS[i % len(QUESTIONS)]} #{i}"})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main_async(args):
+    graph = build_graph(args.scanner_latency_ms, args.retriever_latency_ms)
+
+    async def blocking_handler(state):
+        return graph.invoke(state)
+
+    async def async_handler(state):
+        return await graph.ainvoke(state)
+
+    # Warm-up (client construction, imports)
+    await async_handler({"question": "warm up"})
+
+    results = {}
+    for name, handler in (("blocking", blocking_handler), ("async", async_handler)):
+        results[name] = await run_load(handler, args.requests, args.concurrency)
+        print(f"{name:>8}: {results[name]:8.2f} req/s")
+    print(f" speedup: {results['async'] / results['blocking']:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--scanner-latency-ms", type=float, default=5.0)
+    parser.add_argument("--retriever-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with FakeLLMServer(latency_ms=args.llm_latency_ms) as server:
+        os.environ["OLLAMA_HOST"] = server.url
+        asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Prompt size of the answer generation, before and after context assembly.
+
+For a sample of dataset questions, retrieves their documents and compares the
+tokens of the raw context (the repr of the documents metadata, as formatted
+before) with the assembled one, for several budgets, along with the number of
+documents kept.
+
+Usage:
+    python -m src.benchmarks.context_budget --questions 200
+    python -m src.benchmarks.context_budget --budgets 128 256 384 512
+"""
+
+import argparse
+
+import numpy as np
+
+from src.config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the context tokens.")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument(
+        "--budgets",
+        type=int,
+        nargs="+",
+        default=[128, 256, settings.CONTEXT_MAX_TOKENS],
+    )
+    args = parser.parse_args()
+
+    import polars as pl
+
+    from src.graph.context import build_context, count_tokens
+    from src.graph.utils import load_faiss_index
+    from src.indexing.preprocess import download_raw_dataset
+
+    raw_df = pl.read_csv(download_raw_dataset()).drop_nulls(["instruction"])
+    questions = raw_df.sample(min(args.questions, raw_df.height), seed=0)
+    retriever = load_faiss_index()
+    contexts = [
+        [doc.metadata for doc in retriever.invoke(question)]
+        for question in questions["instruction"]
+    ]
+
+    raw = np.asarray([count_tokens(str(documents)) for documents in contexts])
+    print(f"{'context':>12} {'p50 tokens':>10} {'p95':>6} {'docs kept':>9}")
+    print(f"{'raw':>12} {np.percentile(raw, 50):>10.0f} {np.percentile(raw, 95):>6.0f}")
+    for budget in args.budgets:
+        rendered = [
+            build_context(documents, max_tokens=budget) for documents in contexts
+        ]
+        tokens = np.asarray([count_tokens(context) for context in rendered])
+        kept = np.mean([context.count("\n") + 1 for context in rendered if context])
+        print(
+            f"{'budget ' + str(budget):>12} {np.percentile(tokens, 50):>10.0f} "
+            f"{np.percentile(tokens, 95):>6.0f} {kept:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Deterministic fake chat-model server used by the benchmarks.
+
+The server speaks enough of the Ollama (`/api/chat`) and OpenAI
+(`/v1/chat/completions`) HTTP APIs for `ChatOllama` and `ChatOpenAI` to work
+against it, including streaming and tool calls for structured output. Latency
+and token rate are configurable so that benchmarks can model a slow backend
+without running a real model.
+
+Usage:
+    python -m src.benchmarks.fake_llm_server --port 11435 --latency-ms 200
+"""
+
+import argparse
+import json
+import re
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+STUB_ANSWER = (
+    "Thank you for reaching out. You can manage your order from the "
+    "Order History section of your account, and our support team is "
+    "available if you need any further help."
+)
+
+
+def _fake_value(schema: Dict[str, Any], item_count: int) -> Any:
+    """Build a deterministic value matching a JSON schema."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        return _fake_value(schema["anyOf"][0], item_count)
+    schema_type = schema.get("type")
+    if schema_type in ("number", "integer"):
+        return 0.9 if schema_type == "number" else 1
+    if schema_type == "boolean":
+        return True
+    if schema_type == "array":
+        return [
+            _fake_value(schema.get("items", {}), item_count)
+            for _ in range(max(item_count, 1))
+        ]
+    if schema_type == "object":
+        return {
+            name: _fake_value(prop, item_count)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    # Enums are not always forwarded by the clients, "Yes" satisfies both the
+    # topic ("Yes"/"No") and the grading ("yes"/"no") schemas.
+    return "Yes"
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    """Concatenate the text content of the chat messages."""
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(
+                part.get("text", "") for part in content if isinstance(part, dict)
+            )
+        parts.append(content)
+    return "\n".join(parts)
+
+
+class FakeLLMServer:
+    """
+    Threaded HTTP server emulating a chat-model backend.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind, 0 picks a free port.
+        latency_ms (float): Delay before the first token (prefill time).
+        tokens_per_second (float): Token emission rate, 0 emits all at once.
+        max_concurrency (int): Completions generated at once, the others wait
+            (like a single Ollama backend), 0 for no limit.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 50.0,
+        tokens_per_second: float = 0.0,
+        max_concurrency: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self._slots = (
+            threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        )
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-llm", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.connections = 0
+
+    def completion(self, messages, tools=None, response_format=None) -> Dict[str, Any]:
+        """
+        Build the deterministic completion for a chat request.
+
+        Returns:
+            Dict[str, Any]: The text tokens, and the tool call if any.
+        """
+        prompt = _prompt_text(messages)
+        # One verdict per document for batched grading prompts
+        item_count = len(re.findall(r'<document id="\d+">', prompt))
+        if tools:
+            function = tools[0].get("function", tools[0])
+            arguments = _fake_value(function.get("parameters", {}), item_count)
+            return {
+                "tokens": [],
+                "tool_call": {"name": function["name"], "arguments": arguments},
+            }
+        if isinstance(response_format, dict):
+            text = json.dumps(_fake_value(response_format, item_count))
+        elif response_format == "json":
+            text = "{}"
+        elif "'yes' or 'no'" in prompt:
+            text = "yes"
+        else:
+            text = STUB_ANSWER
+        tokens = [token + " " for token in text.split(" ")]
+        tokens[-1] = tokens[-1].rstrip()
+        return {"tokens": tokens, "tool_call": None, "prompt_tokens": len(prompt) // 4}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Avoid delayed-ACK stalls on small keep-alive writes
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path in ("/", "/api/tags", "/v1/models"):
+                    self._send_json({"models": [], "data": []})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                try:
+                    if self.path == "/api/chat":
+                        self._ollama_chat(body)
+                    elif self.path == "/v1/chat/completions":
+                        self._openai_chat(body)
+                    else:
+                        self._send_json({"error": "not found"}, status=404)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the request
+                    self.close_connection = True
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_chunked(self, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _end_chunked(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def _emit_tokens(self, tokens, write):
+                with server._slots or nullcontext():
+                    time.sleep(server.latency_ms / 1000)
+                    for token in tokens:
+                        if server.tokens_per_second:
+                            time.sleep(1 / server.tokens_per_second)
+                        write(token)
+
+            def _ollama_chat(self, body):
+                result = server.completion(
+                    body.get("messages", []), body.get("tools"), body.get("format")
+                )
+                created_at = datetime.now(timezone.utc).isoformat()
+                model = body.get("model", "fake")
+                final = {
+                    "model": model,
+                    "created_at": created_at,
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": result.get("prompt_tokens", 0),
+                    "eval_count": len(result["tokens"]),
+                }
+                if result["tool_call"]:
+                    final["message"]["tool_calls"] = [{"function": result["tool_call"]}]
+                if not body.get("stream", True):
+                    self._emit_tokens(result["tokens"], lambda token: None)
+                    final["message"]["content"] = "".join(result["tokens"])
+                    self._send_json(final)
+                    return
+
+                self._start_chunked("application/x-ndjson")
+
+                def write(token):
+                    chunk = {
+                        "model": model,
+                        "created_at": created_at,
+                        "message": {"role": "assistant", "content": token},
+                        "done": False,
+                    }
+                    self._write_chunk(json.dumps(chunk).encode() + b"\n")
+
+                self._emit_tokens(result["tokens"], write)
+                self._write_chunk(json.dumps(final).encode() + b"\n")
+                self._end_chunked()
+
+            def _openai_chat(self, body):
+                result = server.completion(
+                    body.get("messages", []),
+                    body.get("tools"),
+                    (body.get("response_format") or {})
+                    .get("json_schema", {})
+                    .get("schema"),
+                )
+                tool_calls = None
+                if result["tool_call"]:
+                    tool_calls = [
+                        {
+                            "index": 0,
+                            "id": "call_0",
+                            "type": "function",
+                            "function": {
+                                "name": result["tool_call"]["name"],
+                                "arguments": json.dumps(
+                                    result["tool_call"]["arguments"]
+                                ),
+                            },
+                        }
+                    ]
+                usage = {
+                    "prompt_tokens": result.get("prompt_tokens", 0),
+                    "completion_tokens": len(result["tokens"]),
+                    "total_tokens": result.get("prompt_tokens", 0)
+                    + len(result["tokens"]),
+                }
+                base = {
+                    "id": "chatcmpl-fake",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                }
+                if not body.get("stream"):
+                    self._emit_tokens(result["tokens"], lambda token: None)
+                    message = {
+                        "role": "assistant",
+                        "content": "".join(result["tokens"]) or None,
+                    }
+                    if tool_calls:
+                        message["tool_calls"] = tool_calls
+                    self._send_json(
+                        {
+                            **base,
+                            "object": "chat.completion",
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": message,
+                                    "finish_reason": "tool_calls"
+                                    if tool_calls
+                                    else "stop",
+                                }
+                            ],
+                            "usage": usage,
+                        }
+                    )
+                    return
+
+                self._start_chunked("text/event-stream")
+
+                def send(delta, finish_reason=None, extra=None):
+                    chunk = {
+                        **base,
+                        "object": "chat.completion.chunk",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": delta,
+                                "finish_reason": finish_reason,
+                            }
+                        ],
+                        **(extra or {}),
+                    }
+                    self._write_chunk(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+
+                send({"role": "assistant", "content": ""})
+                self._emit_tokens(
+                    result["tokens"], lambda token: send({"content": token})
+                )
+                if tool_calls:
+                    send({"tool_calls": tool_calls})
+                send({}, "tool_calls" if tool_calls else "stop", {"usage": usage})
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._end_chunked()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(
+        args.host,
+        args.port,
+        args.latency_ms,
+        args.tokens_per_second,
+        args.max_concurrency,
+    )
+    print(f"Fake LLM server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Startup time and memory benchmark of the FAISS index formats.
+
+Starts several worker processes at once for each format, like uvicorn
+workers, and measures in each one the time to load the index and run a few
+searches, and its memory: RSS, USS (memory private to the process) and PSS
+(resident memory with shared pages split between the processes sharing them).
+The pickled format (`FAISS.save_local`) is written to a temporary directory
+from the compact index built by `src.indexing.preprocess`.
+
+Measurements use the warm page cache, drop it first for cold-start figures
+(`echo 1 > /proc/sys/vm/drop_caches`).
+
+Usage:
+    python -m src.benchmarks.index_startup --workers 4
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import psutil
+
+from src.config import settings
+
+
+def _child(index_format: str, index_path: str, searches: int) -> None:
+    """Load the index, search it, report the timings and wait to be measured."""
+    start = time.perf_counter()
+    from langchain_community.vectorstores import FAISS
+
+    from src.embeddings import LazyEmbeddings
+    from src.indexing.store import load_compact_index
+
+    imported = time.perf_counter()
+    # Searches by vector, the embeddings model is never loaded
+    embeddings = LazyEmbeddings(lambda: None)
+    if index_format == "compact":
+        vector_store = load_compact_index(index_path, embeddings)
+    else:
+        vector_store = FAISS.load_local(
+            index_path, embeddings, allow_dangerous_deserialization=True
+        )
+    loaded = time.perf_counter()
+    rng = np.random.default_rng(0)
+    for _ in range(searches):
+        vector = rng.standard_normal(vector_store.index.d).tolist()
+        vector_store.similarity_search_by_vector(vector, k=settings.FAISS_TOP_K)
+    ready = time.perf_counter()
+    print(
+        json.dumps(
+            {
+                "import_s": imported - start,
+                "load_s": loaded - imported,
+                "first_searches_s": ready - loaded,
+            }
+        ),
+        flush=True,
+    )
+    sys.stdin.read()
+
+
+def run_workers(
+    index_format: str, index_path: str, workers: int, searches: int
+) -> dict:
+    """Start the workers together and aggregate their measurements."""
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "src.benchmarks.index_startup",
+                "--child",
+                index_format,
+                "--index-path",
+                index_path,
+                "--searches",
+                str(searches),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(workers)
+    ]
+    try:
+        reports = [json.loads(process.stdout.readline()) for process in processes]
+        memory = [
+            psutil.Process(process.pid).memory_full_info() for process in processes
+        ]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+    return {
+        "format": index_format,
+        "load_s": float(np.mean([report["load_s"] for report in reports])),
+        "first_searches_s": float(
+            np.mean([report["first_searches_s"] for report in reports])
+        ),
+        "rss_mb": float(np.mean([info.rss for info in memory])) / 2**20,
+        "uss_mb": float(np.mean([info.uss for info in memory])) / 2**20,
+        "total_pss_mb": sum(info.pss for info in memory) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the index formats.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--index-path", default=settings.FAISS_INDEX_PATH)
+    parser.add_argument(
+        "--child", choices=["compact", "pickle"], help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.index_path, args.searches)
+        return
+
+    from src.embeddings import LazyEmbeddings
+    from src.indexing.store import is_compact, load_editable_index
+
+    if not is_compact(args.index_path):
+        sys.exit(f"{args.index_path} is not a compact index, run the indexing first.")
+    with tempfile.TemporaryDirectory() as pickle_path:
+        load_editable_index(args.index_path, LazyEmbeddings(lambda: None)).save_local(
+            pickle_path
+        )
+        results = [
+            run_workers(index_format, path, args.workers, args.searches)
+            for index_format, path in (
+                ("pickle", pickle_path),
+                ("compact", args.index_path),
+            )
+        ]
+    print(f"{args.workers} workers, {args.searches} searches each")
+    print(
+        f"{'format':<8} {'load s':>8} {'search s':>9} {'RSS MB':>8} "
+        f"{'USS MB':>8} {'total PSS MB':>13}"
+    )
+    for result in results:
+        print(
+            f"{result['format']:<8} {result['load_s']:>8.3f} "
+            f"{result['first_searches_s']:>9.3f} {result['rss_mb']:>8.1f} "
+            f"{result['uss_mb']:>8.1f} {result['total_pss_mb']:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
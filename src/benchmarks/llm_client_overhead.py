@@ -0,0 +1,82 @@
+"""
+Microbenchmark of the per-request LLM client overhead.
+
+Compares building a new `ChatOllama` client and chain for every call (the
+former behaviour of the nodes) with reusing the pooled client from
+`llm_registry`, against the fake LLM server with zero latency so that only the
+client overhead is measured.
+
+Usage:
+    python -m src.benchmarks.llm_client_overhead --calls 200
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from src.benchmarks.fake_llm_server import FakeLLMServer
+
+
+def _per_call_chain():
+    from langchain_ollama import ChatOllama
+
+    from src.config import settings
+    from src.graph.answer_node import _answer_chain
+
+    llm = ChatOllama(
+        model=settings.OLLAMA_MODEL_NAME,
+        temperature=settings.LLM_TEMPERATURE,
+        max_tokens=settings.LLM_MAX_TOKENS,
+    )
+    return _answer_chain(llm)[1]
+
+
+def _pooled_chain():
+    from src.graph.llm import llm_registry
+
+    return llm_registry.chain("answer")[1]
+
+
+def run_sync(get_chain, calls: int) -> float:
+    """Return the mean latency per call in milliseconds."""
+    inputs = {"question": "How can I cancel my order?", "context": []}
+    get_chain().invoke(inputs)
+    start = time.perf_counter()
+    for _ in range(calls):
+        get_chain().invoke(inputs)
+    return (time.perf_counter() - start) / calls * 1000
+
+
+async def run_async(get_chain, calls: int) -> float:
+    """Return the mean latency per call in milliseconds."""
+    inputs = {"question": "How can I cancel my order?", "context": []}
+    await get_chain().ainvoke(inputs)
+    start = time.perf_counter()
+    for _ in range(calls):
+        await get_chain().ainvoke(inputs)
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with FakeLLMServer(latency_ms=0) as server:
+        os.environ["OLLAMA_HOST"] = server.url
+        print(f"{'mode':<18}{'ms/call':>10}{'connections':>14}")
+        for name, get_chain in (
+            ("per-call", _per_call_chain),
+            ("pooled", _pooled_chain),
+        ):
+            server.reset_counters()
+            latency = run_sync(get_chain, args.calls)
+            print(f"{name + ' (sync)':<18}{latency:>10.2f}{server.connections:>14}")
+            server.reset_counters()
+            latency = asyncio.run(run_async(get_chain, args.calls))
+            print(f"{name + ' (async)':<18}{latency:>10.2f}{server.connections:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Quality and latency comparison of the document filtering strategies.
+
+Over a labeled sample of (question, retrieved documents, relevance labels),
+compares which documents each strategy keeps:
+
+- all: no filtering (precision baseline)
+- llm: the LLM grader on every document (the default workflow)
+- rerank: the cross-encoder alone, keeping scores >= RERANK_ACCEPT_THRESHOLD
+- rerank+llm: the workflow with the reranker, the LLM grades borderline
+  documents only
+
+and reports precision, recall and F1 of the kept documents, LLM calls and
+latency per question, plus a threshold sweep of the cross-encoder scores.
+
+Without `--labels`, the sample is built from the dataset: questions are
+sampled, their documents retrieved from the FAISS index (the question itself
+excluded), and a document is relevant if it has the intent of the question.
+A labels file has one JSON object per line:
+`{"question": ..., "documents": [{"question": ..., "answer": ...}], "labels": [1, 0]}`.
+
+Usage:
+    python -m src.benchmarks.rerank_eval --questions 200
+    python -m src.benchmarks.rerank_eval --labels sample.jsonl --fake-llm
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.config import settings
+
+
+def build_labeled_sample(n_questions: int, k: int, seed: int = 0) -> List[dict]:
+    """Label the retrieved documents of sampled questions by intent."""
+    import polars as pl
+
+    from src.graph.utils import load_faiss_index
+    from src.indexing.preprocess import download_raw_dataset
+
+    raw_df = pl.read_csv(download_raw_dataset()).drop_nulls(["instruction", "intent"])
+    intents = dict(zip(raw_df["instruction"], raw_df["intent"]))
+    queries = raw_df.sample(min(n_questions, raw_df.height), seed=seed)
+    retriever = load_faiss_index()
+    sample = []
+    for question, intent in zip(queries["instruction"], queries["intent"]):
+        docs = [
+            doc.metadata
+            for doc in retriever.vectorstore.similarity_search(question, k=k + 1)
+            if doc.metadata["question"] != question
+        ][:k]
+        labels = [int(intents.get(doc["question"]) == intent) for doc in docs]
+        sample.append({"question": question, "documents": docs, "labels": labels})
+    return sample
+
+
+def read_labeled_sample(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _grade(docs: list, question: str) -> List[bool]:
+    from src.graph.docs_grader_node import grade_documents
+
+    grades = grade_documents(docs, question)
+    return [grade.strip().lower() == "yes" for grade in grades]
+
+
+def run_strategy(name: str, sample: List[dict], reranker) -> Dict[str, Any]:
+    """Run a filtering strategy over the sample and score the kept documents."""
+    true_positives = kept = relevant = llm_calls = 0
+    latencies = []
+    for item in sample:
+        question, docs, labels = item["question"], item["documents"], item["labels"]
+        start = time.perf_counter()
+        if name == "all":
+            keep = [True] * len(docs)
+        elif name == "llm":
+            keep = _grade(docs, question)
+            llm_calls += len(docs)
+        else:
+            scores = reranker.score(question, docs)
+            keep = [score >= settings.RERANK_ACCEPT_THRESHOLD for score in scores]
+            if name == "rerank+llm":
+                borderline = [
+                    i
+                    for i, score in enumerate(scores)
+                    if settings.RERANK_DROP_THRESHOLD
+                    <= score
+                    < settings.RERANK_ACCEPT_THRESHOLD
+                ]
+                if borderline:
+                    grades = _grade([docs[i] for i in borderline], question)
+                    for i, grade in zip(borderline, grades):
+                        keep[i] = grade
+                    llm_calls += len(borderline)
+        latencies.append(time.perf_counter() - start)
+        true_positives += sum(k and label for k, label in zip(keep, labels))
+        kept += sum(keep)
+        relevant += sum(labels)
+    precision = true_positives / kept if kept else 0.0
+    recall = true_positives / relevant if relevant else 0.0
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "strategy": name,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall)
+        if precision + recall
+        else 0.0,
+        "llm_calls_per_question": llm_calls / len(sample),
+        "mean_ms": float(latencies_ms.mean()),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def threshold_sweep(sample: List[dict], reranker) -> List[Dict[str, float]]:
+    """Precision and recall of the cross-encoder alone at several thresholds."""
+    scores, labels = [], []
+    for item in sample:
+        scores.extend(reranker.score(item["question"], item["documents"]))
+        labels.extend(item["labels"])
+    scores, labels = np.asarray(scores), np.asarray(labels, dtype=bool)
+    rows = []
+    for threshold in (0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9):
+        keep = scores >= threshold
+        true_positives = int((keep & labels).sum())
+        rows.append(
+            {
+                "threshold": threshold,
+                "kept": float(keep.mean()) if len(keep) else 0.0,
+                "precision": true_positives / keep.sum() if keep.sum() else 0.0,
+                "recall": true_positives / labels.sum() if labels.sum() else 0.0,
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare reranking and grading.")
+    parser.add_argument("--labels", help="Labeled sample JSONL file.")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--k", type=int, default=settings.FAISS_TOP_K)
+    parser.add_argument(
+        "--fake-llm",
+        action="store_true",
+        help="Grade with the fake LLM server: latency only, grades are 'yes'.",
+    )
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    sample = (
+        read_labeled_sample(args.labels)
+        if args.labels
+        else build_labeled_sample(args.questions, args.k)
+    )
+    print(f"{len(sample)} questions, {sum(len(i['labels']) for i in sample)} documents")
+
+    from src.graph.rerank_node import Reranker
+
+    reranker = Reranker()
+    server = None
+    if args.fake_llm:
+        from src.benchmarks.fake_llm_server import FakeLLMServer
+
+        server = FakeLLMServer(latency_ms=args.latency_ms).start()
+        os.environ["OLLAMA_HOST"] = server.url
+    try:
+        results = [
+            run_strategy(name, sample, reranker)
+            for name in ("all", "llm", "rerank", "rerank+llm")
+        ]
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(
+        f"{'strategy':<11} {'precision':>9} {'recall':>7} {'F1':>6} "
+        f"{'LLM calls':>9} {'mean ms':>8} {'p95 ms':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['strategy']:<11} {r['precision']:>9.3f} {r['recall']:>7.3f} "
+            f"{r['f1']:>6.3f} {r['llm_calls_per_question']:>9.2f} "
+            f"{r['mean_ms']:>8.1f} {r['p95_ms']:>8.1f}"
+        )
+    print(f"\n{'threshold':>9} {'kept':>6} {'precision':>9} {'recall':>7}")
+    for row in threshold_sweep(sample, reranker):
+        print(
+            f"{row['threshold']:>9.2f} {row['kept']:>6.2f} "
+            f"{row['precision']:>9.3f} {row['recall']:>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
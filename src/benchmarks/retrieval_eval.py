@@ -0,0 +1,309 @@
+"""
+Offline evaluation of the retrieval settings: top-k, similarity threshold,
+index type and embeddings model.
+
+Questions are held out of the dataset and the index is built from the other
+rows, so each held-out question is answered by its paraphrases only. A
+retrieved document is relevant if it has the intent of the question. For each
+embeddings model, index type and search setting, all the held-out questions
+are embedded in one call and searched with a single multi-query FAISS search
+at the largest k, and every (k, threshold) pair is scored from that result:
+
+- recall@k: share of the questions with a relevant document retrieved
+- MRR: mean reciprocal rank of the first relevant document
+- precision: share of the retrieved documents that are relevant
+- docs: documents retrieved per question, i.e. LLM grading calls
+
+Search latency is measured per single-query search (the request path). The
+cost/latency frontier lists the settings above `--min-recall` that no other
+setting beats on recall, docs and latency at once, and the recommended
+setting is the one with the fewest documents within `--max-recall-loss` of
+the best recall.
+
+A threshold drops the documents below a cosine similarity, cutting grading
+calls on questions with few close neighbours.
+
+Usage:
+    python -m src.benchmarks.retrieval_eval --queries 1000
+    python -m src.benchmarks.retrieval_eval --indexes flat ivf hnsw+sq8 --output rows.jsonl
+    python -m src.benchmarks.retrieval_eval --models sentence-transformers/all-MiniLM-L6-v2 BAAI/bge-small-en-v1.5
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from src.benchmarks.ann_recall import CONFIGS
+from src.config import settings
+from src.indexing.ann import build_index, configure_search
+
+K_VALUES = [1, 2, 3, 5, 8, 10]
+THRESHOLDS: List[Optional[float]] = [None, 0.3, 0.4, 0.5, 0.6, 0.7]
+LATENCY_SAMPLE_SIZE = 200
+
+
+def load_split(
+    path: str, n_queries: int, seed: int = 0
+) -> Tuple[List[str], np.ndarray, List[str], np.ndarray]:
+    """
+    Split the dataset into held-out questions and the indexed corpus.
+
+    Every row with the text of a held-out question is left out of the corpus.
+
+    Returns:
+        Tuple[List[str], np.ndarray, List[str], np.ndarray]: The held-out
+        questions and their intents, the corpus questions and their intents.
+    """
+    import polars as pl
+
+    raw_df = (
+        pl.read_csv(path)
+        .drop_nulls(["instruction", "response", "intent"])
+        .unique(["instruction", "response"], keep="first", maintain_order=True)
+    )
+    queries = raw_df.unique("instruction", keep="first", maintain_order=True).sample(
+        n_queries, seed=seed
+    )
+    corpus = raw_df.filter(~pl.col("instruction").is_in(queries["instruction"]))
+    return (
+        queries["instruction"].to_list(),
+        queries["intent"].to_numpy(),
+        corpus["instruction"].to_list(),
+        corpus["intent"].to_numpy(),
+    )
+
+
+def embed(model_name: str, texts: List[str]) -> np.ndarray:
+    """Embed texts with a model, through the embedding cache if enabled."""
+    from src.embeddings import get_embeddings_model
+
+    configured = settings.EMBEDDINGS_MODEL_NAME
+    settings.EMBEDDINGS_MODEL_NAME = model_name
+    try:
+        embeddings = get_embeddings_model(batch_size=settings.EMBEDDINGS_BATCH_SIZE)
+    finally:
+        settings.EMBEDDINGS_MODEL_NAME = configured
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def score(
+    relevant: np.ndarray, similarities: np.ndarray, k: int, threshold: Optional[float]
+) -> Dict[str, float]:
+    """
+    Score the top k documents above a threshold.
+
+    Args:
+        relevant (np.ndarray): The (n, max k) relevance of the results.
+        similarities (np.ndarray): Their (n, max k) cosine similarities.
+        k (int): Number of documents retrieved.
+        threshold (Optional[float]): Minimum similarity, None to keep all.
+
+    Returns:
+        Dict[str, float]: recall@k, MRR, precision and documents per question.
+    """
+    kept = np.isfinite(similarities[:, :k])
+    if threshold is not None:
+        kept &= similarities[:, :k] >= threshold
+    hits = relevant[:, :k] & kept
+    found = hits.any(axis=1)
+    first_rank = hits.argmax(axis=1) + 1
+    n_kept = kept.sum()
+    return {
+        "recall": float(found.mean()),
+        "mrr": float(np.where(found, 1 / first_rank, 0.0).mean()),
+        "precision": float(hits.sum() / n_kept) if n_kept else 0.0,
+        "docs": float(kept.sum(axis=1).mean()),
+    }
+
+
+def search_latency_ms(index: faiss.Index, queries: np.ndarray, k: int) -> float:
+    """Median latency of single-query searches, on a sample of the queries."""
+    latencies = []
+    for query in queries[:LATENCY_SAMPLE_SIZE]:
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies) * 1000)
+
+
+def evaluate(
+    model_name: str,
+    corpus_vectors: np.ndarray,
+    corpus_intents: np.ndarray,
+    query_vectors: np.ndarray,
+    query_intents: np.ndarray,
+    index_names: List[str],
+) -> List[Dict[str, Any]]:
+    """
+    Score every index type, search setting, k and threshold for a model.
+
+    Returns:
+        List[Dict[str, Any]]: One result row per setting.
+    """
+    max_k = max(K_VALUES)
+    rows = []
+    for name, spec, sweep in CONFIGS:
+        if name not in index_names:
+            continue
+        try:
+            index = build_index(corpus_vectors, spec)
+        except ValueError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        for params in sweep:
+            configure_search(index, params.get("nprobe"), params.get("ef_search"))
+            start = time.perf_counter()
+            distances, positions = index.search(query_vectors, max_k)
+            batch_ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+            latency_ms = search_latency_ms(index, query_vectors, max_k)
+            # Squared L2 distances of unit vectors: d = 2 - 2 * cos
+            similarities = np.where(positions >= 0, 1 - distances / 2, -np.inf)
+            relevant = (positions >= 0) & (
+                corpus_intents[positions] == query_intents[:, None]
+            )
+            for k in K_VALUES:
+                for threshold in THRESHOLDS:
+                    rows.append(
+                        {
+                            "model": model_name,
+                            "index": name,
+                            "params": ",".join(f"{p}={v}" for p, v in params.items())
+                            or "-",
+                            "k": k,
+                            "threshold": threshold,
+                            **score(relevant, similarities, k, threshold),
+                            "search_ms": latency_ms,
+                            "batch_ms": batch_ms,
+                        }
+                    )
+    return rows
+
+
+def frontier(rows: List[Dict[str, Any]], min_recall: float) -> List[Dict[str, Any]]:
+    """
+    The rows with at least `min_recall` that no other row beats on recall,
+    docs and search latency at once. Of equal rows, the first one (smallest k,
+    no threshold) is kept.
+    """
+
+    def metrics(row: Dict[str, Any]) -> Tuple[float, float, float]:
+        return row["recall"], -row["docs"], -row["search_ms"]
+
+    def dominates(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        return metrics(a) != metrics(b) and all(
+            x >= y for x, y in zip(metrics(a), metrics(b))
+        )
+
+    rows = [row for row in rows if row["recall"] >= min_recall]
+    front = {}
+    for row in rows:
+        if not any(dominates(other, row) for other in rows):
+            front.setdefault(metrics(row), row)
+    return sorted(front.values(), key=lambda row: (row["docs"], row["search_ms"]))
+
+
+def recommend(rows: List[Dict[str, Any]], max_recall_loss: float) -> Dict[str, Any]:
+    """The setting with the fewest documents within a recall loss of the best."""
+    best = max(row["recall"] for row in rows)
+    candidates = [row for row in rows if row["recall"] >= best - max_recall_loss]
+    return min(candidates, key=lambda row: (row["docs"], row["search_ms"]))
+
+
+def _format(row: Dict[str, Any]) -> str:
+    threshold = "-" if row["threshold"] is None else f"{row['threshold']:.2f}"
+    return (
+        f"{row['model'][-24:]:<24} {row['index']:<9} {row['params']:<12} "
+        f"{row['k']:>3} {threshold:>9} {row['recall']:>7.3f} {row['mrr']:>6.3f} "
+        f"{row['precision']:>9.3f} {row['docs']:>5.2f} {row['search_ms']:>9.3f}"
+    )
+
+
+def print_rows(rows: List[Dict[str, Any]]) -> None:
+    print(
+        f"{'model':<24} {'index':<9} {'params':<12} {'k':>3} {'threshold':>9} "
+        f"{'recall':>7} {'MRR':>6} {'precision':>9} {'docs':>5} {'search ms':>9}"
+    )
+    for row in rows:
+        print(_format(row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the retrieval settings.")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dataset", help="Dataset CSV, downloaded by default.")
+    parser.add_argument("--models", nargs="+", default=[settings.EMBEDDINGS_MODEL_NAME])
+    parser.add_argument(
+        "--indexes",
+        nargs="+",
+        choices=[name for name, _, _ in CONFIGS],
+        default=["flat", "ivf", "hnsw"],
+    )
+    parser.add_argument(
+        "--max-recall-loss",
+        type=float,
+        default=0.01,
+        help="Recall loss allowed from the best setting for the recommendation.",
+    )
+    parser.add_argument(
+        "--min-recall",
+        type=float,
+        default=0.9,
+        help="Leave the settings below this recall out of the frontier.",
+    )
+    parser.add_argument("--output", help="Write all the result rows to this JSONL.")
+    args = parser.parse_args()
+
+    from src.indexing.preprocess import download_raw_dataset
+
+    queries, query_intents, corpus, corpus_intents = load_split(
+        args.dataset or download_raw_dataset(), args.queries
+    )
+    print(f"{len(queries)} held-out questions, {len(corpus)} indexed documents")
+
+    rows = []
+    for model_name in args.models:
+        start = time.perf_counter()
+        corpus_vectors = embed(model_name, corpus)
+        embed_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        query_vectors = embed(model_name, queries)
+        query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(
+            f"{model_name}: dimension {corpus_vectors.shape[1]}, corpus embedded "
+            f"in {embed_seconds:.1f} s, {query_ms:.2f} ms per question (batched)"
+        )
+        rows.extend(
+            evaluate(
+                model_name,
+                corpus_vectors,
+                corpus_intents,
+                query_vectors,
+                query_intents,
+                args.indexes,
+            )
+        )
+
+    print(f"\nNo threshold, k={settings.FAISS_TOP_K} (current setting):")
+    print_rows(
+        [r for r in rows if r["threshold"] is None and r["k"] == settings.FAISS_TOP_K]
+    )
+    print(f"\nCost/latency frontier (recall >= {args.min_recall}):")
+    print_rows(frontier(rows, args.min_recall))
+    print(f"\nRecommended (recall loss <= {args.max_recall_loss}):")
+    print_rows([recommend(rows, args.max_recall_loss)])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        print(f"\n{len(rows)} rows written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
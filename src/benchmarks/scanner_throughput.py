@@ -0,0 +1,99 @@
+"""
+Load benchmark of the input scanners: llm_guard `scan_prompt` vs `ScannerEngine`.
+
+Concurrent clients scan prompts with a cheap token limit scanner and model
+scanners whose stub pipelines run one forward pass at a time, with a fixed
+cost per pass and a cost per input. A share of the prompts is too long and
+rejected by the token limit. Compared:
+
+- sequential: `llm_guard.scan_prompt`, one scanner after the other
+- engine: `ScannerEngine`, fail-fast, parallel scanners and batching
+
+Usage:
+    python -m src.benchmarks.scanner_throughput --requests 512 --concurrency 32
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.benchmarks.stubs import StubModelScanner, StubTokenLimit
+
+
+def build_scanners(args) -> list:
+    return [
+        StubModelScanner(args.pass_latency_ms, args.item_latency_ms),
+        StubTokenLimit(limit=32),
+        StubModelScanner(args.pass_latency_ms, args.item_latency_ms),
+    ]
+
+
+def run_load(scan, requests: int, concurrency: int, long_share: float) -> dict:
+    """
+    Scan `requests` prompts from `concurrency` threads.
+
+    Returns:
+        dict: Throughput in requests per second and latency percentiles.
+    """
+    rng = np.random.default_rng(0)
+    prompts = [
+        "word " * 100 if rng.random() < long_share else f"How can I cancel #{i}?"
+        for i in range(requests)
+    ]
+
+    def one(prompt: str) -> float:
+        start = time.perf_counter()
+        scan(prompt)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = np.asarray(list(pool.map(one, prompts))) * 1000
+    return {
+        "rps": requests / (time.perf_counter() - start),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pass-latency-ms", type=float, default=10.0)
+    parser.add_argument("--item-latency-ms", type=float, default=1.0)
+    parser.add_argument("--long-share", type=float, default=0.1)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    from llm_guard import scan_prompt
+
+    from src.graph.scanner_engine import ScannerEngine
+
+    sequential_scanners = build_scanners(args)
+    engine = ScannerEngine(
+        build_scanners(args),
+        fail_fast=True,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+    )
+    strategies = {
+        "sequential": lambda prompt: scan_prompt(sequential_scanners, prompt),
+        "engine": engine.scan_prompt,
+    }
+    print(f"{'strategy':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, scan in strategies.items():
+        r = run_load(scan, args.requests, args.concurrency, args.long_share)
+        print(f"{name:<10} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+    for scanner, stats in engine.stats().items():
+        print(
+            f"{scanner}: {stats['batches']} batches, {stats['mean_batch_size']:.1f} inputs/batch"
+        )
+    engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Lightweight stand-ins for the scanners and the retriever used by benchmarks.
+
+They sleep instead of running models so that benchmarks isolate the cost of
+the orchestration and the LLM round trips from model inference.
+"""
+
+import hashlib
+import threading
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+STUB_DOCUMENTS = [
+    {
+        "question": "How can I cancel my order?",
+        "answer": "You can cancel your order from the Order History page.",
+    },
+    {
+        "question": "I want to return a package",
+        "answer": "Start a return from the Returns section of your account.",
+    },
+    {
+        "question": "How do I get a refund?",
+        "answer": "Refunds are issued to the original payment method.",
+    },
+]
+
+
+class StubScanner:
+    """
+    llm_guard-compatible scanner that accepts every input.
+
+    Args:
+        latency_ms (float): Simulated inference time per scan.
+    """
+
+    def __init__(self, latency_ms: float = 5.0):
+        self.latency_ms = latency_ms
+
+    def scan(self, *args):
+        time.sleep(self.latency_ms / 1000)
+        return args[-1], True, 0.0
+
+
+class StubPipeline:
+    """
+    Transformers pipeline stand-in running one forward pass at a time.
+
+    Args:
+        latency_ms (float): Fixed cost of a forward pass.
+        item_latency_ms (float): Additional cost per input of the batch.
+    """
+
+    def __init__(self, latency_ms: float = 5.0, item_latency_ms: float = 0.5):
+        self.latency_ms = latency_ms
+        self.item_latency_ms = item_latency_ms
+        self._lock = threading.Lock()
+
+    def __call__(self, inputs, **kwargs):
+        batch = inputs if isinstance(inputs, list) else [inputs]
+        with self._lock:
+            time.sleep((self.latency_ms + self.item_latency_ms * len(batch)) / 1000)
+        results = [{"label": "SAFE", "score": 1.0} for _ in batch]
+        return results if isinstance(inputs, list) else results[0]
+
+
+class StubModelScanner:
+    """
+    llm_guard-compatible scanner with a (stub) transformers pipeline.
+
+    Args:
+        latency_ms (float): Fixed cost of a forward pass.
+        item_latency_ms (float): Additional cost per input of the batch.
+    """
+
+    def __init__(self, latency_ms: float = 5.0, item_latency_ms: float = 0.5):
+        self._pipeline = StubPipeline(latency_ms, item_latency_ms)
+
+    def scan(self, *args):
+        self._pipeline([args[-1]])
+        return args[-1], True, 0.0
+
+
+class StubTokenLimit:
+    """
+    Cheap scanner rejecting texts longer than `limit` words, like `TokenLimit`.
+    """
+
+    def __init__(self, limit: int = 64):
+        self.limit = limit
+
+    def scan(self, *args):
+        valid = len(args[-1].split()) <= self.limit
+        return args[-1], valid, 0.0 if valid else 1.0
+
+
+class StubRetriever:
+    """
+    Retriever returning a fixed set of QA documents.
+
+    Args:
+        latency_ms (float): Simulated embedding and search time.
+        k (int): Number of documents to return.
+    """
+
+    def __init__(self, latency_ms: float = 5.0, k: int = 3):
+        self.latency_ms = latency_ms
+        self.k = k
+
+    def invoke(self, question: str) -> List[Document]:
+        time.sleep(self.latency_ms / 1000)
+        return [
+            Document(page_content=doc["question"], metadata=dict(doc))
+            for doc in STUB_DOCUMENTS[: self.k]
+        ]
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Embeddings of customer support questions: every two different texts have
+    the same cosine similarity, so that all the questions are on topic and
+    only the indexed ones are near-exact matches.
+
+    Args:
+        similarity (float): Cosine similarity of different texts.
+        size (int): Dimension of the vectors.
+    """
+
+    def __init__(self, similarity: float = 0.8, size: int = 256):
+        self.similarity = similarity
+        self.size = size
+
+    def embed_query(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        noise = np.random.default_rng(seed).standard_normal(self.size)
+        noise[0] = 0.0
+        noise /= np.linalg.norm(noise)
+        # Shared direction plus a (nearly orthogonal) direction per text
+        vector = np.sqrt(1 - self.similarity) * noise
+        vector[0] = np.sqrt(self.similarity)
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def stub_workflow(scanner_latency_ms: float = 5.0):
+    """
+    Compile the workflow with stub scanners and a FAISS index of the stub
+    documents with stub embeddings: with `settings.DIRECT_ANSWER_ENABLED`, the
+    indexed questions are answered directly, any other question goes through
+    grading and generation.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    from src.graph.graph import create_workflow
+
+    vectorstore = FAISS.from_texts(
+        [doc["question"] for doc in STUB_DOCUMENTS],
+        StubEmbeddings(),
+        metadatas=STUB_DOCUMENTS,
+    )
+    return create_workflow(
+        vectorstore.as_retriever(search_kwargs={"k": 3}),
+        [StubScanner(scanner_latency_ms)],
+        [StubScanner(scanner_latency_ms)],
+    ).compile()
+
+
+def serve_workflow(graph):
+    """Make the API answer with `graph`, without loading the models."""
+    from src.api.main import app
+    from src.api.startup import startup
+
+    workflow = startup.components["workflow"]
+    workflow.value, workflow.state = graph, "ready"
+    return app
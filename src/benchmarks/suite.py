@@ -0,0 +1,323 @@
+"""
+End-to-end performance benchmark suite.
+
+Runs fixed question sets through the compiled workflow (in process) and
+through the API (`/answer`, in process over ASGI), with every LLM call going
+to the fake LLM server, at several concurrency levels. For each target and
+level, reports the throughput, the end-to-end and per-node p50/p95/p99
+latency (from the metrics trace of the requests, `Server-Timing` for the
+API), the errors and the RSS of the process.
+
+The workflow uses stub scanners and an index of the stub documents by
+default, so that only the orchestration and the LLM round trips are
+measured; `--models real` loads the configured index and scanners instead.
+
+Results can be saved as a baseline and later runs compared against it: any
+p95 latency (end to end or of a node) above the baseline by more than
+`--tolerance`, or any throughput below it, is reported as a regression and
+makes the command exit with status 1.
+
+Usage:
+    python -m src.benchmarks.suite --save-baseline baseline.json
+    python -m src.benchmarks.suite --baseline baseline.json --tolerance 0.2
+    python -m src.benchmarks.suite --questions support questions.jsonl --targets api
+    python -m src.benchmarks.suite --models real --concurrency 1 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from src.benchmarks.fake_llm_server import FakeLLMServer
+from src.benchmarks.stubs import STUB_DOCUMENTS, serve_workflow, stub_workflow
+from src.benchmarks.topic_eval import OFF_TOPIC_QUESTIONS
+from src.config import settings
+
+QUESTION_SETS = {
+    # Answered by grading and generation
+    "support": [
+        "How can I cancel the order I placed yesterday?",
+        "I received a damaged product, how do I get a refund?",
+        "Where can I track my package?",
+        "How do I change the shipping address of my order?",
+        "I can't log in to my account, what should I do?",
+        "Can I pay with a gift card?",
+        "How long does a refund take?",
+        "How do I speak to a customer service agent?",
+    ],
+    # Near-exact matches of indexed questions, answered directly if
+    # DIRECT_ANSWER_ENABLED
+    "indexed": [doc["question"] for doc in STUB_DOCUMENTS],
+    "off_topic": OFF_TOPIC_QUESTIONS,
+}
+
+# (node, seconds) timings and end-to-end seconds of a request
+Handler = Callable[[str], Awaitable[Tuple[List[Tuple[str, float]], float]]]
+
+
+def load_questions(names: List[str], question_field: str) -> List[str]:
+    """Questions of built-in sets, or of JSONL files."""
+    questions = []
+    for name in names:
+        if name in QUESTION_SETS:
+            questions.extend(QUESTION_SETS[name])
+            continue
+        with open(name, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        questions.extend(row[question_field] for row in rows)
+    return questions
+
+
+def workflow_handler(graph) -> Handler:
+    from src.graph.metrics import trace_request
+
+    async def handle(question: str):
+        start = time.perf_counter()
+        with trace_request() as trace:
+            await graph.ainvoke({"question": question})
+        return trace, time.perf_counter() - start
+
+    return handle
+
+
+def _parse_server_timing(header: str) -> List[Tuple[str, float]]:
+    trace = []
+    for stage in header.split(","):
+        node, _, duration = stage.strip().partition(";dur=")
+        if duration and node != "total":
+            trace.append((node, float(duration) / 1000))
+    return trace
+
+
+def api_handler(client) -> Handler:
+    async def handle(question: str):
+        start = time.perf_counter()
+        response = await client.post(
+            "/answer",
+            json={"question": question},
+            headers={settings.METRICS_TRACE_HEADER: "1"},
+        )
+        elapsed = time.perf_counter() - start
+        response.raise_for_status()
+        return _parse_server_timing(response.headers.get("server-timing", "")), elapsed
+
+    return handle
+
+
+def _clear_caches() -> None:
+    """Forget the topic classifications, so that every level calls the LLM."""
+    from src.graph.topic_check_node import aclassify_topic, classify_topic
+
+    aclassify_topic.cache_clear()
+    classify_topic.cache_clear()
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {}
+    values = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {name: float(v) for name, v in zip(("p50", "p95", "p99"), values)}
+
+
+def _rss_mb() -> float:
+    import psutil
+
+    return psutil.Process().memory_info().rss / 2**20
+
+
+async def run_level(
+    handler: Handler, questions: List[str], requests: int, concurrency: int
+) -> Dict[str, Any]:
+    """
+    Send `requests` questions (cycling through `questions`) with at most
+    `concurrency` in flight.
+    """
+    _clear_caches()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    nodes: Dict[str, List[float]] = defaultdict(list)
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            try:
+                trace, elapsed = await handler(questions[i % len(questions)])
+            except Exception:
+                errors += 1
+                return
+        latencies.append(elapsed)
+        for node, seconds in trace:
+            nodes[node].append(seconds)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": _percentiles(latencies),
+        "nodes_ms": {node: _percentiles(values) for node, values in nodes.items()},
+        "errors": errors,
+        "rss_mb": _rss_mb(),
+    }
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    print(
+        f"{'run':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'errors':>6} {'RSS MB':>7}"
+    )
+    for key, result in results.items():
+        latency = result["latency_ms"]
+        print(
+            f"{key:<16} {result['throughput_rps']:>8.1f} {latency.get('p50', 0):>8.1f} "
+            f"{latency.get('p95', 0):>8.1f} {latency.get('p99', 0):>8.1f} "
+            f"{result['errors']:>6} {result['rss_mb']:>7.0f}"
+        )
+        for node, percentiles in sorted(result["nodes_ms"].items()):
+            print(
+                f"  {node:<14} {'':>8} {percentiles['p50']:>8.1f} "
+                f"{percentiles['p95']:>8.1f} {percentiles['p99']:>8.1f}"
+            )
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    min_delta_ms: float,
+) -> List[str]:
+    """
+    Compare results with a baseline.
+
+    Args:
+        results: The results of this run.
+        baseline: The baseline results.
+        tolerance (float): Relative change allowed.
+        min_delta_ms (float): Latency increases below this are noise.
+
+    Returns:
+        List[str]: The regressions.
+    """
+    regressions = []
+
+    def check_latency(name: str, current: Dict[str, float], base: Dict[str, float]):
+        if not current or not base:
+            return
+        delta = current["p95"] - base["p95"]
+        if delta > min_delta_ms and current["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{name} p95 {base['p95']:.1f} -> {current['p95']:.1f} ms "
+                f"(+{delta / base['p95']:.0%})"
+            )
+
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        check_latency(key, result["latency_ms"], base["latency_ms"])
+        for node, percentiles in result["nodes_ms"].items():
+            check_latency(f"{key} {node}", percentiles, base["nodes_ms"].get(node, {}))
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{key} throughput {base['throughput_rps']:.1f} -> "
+                f"{result['throughput_rps']:.1f} req/s"
+            )
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{key} errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def build_graph(models: str, scanner_latency_ms: float):
+    if models == "stub":
+        return stub_workflow(scanner_latency_ms)
+    from src.api.startup import startup
+
+    startup.warm_up()
+    return startup.get("workflow")
+
+
+async def main_async(args) -> Dict[str, Dict[str, Any]]:
+    import httpx
+
+    questions = load_questions(args.questions, args.question_field)
+    graph = build_graph(args.models, args.scanner_latency_ms)
+    app = serve_workflow(graph)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://api", timeout=None
+    ) as client:
+        handlers = {"workflow": workflow_handler(graph), "api": api_handler(client)}
+        for target in args.targets:
+            # Warm-up (client construction, imports)
+            await handlers[target](questions[0])
+            for concurrency in args.concurrency:
+                requests = max(args.requests, concurrency)
+                results[f"{target}/c{concurrency}"] = await run_level(
+                    handlers[target], questions, requests, concurrency
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument(
+        "--questions",
+        nargs="+",
+        default=["support", "indexed"],
+        help=f"Built-in sets ({', '.join(QUESTION_SETS)}) or JSONL files.",
+    )
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument(
+        "--targets", nargs="+", choices=["workflow", "api"], default=["workflow", "api"]
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--models", choices=["stub", "real"], default="stub")
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--llm-concurrency", type=int, default=0)
+    parser.add_argument("--scanner-latency-ms", type=float, default=5.0)
+    parser.add_argument("--save-baseline", help="Write the results to this file.")
+    parser.add_argument("--baseline", help="Compare the results with this file.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with FakeLLMServer(
+        latency_ms=args.llm_latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        max_concurrency=args.llm_concurrency,
+    ) as server:
+        os.environ["OLLAMA_HOST"] = server.url
+        results = asyncio.run(main_async(args))
+    print_results(results)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Peak RSS: {peak_mb:.0f} MB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}.")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regression against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
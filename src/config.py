@@ -2,7 +2,7 @@
 
 import os
 from pathlib import Path
-from typing import Union
+from typing import Literal, Union
 
 from dotenv import load_dotenv
 from pydantic import SecretStr
@@ -32,29 +32,235 @@ class Settings(BaseSettings):
 
     # Embeddings settings
     EMBEDDINGS_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDINGS_BATCH_SIZE: int = 64
+    # Disk cache of the embeddings keyed by model and text hash, with an
+    # in-memory LRU tier for hot queries
+    EMBEDDINGS_CACHE_ENABLED: bool = True
+    EMBEDDINGS_CACHE_DIR: str = str(INDEX_DIR / "embeddings_cache")
+    EMBEDDINGS_CACHE_LRU_SIZE: int = 4096
+
+    # Inference backend settings
+    # torch: PyTorch models (default). onnx: ONNX Runtime models exported at
+    # build time with `python -m src.inference` into ONNX_MODELS_DIR, used by
+    # the embeddings model and the llm_guard scanners (optimum[onnxruntime])
+    INFERENCE_BACKEND: Literal["torch", "onnx"] = "torch"
+    ONNX_MODELS_DIR: str = str(DATA_DIR / "onnx_models")
+    # int8 dynamic quantization of the exported models
+    ONNX_QUANTIZE: bool = True
+    ONNX_QUANTIZATION_CONFIG: Literal["arm64", "avx2", "avx512", "avx512_vnni"] = "avx2"
+    # Intra-op threads of each model, 0 for the runtime default (all cores)
+    INFERENCE_NUM_THREADS: int = 0
+
+    # Indexing settings
+    # full: load the whole dataset and add the documents missing from the index
+    # streaming: read, embed and index the dataset in checkpointed batches
+    # sync: diff the dataset against the index manifest, re-embed only changes
+    INDEXING_MODE: Literal["full", "streaming", "sync"] = "sync"
+    INDEXING_BATCH_SIZE: int = 2048
+    INDEXING_WORKERS: int = 2
+    # Save a resumable checkpoint every N batches
+    INDEXING_CHECKPOINT_EVERY: int = 4
 
     # LLM settings
     LLM_MODEL_NAME: str = "gpt-4o-mini"
     LLM_TEMPERATURE: float = 0
     LLM_MAX_TOKENS: int = 100
 
+    # Context assembly settings
+    # Only the answers of the retrieved documents are sent to the LLM, near
+    # duplicates (word Jaccard similarity at least CONTEXT_DEDUP_THRESHOLD)
+    # dropped, and cut on sentence boundaries to CONTEXT_MAX_TOKENS tokens of
+    # the CONTEXT_TOKENIZER tiktoken encoding
+    CONTEXT_MAX_TOKENS: int = 384
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8
+    CONTEXT_TOKENIZER: str = "cl100k_base"
+
     # Local LLM settings
     OLLAMA_MODEL_NAME: str = "llama3.2:1b"
 
+    # LLM HTTP client settings
+    LLM_POOL_MAX_CONNECTIONS: int = 20
+    LLM_POOL_MAX_KEEPALIVE: int = 10
+    LLM_POOL_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_TIMEOUT_SECONDS: float = 120.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+
     FAISS_INDEX_PATH: str = str(INDEX_DIR / "faiss_index.faiss")
 
     FAISS_TOP_K: int = 5
 
+    # Retrieval settings
+    # dense: FAISS similarity search only
+    # hybrid: FAISS and BM25 searched concurrently, results fused
+    RETRIEVAL_MODE: Literal["dense", "hybrid"] = "dense"
+    HYBRID_DENSE_K: int = 20
+    HYBRID_SPARSE_K: int = 20
+    # rrf: reciprocal rank fusion, weighted: min-max normalized scores
+    HYBRID_FUSION: Literal["rrf", "weighted"] = "rrf"
+    HYBRID_RRF_K: int = 60
+    HYBRID_DENSE_WEIGHT: float = 0.5
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+
+    # Approximate nearest neighbour index built by the indexing pipeline
+    # flat: exact brute-force search
+    # ivf: inverted lists, FAISS_IVF_NLIST clusters, FAISS_IVF_NPROBE searched
+    # hnsw: graph index, FAISS_HNSW_M links per node, FAISS_HNSW_EF_SEARCH beam
+    FAISS_INDEX_TYPE: Literal["flat", "ivf", "hnsw"] = "flat"
+    # Vector compression of the ivf/hnsw indexes
+    FAISS_INDEX_COMPRESSION: Literal["none", "pq", "sq8"] = "none"
+    FAISS_IVF_NLIST: int = 1024
+    FAISS_IVF_NPROBE: int = 16
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 40
+    FAISS_HNSW_EF_SEARCH: int = 64
+    # Product quantization: FAISS_PQ_M sub-vectors of FAISS_PQ_NBITS bits each
+    FAISS_PQ_M: int = 16
+    FAISS_PQ_NBITS: int = 8
+    # Number of vectors sampled to train the ivf/pq/sq8 quantizers
+    FAISS_TRAIN_SAMPLE_SIZE: int = 100_000
+
+    # Cross-encoder reranking of the retrieved documents before grading
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL_NAME: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_BATCH_SIZE: int = 32
+    # Below: dropped. Above RERANK_ACCEPT_THRESHOLD: kept. In between: graded
+    # by the LLM, or kept without grading if RERANK_SKIP_GRADER is set.
+    RERANK_DROP_THRESHOLD: float = 0.05
+    RERANK_ACCEPT_THRESHOLD: float = 0.6
+    RERANK_SKIP_GRADER: bool = False
+
+    # Document grading settings
+    # sequential: one LLM call per document, one after the other
+    # concurrent: one LLM call per document, DOCS_GRADER_MAX_CONCURRENCY at a time
+    # batched: a single LLM call grading all the documents of a request
+    DOCS_GRADER_MODE: Literal["sequential", "concurrent", "batched"] = "concurrent"
+    DOCS_GRADER_MAX_CONCURRENCY: int = 5
+
+    # Workflow settings
+    # sequential: scan_question -> topic_classifier -> retrieve_docs
+    # speculative: the three steps start together and a join node discards the
+    # topic and retrieval results when the question is rejected
+    WORKFLOW_MODE: Literal["sequential", "speculative"] = "sequential"
+
+    # Topic classification settings
+    # llm: a structured-output LLM call per question
+    # embedding: mean cosine similarity of the question to its TOPIC_NEIGHBORS
+    # nearest indexed support questions. On topic at or above
+    # TOPIC_ACCEPT_THRESHOLD, off topic at or below TOPIC_REJECT_THRESHOLD
+    # (None never rejects), the LLM decides in between. Calibrate the thresholds
+    # on the index with `python -m src.benchmarks.topic_eval` before enabling
+    TOPIC_CLASSIFIER_MODE: Literal["llm", "embedding"] = "llm"
+    TOPIC_NEIGHBORS: int = 5
+    TOPIC_ACCEPT_THRESHOLD: float = 0.75
+    TOPIC_REJECT_THRESHOLD: Union[float, None] = 0.35
+
+    # Direct answer settings
+    # The stored answer of an indexed question is returned without grading
+    # nor generation when its cosine similarity to the question is at least
+    # DIRECT_ANSWER_THRESHOLD, and higher by DIRECT_ANSWER_MIN_MARGIN than the
+    # similarity of the next indexed question. Stored answers with unfilled
+    # {{placeholders}} are never returned directly
+    DIRECT_ANSWER_ENABLED: bool = False
+    DIRECT_ANSWER_THRESHOLD: float = 0.95
+    DIRECT_ANSWER_MIN_MARGIN: float = 0.02
+    # Run the output scanners on the direct answers too
+    DIRECT_ANSWER_SCAN_OUTPUT: bool = True
+
+    # Semantic cache settings
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.9
+    SEMANTIC_CACHE_TTL_SECONDS: float = 24 * 3600
+    SEMANTIC_CACHE_MAX_SIZE: int = 10_000
+    # Directory where the cache is persisted across restarts, None disables it
+    SEMANTIC_CACHE_PATH: Union[str, None] = str(INDEX_DIR / "semantic_cache")
+
+    # Concurrency settings
+    CPU_EXECUTOR_WORKERS: int = 4
+
+    # Scanner engine settings
+    # Pipeline calls of concurrent requests are batched, waiting at most
+    # SCANNER_MAX_WAIT_MS for a batch of SCANNER_MAX_BATCH_SIZE inputs
+    SCANNER_MAX_BATCH_SIZE: int = 16
+    SCANNER_MAX_WAIT_MS: float = 5.0
+    # Stop scanning at the first scanner rejecting the text
+    SCANNER_FAIL_FAST: bool = True
+    # Threads running the model scanners in parallel. They mostly wait for
+    # their batch, so this bounds the batch size across concurrent requests
+    SCANNER_WORKERS: int = 32
+
+    # Batch answering settings
+    BATCH_SIZE: int = 32
+    BATCH_MAX_CONCURRENCY: int = 8
+
     # Open AI API settings
     OPENAI_API_KEY: Union[SecretStr, None] = None
 
+    # Startup settings
+    # blocking: the models are loaded and warmed up before the API serves
+    # background: the API serves at once and loads the models in a background
+    # thread, /ready answers 503 until they are all warm
+    STARTUP_WARMUP: Literal["blocking", "background"] = "blocking"
+    # Run one inference per model while warming up, so that the first request
+    # does not pay the lazy initializations of the runtimes
+    STARTUP_WARMUP_INFERENCE: bool = True
+    # Pre-forking server (python -m src.api.serve): the models are loaded in
+    # the parent process and shared copy-on-write by the SERVE_WORKERS workers
+    SERVE_HOST: str = "0.0.0.0"
+    SERVE_PORT: int = 8000
+    SERVE_WORKERS: int = 1
+    SERVE_PRELOAD: bool = True
+    # Inference host (python -m src.api.inference_host, or started by
+    # src.api.serve): a single process owns the index, the embeddings model,
+    # the scanners and the reranker, the API workers call it over a Unix socket
+    INFERENCE_HOST_ENABLED: bool = False
+    INFERENCE_HOST_SOCKET: str = "/tmp/rag-inference.sock"
+    # Threads serving the calls of the workers on the host
+    INFERENCE_HOST_THREADS: int = 64
+    # Concurrent retrievals, index searches and query embeddings of the
+    # workers are batched, waiting up to INFERENCE_HOST_MAX_WAIT_MS
+    INFERENCE_HOST_MAX_BATCH_SIZE: int = 64
+    INFERENCE_HOST_MAX_WAIT_MS: float = 2.0
+    # Time for a worker to wait for the host to load its models
+    INFERENCE_HOST_CONNECT_TIMEOUT_SECONDS: float = 300.0
+    INFERENCE_HOST_TIMEOUT_SECONDS: float = 60.0
+
+    # Admission control
+    # Calls to each downstream (LLM backend, scanners) are limited to
+    # *_MAX_IN_FLIGHT per worker, up to *_MAX_QUEUE more wait at most
+    # ADMISSION_QUEUE_TIMEOUT_SECONDS for a slot. Beyond that, requests are
+    # rejected at once with a 429 (queue full) or 503 (no slot in time) and a
+    # Retry-After header
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_LLM_MAX_IN_FLIGHT: int = 8
+    ADMISSION_LLM_MAX_QUEUE: int = 32
+    ADMISSION_SCANNERS_MAX_IN_FLIGHT: int = 32
+    ADMISSION_SCANNERS_MAX_QUEUE: int = 256
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    # Time budget of a request, its workflow is cancelled beyond it (504)
+    ADMISSION_REQUEST_TIMEOUT_SECONDS: float = 30.0
+    # When the LLM queue is full, still run the requests, without waiting for
+    # the LLM: the ones answered from the semantic cache or directly are
+    # served, the others fail fast with a 503
+    ADMISSION_DEGRADED_MODE: bool = False
+
+    # Metrics settings
+    # Per-node timings and outcomes, exposed on /metrics (Prometheus format)
+    METRICS_ENABLED: bool = True
+    # Request header asking /answer for the stage breakdown of the request,
+    # returned in the Server-Timing response header
+    METRICS_TRACE_HEADER: str = "X-Trace"
+
     # Logging settings
     LOGGING_LEVEL: str = "INFO"
     LOGGING_FILE: str = str(BASE_DIR / "logs" / "preprocessing.log")
 
-    # Ensure that the data directory exists
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+    def ensure_directories(self) -> None:
+        """
+        Create the data directories. Called by the commands writing to them
+        rather than at import, so that importing the settings has no side
+        effect (the indexes and caches create their own directory).
+        """
         os.makedirs(self.DATA_DIR, exist_ok=True)
         os.makedirs(self.INDEX_DIR, exist_ok=True)
         os.makedirs(self.BASE_DIR / "logs", exist_ok=True)
@@ -0,0 +1,324 @@
+"""
+Embeddings model helpers shared by the indexing pipeline and the API.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+from src.config import settings
+
+KEY_SIZE = 16
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that loads the underlying model on first use.
+
+    Lets code paths that may not need to embed anything (e.g. a no-op index
+    refresh) avoid the cost of loading the model.
+
+    Args:
+        factory (Callable[[], Embeddings]): Function creating the model.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._model: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+
+class EmbeddingCache:
+    """
+    Append-only disk cache of embeddings, keyed by model name and text hash.
+
+    Each model gets its own directory holding the vectors as a raw float32
+    matrix (`vectors.f32`, memory-mapped for reads) and the index file
+    (`keys.bin`), the 16-byte text hash of each row in the same order. New
+    vectors are appended under an exclusive file lock so that the indexing
+    pipeline and the API can share the cache.
+
+    Args:
+        cache_dir (str): Root directory of the cache.
+        model_name (str): Name of the embeddings model.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.path = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+        self.model_name = model_name
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        self._size = 0
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+            self._refresh()
+            logger.info(f"Loaded {len(self._rows)} cached embeddings from {self.path}")
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()[:KEY_SIZE]
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.path, "keys.bin")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _refresh(self) -> None:
+        """Pick up the rows appended since the last refresh, by any process."""
+        if not os.path.exists(self._keys_path):
+            return
+        row_bytes = self.dim * 4
+        rows = min(
+            os.path.getsize(self._keys_path) // KEY_SIZE,
+            os.path.getsize(self._vectors_path) // row_bytes,
+        )
+        if rows == self._size:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._size * KEY_SIZE)
+            data = f.read((rows - self._size) * KEY_SIZE)
+        for offset in range(0, len(data), KEY_SIZE):
+            self._rows[data[offset : offset + KEY_SIZE]] = (
+                self._size + offset // KEY_SIZE
+            )
+        self._size = rows
+        self._vectors = (
+            np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)
+            )
+            if rows
+            else None
+        )
+
+    def get(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Get the cached vectors of the given keys, None for the misses."""
+        with self._lock:
+            if self._vectors is None:
+                return [None] * len(keys)
+            return [
+                np.array(self._vectors[self._rows[key]]) if key in self._rows else None
+                for key in keys
+            ]
+
+    def put(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        """Append new vectors to the cache."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(
+                    os.path.join(self.path, "meta.json"), "w", encoding="utf-8"
+                ) as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+            with open(os.path.join(self.path, ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._refresh()
+                new = {}
+                for key, vector in zip(keys, vectors):
+                    if key not in self._rows:
+                        new[key] = vector
+                if not new:
+                    return
+                # Truncate any torn write, then append the vectors before the
+                # keys so that a crash never leaves a key without its vector.
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(self._size * self.dim * 4)
+                    f.write(np.stack(list(new.values())).tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.truncate(self._size * KEY_SIZE)
+                    f.write(b"".join(new))
+                self._refresh()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an in-memory LRU tier and a persistent disk tier.
+
+    Document embeddings are looked up in memory, then on disk, and only the
+    misses are sent to the model, in a single call. Query embeddings are kept
+    in memory only, so that the retriever and the semantic cache embed a
+    question once without filling the disk with one-off questions.
+
+    Args:
+        model (Embeddings): The underlying embeddings model.
+        cache (EmbeddingCache): The disk cache of the model.
+        lru_size (int): Number of embeddings kept in memory.
+    """
+
+    def __init__(
+        self,
+        model: Embeddings,
+        cache: EmbeddingCache,
+        lru_size: int = settings.EMBEDDINGS_CACHE_LRU_SIZE,
+    ):
+        self.model = model
+        self.cache = cache
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Texts found in the cache (memory or disk) and texts sent to the model
+        self.hits = 0
+        self.misses = 0
+
+    def _lru_get(self, key: bytes) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_put(self, key: bytes, vector: List[float]) -> None:
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.key(text) for text in texts]
+        results: List[Optional[List[float]]] = [self._lru_get(key) for key in keys]
+        disk_misses = [i for i, vector in enumerate(results) if vector is None]
+        for i, vector in zip(
+            disk_misses, self.cache.get([keys[i] for i in disk_misses])
+        ):
+            if vector is not None:
+                results[i] = vector.tolist()
+
+        misses = [i for i, vector in enumerate(results) if vector is None]
+        self.hits += len(texts) - len(misses)
+        self.misses += len(misses)
+        if misses:
+            # Embed each distinct text once
+            unique = list(dict.fromkeys(texts[i] for i in misses))
+            vectors = np.asarray(self.model.embed_documents(unique), dtype=np.float32)
+            self.cache.put([EmbeddingCache.key(text) for text in unique], vectors)
+            embedded = dict(zip(unique, vectors.tolist()))
+            for i in misses:
+                results[i] = embedded[texts[i]]
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        key = EmbeddingCache.key(text)
+        vector = self._lru_get(key)
+        if vector is None:
+            self.misses += 1
+            vector = self.model.embed_query(text)
+            self._lru_put(key, vector)
+        else:
+            self.hits += 1
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries, with a single model call for the misses."""
+        keys = [EmbeddingCache.key(text) for text in texts]
+        results: List[Optional[List[float]]] = [self._lru_get(key) for key in keys]
+        misses = [i for i, vector in enumerate(results) if vector is None]
+        self.hits += len(texts) - len(misses)
+        self.misses += len(misses)
+        if misses:
+            unique = list(dict.fromkeys(texts[i] for i in misses))
+            embedded = dict(zip(unique, self.model.embed_documents(unique)))
+            for text, vector in embedded.items():
+                self._lru_put(EmbeddingCache.key(text), vector)
+            for i in misses:
+                results[i] = embedded[texts[i]]
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._lru),
+            "disk_size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def get_embeddings_model(
+    batch_size: Optional[int] = None, lazy: bool = False
+) -> Embeddings:
+    """
+    Create the embeddings model of the configured inference backend, with the
+    embedding cache if enabled.
+
+    Args:
+        batch_size (int): Encoding batch size, None for the model default.
+        lazy (bool): Load the model on first use only, so that runs answered
+            entirely from the cache never load it.
+
+    Returns:
+        Embeddings: The embeddings model.
+    """
+    from src.inference import configure_threads, embeddings_model_id
+
+    def factory() -> Embeddings:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        from src.inference import embeddings_kwargs
+
+        configure_threads()
+        return HuggingFaceEmbeddings(
+            **embeddings_kwargs(),
+            encode_kwargs={"batch_size": batch_size} if batch_size else {},
+        )
+
+    model = LazyEmbeddings(factory) if lazy else factory()
+    if not settings.EMBEDDINGS_CACHE_ENABLED:
+        return model
+    # Backends give slightly different vectors, each one has its own cache
+    cache = EmbeddingCache(settings.EMBEDDINGS_CACHE_DIR, embeddings_model_id())
+    return CachedEmbeddings(model, cache)
+
+
+_shared_embeddings_model: Optional[Embeddings] = None
+
+
+def shared_embeddings_model() -> Embeddings:
+    """
+    Get the embeddings model of the FAISS index, created on first use and
+    shared by every index loaded in the process.
+    """
+    global _shared_embeddings_model
+    if _shared_embeddings_model is None:
+        _shared_embeddings_model = get_embeddings_model()
+    return _shared_embeddings_model
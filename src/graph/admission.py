@@ -0,0 +1,239 @@
+"""
+Admission control of the calls to the downstream services.
+
+Each downstream (the LLM backend, the scanners) has a `Limiter` bounding the
+calls in flight in this process. Calls beyond the limit wait in a bounded FIFO
+queue until a slot frees up or their deadline passes, calls finding the queue
+full are rejected at once. Rejections raise `Overloaded`, which the API turns
+into a 429 (queue full) or 503 (no slot in time) response with a Retry-After
+header, instead of letting every request pile onto a saturated backend.
+
+The deadline of the current request and the degraded mode are context
+variables set by the API (`request_scope`), seen by the graph nodes of the
+request. In the degraded mode, LLM calls do not wait for a slot: requests
+answered without the LLM (semantic cache, direct answers, rejected questions)
+are still served, the others fail fast.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from src.config import settings
+from src.graph.metrics import ADMISSIONS, registry
+
+LLM = "llm"
+SCANNERS = "scanners"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+_degraded: ContextVar[bool] = ContextVar("degraded", default=False)
+
+
+class Overloaded(Exception):
+    """
+    A downstream has no capacity left for the request.
+
+    Args:
+        downstream (str): Name of the downstream.
+        status_code (int): 429 if its queue is full, 503 if no slot freed up
+            in time.
+        retry_after (int): Seconds after which to retry.
+    """
+
+    def __init__(self, downstream: str, status_code: int, retry_after: int):
+        self.downstream = downstream
+        self.status_code = status_code
+        self.retry_after = retry_after
+        reason = "queue is full" if status_code == 429 else "has no free slot"
+        super().__init__(f"The {downstream} {reason}, retry in {retry_after} s.")
+
+
+class Limiter:
+    """
+    Bounded in-flight limit with a bounded FIFO wait queue, for one event loop.
+
+    Args:
+        name (str): Name of the downstream.
+        max_in_flight (int): Maximum number of calls in flight.
+        max_queue (int): Maximum number of calls waiting for a slot.
+        queue_timeout (float): Maximum time to wait for a slot.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of the time a slot is held, for Retry-After
+        self._hold_s = 1.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a new call would be rejected."""
+        return self.in_flight >= self.max_in_flight and self.waiting >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Estimated time for the calls queued now to get a slot."""
+        seconds = self._hold_s * (self.waiting + 1) / max(1, self.max_in_flight)
+        return min(60, max(1, math.ceil(seconds)))
+
+    def _reject(self, status_code: int, outcome: str) -> Overloaded:
+        ADMISSIONS.inc(self.name, outcome)
+        return Overloaded(self.name, status_code, self.retry_after())
+
+    async def acquire(self, wait: bool = True, deadline: Optional[float] = None):
+        """
+        Take a slot, waiting for one at most until `deadline` (a
+        `time.monotonic` time) and `queue_timeout`.
+
+        Args:
+            wait (bool): Wait in the queue when no slot is free.
+            deadline (Optional[float]): Deadline of the request.
+
+        Raises:
+            Overloaded: If the queue is full, or no slot freed up in time.
+        """
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            ADMISSIONS.inc(self.name, "admitted")
+            return
+        if self.waiting >= self.max_queue:
+            raise self._reject(429, "rejected")
+        if not wait:
+            raise self._reject(503, "rejected")
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, max(timeout, 0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the wait ended
+                self.release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject(503, "timeout") from None
+        ADMISSIONS.inc(self.name, "queued")
+
+    def release(self) -> None:
+        """Hand the slot over to the first waiting call, or free it."""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(
+        self, wait: bool = True, deadline: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block."""
+        await self.acquire(wait, deadline)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._hold_s = 0.9 * self._hold_s + 0.1 * (time.perf_counter() - start)
+            self.release()
+
+
+limiters: Dict[str, Limiter] = {}
+if settings.ADMISSION_ENABLED:
+    limiters[LLM] = Limiter(
+        LLM, settings.ADMISSION_LLM_MAX_IN_FLIGHT, settings.ADMISSION_LLM_MAX_QUEUE
+    )
+    limiters[SCANNERS] = Limiter(
+        SCANNERS,
+        settings.ADMISSION_SCANNERS_MAX_IN_FLIGHT,
+        settings.ADMISSION_SCANNERS_MAX_QUEUE,
+    )
+
+
+def _slots() -> Dict[Tuple[str, ...], float]:
+    samples: Dict[Tuple[str, ...], float] = {}
+    for name, limiter in limiters.items():
+        samples[(name, "in_flight")] = limiter.in_flight
+        samples[(name, "waiting")] = limiter.waiting
+    return samples
+
+
+registry.callback(
+    "rag_admission_slots",
+    "Downstream calls in flight and waiting for a slot.",
+    "gauge",
+    ["downstream", "state"],
+    _slots,
+)
+
+
+@asynccontextmanager
+async def limit(downstream: str) -> AsyncIterator[None]:
+    """
+    Hold a slot of a downstream for a call of the current request.
+
+    Raises:
+        Overloaded: If the downstream has no capacity left for the request.
+    """
+    limiter = limiters.get(downstream)
+    if limiter is None:
+        yield
+        return
+    wait = not (downstream == LLM and _degraded.get())
+    async with limiter.slot(wait, _deadline.get()):
+        yield
+
+
+def admit() -> bool:
+    """
+    Decide the admission of a new request from the LLM queue.
+
+    Returns:
+        bool: Whether the request runs in the degraded mode.
+
+    Raises:
+        Overloaded: If the LLM queue is full and the degraded mode is disabled.
+    """
+    limiter = limiters.get(LLM)
+    if limiter is None or not limiter.saturated:
+        return False
+    if settings.ADMISSION_DEGRADED_MODE:
+        ADMISSIONS.inc(LLM, "degraded")
+        return True
+    raise limiter._reject(429, "rejected")
+
+
+@contextmanager
+def request_scope(timeout: Optional[float], degraded: bool = False) -> Iterator[None]:
+    """
+    Set the deadline and the degraded mode of the request, for the tasks
+    created in the block.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    deadline_token = _deadline.set(deadline)
+    degraded_token = _degraded.set(degraded)
+    try:
+        yield
+    finally:
+        _deadline.reset(deadline_token)
+        _degraded.reset(degraded_token)
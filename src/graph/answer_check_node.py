@@ -1,26 +1,64 @@
-from typing import Any, Dict
-
-from llm_guard import scan_output
-from llm_guard.output_scanners import LanguageSame, Relevance, Sentiment
+from typing import Any, Dict, Optional
 
+from src.config import settings
+from src.graph.admission import SCANNERS, limit
+from src.graph.executor import run_in_cpu_executor
+from src.graph.scanner_engine import ScannerEngine
 from src.graph.state import AgentState
+from src.inference import configure_threads, scanner_kwargs
+
+_default_output_scanners: Optional[list] = None
+_default_output_engine: Optional[ScannerEngine] = None
+
+
+def default_output_scanners() -> list:
+    """Get the default output scanners, loading their models on first use."""
+    global _default_output_scanners
+    if _default_output_scanners is None:
+        from llm_guard.output_scanners import LanguageSame, Relevance, Sentiment
 
-output_scanners = [
-    LanguageSame(),
-    Relevance(),
-    Sentiment(),
-]
+        configure_threads()
+        _default_output_scanners = [
+            LanguageSame(**scanner_kwargs("LanguageSame")),
+            Relevance(**scanner_kwargs("Relevance")),
+            Sentiment(),
+        ]
+    return _default_output_scanners
 
 
-def scan_output_answer(state: AgentState) -> Dict[str, Any]:
+def default_output_engine() -> ScannerEngine:
+    """Get the scanner engine of the default output scanners."""
+    global _default_output_engine
+    if _default_output_engine is None:
+        _default_output_engine = ScannerEngine(default_output_scanners())
+    return _default_output_engine
+
+
+def scan_output_answer(state: AgentState, output_scanners=None) -> Dict[str, Any]:
     """
     Scan the output answer.
+
+    `output_scanners` is a scanner engine (a `ScannerEngine` or its inference host
+    proxy) or a list of llm_guard scanners,
+    the default output scanners are used if not given.
     """
     output = state["llm_output"]
     prompt = state["prompt"]
-    sanitized_response, results_valid, results_score = scan_output(
-        scanners=output_scanners, output=output, prompt=prompt
-    )
+    if output_scanners is None:
+        output_scanners = default_output_engine()
+    if not isinstance(output_scanners, list):
+        sanitized_response, results_valid, results_score = output_scanners.scan_output(
+            prompt, output
+        )
+    else:
+        from llm_guard import scan_output
+
+        sanitized_response, results_valid, results_score = scan_output(
+            scanners=output_scanners,
+            output=output,
+            prompt=prompt,
+            fail_fast=settings.SCANNER_FAIL_FAST,
+        )
 
     if any(not result for result in results_valid.values()):
         state["answer_status"] = "invalid"
@@ -29,3 +67,13 @@ def scan_output_answer(state: AgentState) -> Dict[str, Any]:
         state["llm_output"] = sanitized_response
 
     return state
+
+
+async def ascan_output_answer(
+    state: AgentState, output_scanners=None
+) -> Dict[str, Any]:
+    """
+    Scan the output answer in the CPU executor.
+    """
+    async with limit(SCANNERS):
+        return await run_in_cpu_executor(scan_output_answer, state, output_scanners)
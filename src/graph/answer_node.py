@@ -1,41 +1,66 @@
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
 
 from src.config import settings
+from src.graph.admission import LLM, limit
+from src.graph.context import build_context, count_tokens
+from src.graph.llm import llm_registry
+from src.graph.metrics import CONTEXT_TOKENS
 from src.graph.state import AgentState
 
+# Identical for every request and first in the prompt, so that the LLM backend
+# can reuse its cached prefix
+ANSWER_INSTRUCTIONS = (
+    "Answer the question based only on the support answers given as context."
+)
+
+
+def _answer_chain(llm):
+    """Create the answer prompt and the answer generation chain."""
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", ANSWER_INSTRUCTIONS),
+            ("human", "Context:\n{context}\n\nQuestion: {question}"),
+        ]
+    )
+    chain = prompt | llm | StrOutputParser()
+    return prompt, chain
+
+
+llm_registry.register("answer", _answer_chain)
+
+
+def _prepare_context(context: list) -> str:
+    """Render the retrieved documents within the context token budget."""
+    rendered = build_context(context)
+    if settings.METRICS_ENABLED:
+        CONTEXT_TOKENS.observe(count_tokens(rendered))
+    return rendered
+
 
 def generate_answer(question: str, context: list, local_llm: bool = True):
     """
     Generate answer to the question based on the context.
     """
-    if local_llm:
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL_NAME,
-            temperature=settings.LLM_TEMPERATURE,
-            max_tokens=settings.LLM_MAX_TOKENS,
-        )
-    else:
-        llm = ChatOpenAI(
-            model=settings.LLM_MODEL_NAME,
-            api_key=settings.OPENAI_API_KEY.get_secret_value(),
-        )
-    template = """Answer the question based only on the following context:
-    {context}
-
-    Question: {question}
-    """
-
-    prompt = ChatPromptTemplate.from_template(template=template)
+    prompt, chain = llm_registry.chain("answer", local_llm)
+    context = _prepare_context(context)
     formatted_prompt = prompt.format(question=question, context=context)
-
-    chain = prompt | llm | StrOutputParser()
     result = chain.invoke({"question": question, "context": context})
     return result, formatted_prompt
 
 
+async def agenerate_answer(question: str, context: list, local_llm: bool = True):
+    """
+    Asynchronously generate answer to the question based on the context.
+    """
+    prompt, chain = llm_registry.chain("answer", local_llm)
+    context = _prepare_context(context)
+    formatted_prompt = prompt.format(question=question, context=context)
+    async with limit(LLM):
+        result = await chain.ainvoke({"question": question, "context": context})
+    return result, formatted_prompt
+
+
 def answer_node(state: AgentState):
     """Generate answer node"""
     question = state["question"]
@@ -43,4 +68,16 @@ def answer_node(state: AgentState):
     answer, prompt = generate_answer(question, context)
     state["llm_output"] = answer
     state["prompt"] = prompt
+    state["answer_path"] = "generated"
+    return state
+
+
+async def aanswer_node(state: AgentState):
+    """Generate answer node (async)"""
+    question = state["question"]
+    context = state["documents"]
+    answer, prompt = await agenerate_answer(question, context)
+    state["llm_output"] = answer
+    state["prompt"] = prompt
+    state["answer_path"] = "generated"
     return state
@@ -0,0 +1,252 @@
+"""
+Batch question answering.
+
+Questions are processed in batches: the retrieval of a whole batch is done up
+front with one embedding call and one multi-query FAISS search, then the
+questions run through the workflow with bounded concurrency.
+
+Usage:
+    python -m src.graph.batch --input questions.jsonl --output results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from src.config import settings
+from src.graph.admission import Overloaded, request_scope
+from src.graph.executor import run_in_cpu_executor
+from src.graph.metrics import ADMISSIONS
+from src.graph.utils import batch_similarity_search
+
+
+class PrefetchingRetriever:
+    """
+    Retriever serving batch-prefetched results.
+
+    Wraps a FAISS `VectorStoreRetriever` or a `HybridRetriever`. Questions
+    prefetched with `prefetch` are answered from memory, any other question
+    goes to the wrapped retriever.
+    """
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self._prefetched: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def vectorstore(self):
+        return self.retriever.vectorstore
+
+    @property
+    def k(self) -> int:
+        return self.retriever.search_kwargs.get("k", settings.FAISS_TOP_K)
+
+    def prefetch(self, questions: List[str]) -> None:
+        """Retrieve the documents of many questions in a single search."""
+        unique_questions = list(dict.fromkeys(questions))
+        if hasattr(self.retriever, "batch_invoke"):
+            results = self.retriever.batch_invoke(unique_questions)
+        else:
+            results = [
+                [doc for doc, _ in docs_and_scores]
+                for docs_and_scores in batch_similarity_search(
+                    self.vectorstore, unique_questions, self.k
+                )
+            ]
+        with self._lock:
+            for question, documents in zip(unique_questions, results):
+                self._prefetched[question] = documents
+
+    def discard(self, questions: List[str]) -> None:
+        """Drop prefetched results that were not consumed."""
+        with self._lock:
+            for question in questions:
+                self._prefetched.pop(question, None)
+
+    def invoke(self, question: str, *args, **kwargs):
+        with self._lock:
+            documents = self._prefetched.pop(question, None)
+        if documents is not None:
+            return documents
+        return self.retriever.invoke(question, *args, **kwargs)
+
+
+async def abatch_answer(
+    graph,
+    retriever: PrefetchingRetriever,
+    questions: List[str],
+    max_concurrency: int = settings.BATCH_MAX_CONCURRENCY,
+    raise_overloaded: bool = False,
+    timeout: Optional[float] = None,
+    degraded: bool = False,
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Answer a batch of questions.
+
+    Args:
+        graph: The compiled workflow, built with `retriever`.
+        retriever (PrefetchingRetriever): The retriever used by the workflow.
+        questions (List[str]): The questions.
+        max_concurrency (int): Maximum number of questions in flight.
+        raise_overloaded (bool): Fail the batch when a question is rejected by
+            the admission control, instead of yielding an error for it.
+        timeout (Optional[float]): Deadline of each question, from the start
+            of its workflow. None for no deadline.
+        degraded (bool): Run the questions in the degraded mode, see
+            `src.graph.admission`.
+
+    Yields:
+        Tuple[int, Dict[str, Any]]: The index of the question and its final
+        state, in completion order. Failed questions yield `{"error": ...}`.
+
+    Raises:
+        Overloaded: If `raise_overloaded` and a downstream has no capacity left.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer(idx: int) -> Tuple[int, Any]:
+        async with semaphore:
+            with request_scope(timeout, degraded):
+                try:
+                    return idx, await asyncio.wait_for(
+                        graph.ainvoke({"question": questions[idx]}), timeout
+                    )
+                except asyncio.TimeoutError:
+                    ADMISSIONS.inc("request", "timeout")
+                    return idx, TimeoutError(f"Timed out after {timeout} s.")
+                except Exception as e:
+                    return idx, e
+
+    await run_in_cpu_executor(retriever.prefetch, questions)
+    tasks = [asyncio.create_task(answer(idx)) for idx in range(len(questions))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            idx, output = await next_done
+            if raise_overloaded and isinstance(output, Overloaded):
+                raise output
+            if isinstance(output, Exception):
+                logger.opt(exception=output).error(f"Failed to answer question {idx}.")
+                output = {"question": questions[idx], "error": str(output)}
+            yield idx, output
+    finally:
+        for task in tasks:
+            task.cancel()
+        retriever.discard(questions)
+
+
+def _read_questions(path: str, id_field: str, question_field: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [
+        {"id": row.get(id_field, idx), "question": row[question_field]}
+        for idx, row in enumerate(rows)
+    ]
+
+
+def _completed_ids(path: str) -> set:
+    """
+    Ids already written to the output file.
+
+    A last line left incomplete by a crash is truncated from the file.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    completed = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            completed.add(json.loads(line)["id"])
+    return completed
+
+
+async def run_batch(
+    graph,
+    retriever: PrefetchingRetriever,
+    input_path: str,
+    output_path: str,
+    id_field: str = "id",
+    question_field: str = "question",
+    batch_size: int = settings.BATCH_SIZE,
+    max_concurrency: int = settings.BATCH_MAX_CONCURRENCY,
+) -> None:
+    """
+    Answer the questions of a JSONL file and append the results to a JSONL file.
+
+    Results are written as soon as each question completes. Questions whose
+    id is already in the output file are skipped, so an interrupted run can be
+    resumed by running it again. Failed questions are written to
+    `<output>.errors.jsonl` instead, rewritten by each run, and retried by the
+    next one.
+    """
+    rows = _read_questions(input_path, id_field, question_field)
+    completed = _completed_ids(output_path)
+    pending = [row for row in rows if row["id"] not in completed]
+    logger.info(
+        f"{len(rows)} questions, {len(completed)} already answered, "
+        f"{len(pending)} to go."
+    )
+
+    errors_path = f"{os.path.splitext(output_path)[0]}.errors.jsonl"
+    out = open(output_path, "a", encoding="utf-8")
+    errors = open(errors_path, "w", encoding="utf-8")
+    with out, errors:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            async for idx, state in abatch_answer(
+                graph,
+                retriever,
+                [row["question"] for row in batch],
+                max_concurrency,
+            ):
+                f = errors if "error" in state else out
+                f.write(json.dumps({"id": batch[idx]["id"], **state}) + "\n")
+                f.flush()
+            os.fsync(out.fileno())
+            logger.info(f"Answered {start + len(batch)}/{len(pending)} questions.")
+
+
+if __name__ == "__main__":
+    from src.graph.graph import create_workflow
+    from src.graph.question_check_node import default_input_scanners
+    from src.graph.utils import load_faiss_index
+
+    parser = argparse.ArgumentParser(description="Answer questions in batches.")
+    parser.add_argument("--input", required=True, help="Input JSONL file.")
+    parser.add_argument("--output", required=True, help="Output JSONL file.")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument("--batch-size", type=int, default=settings.BATCH_SIZE)
+    parser.add_argument(
+        "--max-concurrency", type=int, default=settings.BATCH_MAX_CONCURRENCY
+    )
+    args = parser.parse_args()
+
+    retriever = PrefetchingRetriever(load_faiss_index())
+    input_scanners = default_input_scanners()
+    reranker = None
+    if settings.RERANK_ENABLED:
+        from src.graph.rerank_node import Reranker
+
+        reranker = Reranker()
+    app = create_workflow(retriever, input_scanners, reranker=reranker).compile()
+    asyncio.run(
+        run_batch(
+            app,
+            retriever,
+            args.input,
+            args.output,
+            args.id_field,
+            args.question_field,
+            args.batch_size,
+            args.max_concurrency,
+        )
+    )
@@ -0,0 +1,42 @@
+from typing import Any, Dict
+
+from src.graph.executor import run_in_cpu_executor
+from src.graph.state import AgentState
+
+
+def lookup_cache(state: AgentState, semantic_cache) -> Dict[str, Any]:
+    """
+    Answer the question from the semantic cache if a similar question was
+    already answered.
+    """
+    answer = semantic_cache.lookup(state["question"])
+    state["cache_hit"] = answer is not None
+    if answer is not None:
+        state["on_topic"] = "Yes"
+        state["llm_output"] = answer
+        state["answer_status"] = "valid"
+        state["answer_path"] = "cache"
+    return state
+
+
+async def alookup_cache(state: AgentState, semantic_cache) -> Dict[str, Any]:
+    """
+    Look up the semantic cache in the CPU executor.
+    """
+    return await run_in_cpu_executor(lookup_cache, state, semantic_cache)
+
+
+def store_cache(state: AgentState, semantic_cache) -> Dict[str, Any]:
+    """
+    Store a validated generated answer in the semantic cache.
+    """
+    if state["answer_status"] == "valid" and state.get("answer_path") == "generated":
+        semantic_cache.store(state["question"], state["llm_output"])
+    return state
+
+
+async def astore_cache(state: AgentState, semantic_cache) -> Dict[str, Any]:
+    """
+    Store a validated answer in the semantic cache in the CPU executor.
+    """
+    return await run_in_cpu_executor(store_cache, state, semantic_cache)
@@ -0,0 +1,139 @@
+"""
+Context assembly of the answer prompt.
+
+The retrieved documents are rendered compactly: only their answers, without
+the near duplicates, numbered in retrieval order and cut on sentence
+boundaries to fit `settings.CONTEXT_MAX_TOKENS`. Tokens are counted with the
+`settings.CONTEXT_TOKENIZER` tiktoken encoding, close to the Llama 3 one.
+tiktoken downloads the encoding on first use (cached in `TIKTOKEN_CACHE_DIR`),
+if it cannot be loaded the tokens are estimated from the text length.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, List
+
+from loguru import logger
+
+from src.config import settings
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+# Characters per token of the estimate used without tokenizer
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name: str = settings.CONTEXT_TOKENIZER):
+    """Load a tiktoken encoding, None if it is not available."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception:
+        logger.warning(
+            f"Failed to load the {name} tokenizer, estimating the context tokens "
+            "from its length."
+        )
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens of a text."""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(_WORD.findall(text.lower()))
+
+
+def dedup_answers(
+    answers: List[str], threshold: float = settings.CONTEXT_DEDUP_THRESHOLD
+) -> List[str]:
+    """
+    Drop the answers nearly identical to a previous one.
+
+    Args:
+        answers (List[str]): The answers, best first.
+        threshold (float): Jaccard similarity of the word sets above which two
+            answers are duplicates.
+
+    Returns:
+        List[str]: The first answer of each group of near duplicates.
+    """
+    kept, kept_words = [], []
+    for answer in answers:
+        words = _words(answer)
+        if any(
+            len(words & other) >= threshold * len(words | other) for other in kept_words
+        ):
+            continue
+        kept.append(answer)
+        kept_words.append(words)
+    return kept
+
+
+def _fit(units: List[str], max_tokens: int) -> List[str]:
+    """Longest prefix of the units (with a separator each) fitting the budget."""
+    fitted, used = [], 0
+    for unit in units:
+        used += count_tokens(unit) + 1
+        if used > max_tokens:
+            break
+        fitted.append(unit)
+    return fitted
+
+
+def truncate_to_budget(text: str, max_tokens: int, partial: bool = False) -> str:
+    """
+    Cut a text to its first sentences fitting in `max_tokens`.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): The token budget.
+        partial (bool): Cut the first sentence on a word boundary if it does
+            not fit on its own, instead of returning an empty text.
+    """
+    sentences = _fit(_SENTENCE_END.split(text.strip()), max_tokens)
+    if not sentences and partial:
+        return " ".join(_fit(text.split(), max_tokens))
+    return " ".join(sentences)
+
+
+def build_context(
+    documents: List[Any],
+    max_tokens: int = settings.CONTEXT_MAX_TOKENS,
+    dedup_threshold: float = settings.CONTEXT_DEDUP_THRESHOLD,
+) -> str:
+    """
+    Render the retrieved documents into the context of the answer prompt.
+
+    Args:
+        documents (List[Any]): The documents metadata, with their "answer", or
+            texts.
+        max_tokens (int): The token budget of the context.
+        dedup_threshold (float): See `dedup_answers`.
+
+    Returns:
+        str: One numbered answer per line, best first.
+    """
+    answers = [
+        # On a single line, the answers of the dataset are multi-line lists
+        " ".join((doc.get("answer", "") if isinstance(doc, dict) else str(doc)).split())
+        for doc in documents
+    ]
+    answers = dedup_answers([answer for answer in answers if answer], dedup_threshold)
+    lines, used = [], 0
+    for number, answer in enumerate(answers, start=1):
+        prefix = f"[{number}] "
+        remaining = max_tokens - used - count_tokens(prefix)
+        text = truncate_to_budget(answer, remaining, partial=not lines)
+        if not text:
+            break
+        lines.append(prefix + text)
+        used += count_tokens(lines[-1]) + 1
+    return "\n".join(lines)
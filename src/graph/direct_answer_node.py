@@ -0,0 +1,66 @@
+import re
+from typing import Any, Dict, Optional
+
+from src.config import settings
+from src.graph.executor import run_in_cpu_executor
+from src.graph.state import AgentState
+from src.graph.utils import cosine_similarities, search_positions
+
+# Template fields of the dataset answers, e.g. {{Order Number}}
+PLACEHOLDER = re.compile(r"\{\{[^{}]*\}\}")
+
+
+def match_indexed_question(
+    question: str,
+    vectorstore,
+    threshold: float = settings.DIRECT_ANSWER_THRESHOLD,
+    min_margin: float = settings.DIRECT_ANSWER_MIN_MARGIN,
+) -> Optional[Dict[str, Any]]:
+    """
+    Find the indexed question and answer pair matching the question.
+
+    Args:
+        question (str): The question.
+        vectorstore (FAISS): The vector store of the index.
+        threshold (float): Minimum cosine similarity of the top-1 question.
+        min_margin (float): Minimum similarity margin of the top-1 question
+            over the top-2 one.
+
+    Returns:
+        Optional[Dict[str, Any]]: The metadata of the matching document, or
+        None if there is no unambiguous near-exact match, or if its answer has
+        template placeholders (e.g. `{{Order Number}}`) to fill in.
+    """
+    distances, positions = search_positions(vectorstore, [question], 2)
+    similarities = cosine_similarities(vectorstore, distances)[0]
+    if positions[0][0] == -1 or similarities[0] < threshold:
+        return None
+    if positions[0][1] != -1 and similarities[0] - similarities[1] < min_margin:
+        return None
+    doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[positions[0][0]])
+    if PLACEHOLDER.search(doc.metadata.get("answer", "")):
+        return None
+    return doc.metadata
+
+
+def direct_answer(state: AgentState, vectorstore) -> Dict[str, Any]:
+    """
+    Answer with the stored answer of a near-exact match of the question.
+    """
+    match = match_indexed_question(state["question"], vectorstore)
+    if match is None:
+        return state
+    state["answer_path"] = "direct"
+    state["documents"] = [match]
+    # The output scanners check the answer against the question
+    state["prompt"] = state["question"]
+    state["llm_output"] = match["answer"]
+    state["answer_status"] = "valid"
+    return state
+
+
+async def adirect_answer(state: AgentState, vectorstore) -> Dict[str, Any]:
+    """
+    Look for a near-exact match of the question in the CPU executor.
+    """
+    return await run_in_cpu_executor(direct_answer, state, vectorstore)
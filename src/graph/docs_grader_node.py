@@ -1,9 +1,13 @@
+from typing import List, Tuple
+
+from langchain_core.exceptions import OutputParserException
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
-from pydantic import BaseModel, Field
+from loguru import logger
+from pydantic import BaseModel, Field, ValidationError
 
 from src.config import settings
+from src.graph.admission import LLM, limit
+from src.graph.llm import llm_registry
 from src.graph.state import AgentState
 
 
@@ -15,8 +19,16 @@ class GradeDocuments(BaseModel):
     )
 
 
-def retrieval_grader(doc: str, question: str, local_llm: bool = True):
-    """Create a grader to check the relevance of the retrieved documents."""
+class BatchGradeDocuments(BaseModel):
+    """Binary scores for relevance check on a batch of retrieved documents."""
+
+    binary_scores: List[str] = Field(
+        description="One 'yes' or 'no' per document, in the order of the documents"
+    )
+
+
+def _grader_chain(llm):
+    """Create the chain grading the relevance of a retrieved document."""
 
     system = """You are a grader assessing relevance of a retrieved document to a user question. \n
         If the document contains keyword(s) or semantic meaning related to the question, grade it as relevant. \n
@@ -30,33 +42,185 @@ def retrieval_grader(doc: str, question: str, local_llm: bool = True):
             ),
         ]
     )
-    if local_llm:
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL_NAME,
-            temperature=settings.LLM_TEMPERATURE,
-            max_tokens=settings.LLM_MAX_TOKENS,
+    if llm_registry.is_local(llm):
+        return grade_prompt | llm
+    structured_llm_grader = llm.with_structured_output(GradeDocuments)
+    return grade_prompt | structured_llm_grader
+
+
+llm_registry.register("grader", _grader_chain)
+
+
+def _batch_grader_chain(llm):
+    """Create the chain grading all the retrieved documents in a single call."""
+
+    system = """You are a grader assessing relevance of retrieved documents to a user question. \n
+        Each document is wrapped in <document id="..."> tags. \n
+        If a document contains keyword(s) or semantic meaning related to the question, grade it as relevant. \n
+        Give one binary score 'yes' or 'no' per document, in the order of the documents."""
+    grade_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", system),
+            (
+                "human",
+                "Retrieved documents: \n\n {documents} \n\n User question: {question}",
+            ),
+        ]
+    )
+    structured_llm_grader = llm.with_structured_output(BatchGradeDocuments)
+    return grade_prompt | structured_llm_grader
+
+
+llm_registry.register("batch_grader", _batch_grader_chain)
+
+
+def _parse_grade(grader_output) -> str:
+    """Extract the 'yes'/'no' grade from the grader output."""
+    if isinstance(grader_output, GradeDocuments):
+        return grader_output.binary_score
+    return grader_output.content
+
+
+def _format_documents(docs: list) -> str:
+    """Render the documents for the batch grading prompt."""
+    return "\n\n".join(
+        f'<document id="{idx}">\n{doc}\n</document>' for idx, doc in enumerate(docs)
+    )
+
+
+def _parse_batch_grades(grader_output, docs: list):
+    """
+    Extract one grade per document from the batch grader output.
+
+    Returns None if the output could not be parsed, or if the model did not
+    return exactly one grade per document.
+    """
+    if grader_output is None:
+        logger.warning(
+            "Batch grader output could not be parsed, "
+            "falling back to per-document grading."
         )
-        retrieval_grader = grade_prompt | llm
-        grader_output = retrieval_grader.invoke({"question": question, "document": doc})
-        return grader_output.content
-    else:
-        llm = ChatOpenAI(
-            model=settings.LLM_MODEL_NAME,
-            api_key=settings.OPENAI_API_KEY.get_secret_value(),
+        return None
+    grades = [grade.strip() for grade in grader_output.binary_scores]
+    if len(grades) != len(docs):
+        logger.warning(
+            f"Batch grader returned {len(grades)} grades for {len(docs)} documents, "
+            "falling back to per-document grading."
         )
-        structured_llm_grader = llm.with_structured_output(GradeDocuments)
-        retrieval_grader = grade_prompt | structured_llm_grader
-        grader_output = retrieval_grader.invoke({"question": question, "document": doc})
-    return grader_output.score
+        return None
+    return grades
+
+
+def retrieval_grader(doc: str, question: str, local_llm: bool = True):
+    """Create a grader to check the relevance of the retrieved documents."""
+    grader = llm_registry.chain("grader", local_llm)
+    grader_output = grader.invoke({"question": question, "document": doc})
+    return _parse_grade(grader_output)
+
+
+async def aretrieval_grader(doc: str, question: str, local_llm: bool = True):
+    """Asynchronously check the relevance of a retrieved document."""
+    grader = llm_registry.chain("grader", local_llm)
+    grader_output = await grader.ainvoke({"question": question, "document": doc})
+    return _parse_grade(grader_output)
+
+
+def grade_documents(docs: list, question: str, local_llm: bool = True) -> List[str]:
+    """
+    Grade all the documents of a request according to `settings.DOCS_GRADER_MODE`.
+
+    Returns:
+        List[str]: One 'yes'/'no' grade per document.
+    """
+    if not docs:
+        return []
+    if settings.DOCS_GRADER_MODE == "sequential":
+        return [retrieval_grader(doc, question, local_llm) for doc in docs]
+    if settings.DOCS_GRADER_MODE == "batched":
+        grader = llm_registry.chain("batch_grader", local_llm)
+        try:
+            grader_output = grader.invoke(
+                {"question": question, "documents": _format_documents(docs)}
+            )
+        except (OutputParserException, ValidationError):
+            grader_output = None
+        grades = _parse_batch_grades(grader_output, docs)
+        if grades is not None:
+            return grades
+    grader = llm_registry.chain("grader", local_llm)
+    grader_outputs = grader.batch(
+        [{"question": question, "document": doc} for doc in docs],
+        config={"max_concurrency": settings.DOCS_GRADER_MAX_CONCURRENCY},
+    )
+    return [_parse_grade(grader_output) for grader_output in grader_outputs]
+
+
+async def agrade_documents(
+    docs: list, question: str, local_llm: bool = True
+) -> List[str]:
+    """
+    Asynchronously grade all the documents of a request according to
+    `settings.DOCS_GRADER_MODE`.
+
+    Returns:
+        List[str]: One 'yes'/'no' grade per document.
+    """
+    if not docs:
+        return []
+    if settings.DOCS_GRADER_MODE == "sequential":
+        return [await aretrieval_grader(doc, question, local_llm) for doc in docs]
+    if settings.DOCS_GRADER_MODE == "batched":
+        grader = llm_registry.chain("batch_grader", local_llm)
+        try:
+            grader_output = await grader.ainvoke(
+                {"question": question, "documents": _format_documents(docs)}
+            )
+        except (OutputParserException, ValidationError):
+            grader_output = None
+        grades = _parse_batch_grades(grader_output, docs)
+        if grades is not None:
+            return grades
+    grader = llm_registry.chain("grader", local_llm)
+    grader_outputs = await grader.abatch(
+        [{"question": question, "document": doc} for doc in docs],
+        config={"max_concurrency": settings.DOCS_GRADER_MAX_CONCURRENCY},
+    )
+    return [_parse_grade(grader_output) for grader_output in grader_outputs]
+
+
+def _split_documents(state: AgentState) -> Tuple[list, list]:
+    """
+    Get the documents already accepted and the documents to grade.
+
+    When the reranker ran, only its borderline documents are graded.
+    """
+    pending = state.get("pending_documents")
+    if pending is None:
+        return [], state["documents"]
+    return state["documents"], pending
 
 
 def grade_documents_node(state: AgentState):
-    docs = state["documents"]
+    accepted, docs = _split_documents(state)
+    question = state["question"]
+    grades = grade_documents(docs, question)
+    filtered_docs = [
+        doc for doc, grade in zip(docs, grades) if grade.strip().lower() == "yes"
+    ]
+    state["documents"] = accepted + filtered_docs
+    return state
+
+
+async def agrade_documents_node(state: AgentState):
+    accepted, docs = _split_documents(state)
     question = state["question"]
-    filtered_docs = []
-    for doc in docs:
-        grade = retrieval_grader(doc, question)
-        if grade.lower() == "yes":
-            filtered_docs.append(doc)
-    state["documents"] = filtered_docs
+    grades = []
+    if docs:
+        # One LLM slot for all the grading calls of the request
+        async with limit(LLM):
+            grades = await agrade_documents(docs, question)
+    filtered_docs = [
+        doc for doc, grade in zip(docs, grades) if grade.strip().lower() == "yes"
+    ]
+    state["documents"] = accepted + filtered_docs
     return state
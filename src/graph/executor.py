@@ -0,0 +1,56 @@
+"""
+Bounded thread pool used to offload CPU-bound work from the event loop.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from src.config import settings
+
+T = TypeVar("T")
+
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """
+    Get the shared executor for CPU-bound work (scanners, embeddings).
+
+    The pool is bounded by `settings.CPU_EXECUTOR_WORKERS` so that concurrent
+    requests queue up instead of oversubscribing the CPU with model inference.
+    """
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ThreadPoolExecutor(
+            max_workers=settings.CPU_EXECUTOR_WORKERS,
+            thread_name_prefix="cpu-bound",
+        )
+    return _cpu_executor
+
+
+async def run_in_cpu_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking function in the CPU executor without blocking the event loop.
+
+    Args:
+        func (Callable): The blocking function.
+        *args: Positional arguments for the function.
+        **kwargs: Keyword arguments for the function.
+
+    Returns:
+        The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_cpu_executor(), partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_cpu_executor() -> None:
+    """Shut down the CPU executor, waiting for running tasks to finish."""
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=True)
+        _cpu_executor = None
@@ -4,65 +4,281 @@ Graph-based workflow for the language model guard.
 
 from functools import partial
 
-from langgraph.graph import END, StateGraph
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, START, StateGraph
 
 # local imports
-from src.graph.answer_check_node import scan_output_answer
-from src.graph.answer_node import answer_node
-from src.graph.docs_grader_node import grade_documents_node
-from src.graph.question_check_node import scan_input_question
-from src.graph.retriever_node import retrieve
+from src.config import settings
+from src.graph.answer_check_node import ascan_output_answer, scan_output_answer
+from src.graph.answer_node import aanswer_node, answer_node
+from src.graph.cache_node import alookup_cache, astore_cache, lookup_cache, store_cache
+from src.graph.direct_answer_node import adirect_answer, direct_answer
+from src.graph.docs_grader_node import agrade_documents_node, grade_documents_node
+from src.graph.join_node import ajoin_gates, join_gates
+from src.graph.metrics import instrument
+from src.graph.question_check_node import ascan_input_question, scan_input_question
+from src.graph.rerank_node import arerank, rerank
+from src.graph.retriever_node import aretrieve, retrieve
+from src.graph.scanner_engine import ScannerEngine
 from src.graph.state import AgentState
-from src.graph.topic_check_node import topic_classifier
+from src.graph.topic_check_node import atopic_classifier, topic_classifier
 from src.graph.utils import load_faiss_index
 
 
-def create_workflow(retriever, input_scanners):
-    """Create a workflow."""
+def _updates_only(func, afunc):
+    """
+    Make a node return only the keys it changed, so that it can run in
+    parallel with other nodes writing other keys.
+    """
+
+    def changes(before: dict, state: dict) -> dict:
+        return {
+            key: value for key, value in state.items() if before.get(key) is not value
+        }
+
+    def wrapped(state):
+        before = dict(state)
+        return changes(before, func(state))
+
+    async def awrapped(state):
+        before = dict(state)
+        return changes(before, await afunc(state))
+
+    return wrapped, awrapped
+
+
+def _node(
+    name: str, func, afunc, updates_only: bool = False, **kwargs
+) -> RunnableLambda:
+    """
+    Wrap a node so that the compiled graph can run it with both `invoke` and
+    `ainvoke`. The async variant is used on the `ainvoke` path so that LLM
+    calls are awaited and CPU-bound work is offloaded to the CPU executor.
+
+    Both variants record the duration and outcome of the node in the metrics.
+    """
+    func, afunc = partial(func, **kwargs), partial(afunc, **kwargs)
+    if updates_only:
+        func, afunc = _updates_only(func, afunc)
+    if settings.METRICS_ENABLED:
+        # The exits of the speculative nodes are counted by the join node
+        func, afunc = instrument(name, func, afunc, exits=not updates_only)
+    return RunnableLambda(func, afunc=afunc, name=name)
+
+
+def create_workflow(
+    retriever,
+    input_scanners,
+    output_scanners=None,
+    semantic_cache=None,
+    reranker=None,
+    mode: str = settings.WORKFLOW_MODE,
+):
+    """
+    Create a workflow.
+
+    In the "sequential" mode, the question is scanned, then classified, then
+    its documents are retrieved. In the "speculative" mode, the three steps
+    start together on the raw question and a join node discards the topic and
+    retrieval results when the question is rejected, so that the latency is
+    the slowest of the three steps instead of their sum.
+
+    If a semantic cache is given, valid questions are looked up in it before
+    topic classification (after the join in the speculative mode), and
+    validated answers are stored in it.
+
+    If a reranker is given, the retrieved documents are reranked and only the
+    borderline ones are sent to the LLM grader, which is skipped when there
+    are none.
+
+    The scanners are run by a `ScannerEngine` (parallel scanners, batching
+    across requests), lists of llm_guard scanners are wrapped in one.
+
+    In the "embedding" topic classifier mode, the topic is decided from the
+    similarity of the question to the indexed questions, with the LLM only
+    deciding the uncertain ones.
+
+    If direct answers are enabled, a question nearly identical to an indexed
+    question gets its stored answer, without grading nor generation (only the
+    output scan, if `settings.DIRECT_ANSWER_SCAN_OUTPUT`).
+    """
+    speculative = mode == "speculative"
+    input_scanners = ScannerEngine.of(input_scanners)
+    if output_scanners is not None:
+        output_scanners = ScannerEngine.of(output_scanners)
+    index_vectorstore = getattr(retriever, "vectorstore", None)
+    vectorstore = None
+    if settings.TOPIC_CLASSIFIER_MODE == "embedding":
+        vectorstore = index_vectorstore
+    direct = settings.DIRECT_ANSWER_ENABLED and index_vectorstore is not None
     workflow = StateGraph(AgentState)
     workflow.add_node(
         "scan_question",
-        partial(scan_input_question, input_scanners=input_scanners),
-    )
-    workflow.add_node("topic_classifier", topic_classifier)
-    workflow.add_node("retrieve_docs", partial(retrieve, faiss_retriever=retriever))
-    workflow.add_node("docs_grader", grade_documents_node)
-    workflow.add_node("generate_answer", answer_node)
-    workflow.add_node("check_answer", scan_output_answer)
-    workflow.add_conditional_edges(
-        "scan_question",
-        lambda state: state["question_status"],
-        {
-            "valid": "topic_classifier",
-            "invalid": END,
-        },
+        _node(
+            "scan_question",
+            scan_input_question,
+            ascan_input_question,
+            updates_only=speculative,
+            input_scanners=input_scanners,
+        ),
     )
-    workflow.add_conditional_edges(
+    workflow.add_node(
         "topic_classifier",
-        lambda state: state["on_topic"],
-        {
-            "Yes": "retrieve_docs",
-            "No": END,
-        },
+        _node(
+            "topic_classifier",
+            topic_classifier,
+            atopic_classifier,
+            updates_only=speculative,
+            vectorstore=vectorstore,
+        ),
+    )
+    workflow.add_node(
+        "retrieve_docs",
+        _node(
+            "retrieve_docs",
+            retrieve,
+            aretrieve,
+            updates_only=speculative,
+            faiss_retriever=retriever,
+        ),
+    )
+    if speculative:
+        workflow.add_node(
+            "join_gates",
+            _node(
+                "join_gates",
+                join_gates,
+                ajoin_gates,
+                faiss_retriever=retriever,
+                vectorstore=vectorstore,
+            ),
+        )
+    if direct:
+        workflow.add_node(
+            "direct_answer",
+            _node(
+                "direct_answer",
+                direct_answer,
+                adirect_answer,
+                vectorstore=index_vectorstore,
+            ),
+        )
+    if reranker is not None:
+        workflow.add_node(
+            "rerank_docs", _node("rerank_docs", rerank, arerank, reranker=reranker)
+        )
+    workflow.add_node(
+        "docs_grader", _node("docs_grader", grade_documents_node, agrade_documents_node)
+    )
+    workflow.add_node(
+        "generate_answer", _node("generate_answer", answer_node, aanswer_node)
+    )
+    workflow.add_node(
+        "check_answer",
+        _node(
+            "check_answer",
+            scan_output_answer,
+            ascan_output_answer,
+            output_scanners=output_scanners,
+        ),
     )
-    workflow.add_edge("retrieve_docs", "docs_grader")
+    if semantic_cache is not None:
+        workflow.add_node(
+            "cache_lookup",
+            _node(
+                "cache_lookup",
+                lookup_cache,
+                alookup_cache,
+                semantic_cache=semantic_cache,
+            ),
+        )
+        workflow.add_node(
+            "cache_store",
+            _node(
+                "cache_store", store_cache, astore_cache, semantic_cache=semantic_cache
+            ),
+        )
+    # First step on the retrieved documents
+    docs_step = "rerank_docs" if reranker is not None else "docs_grader"
+    retrieved_step = "direct_answer" if direct else docs_step
+    if speculative:
+        for step in ("scan_question", "topic_classifier", "retrieve_docs"):
+            workflow.add_edge(START, step)
+        workflow.add_edge(
+            ["scan_question", "topic_classifier", "retrieve_docs"], "join_gates"
+        )
+        workflow.add_conditional_edges(
+            "join_gates",
+            lambda state: (
+                state["question_status"] == "valid" and state["on_topic"] == "Yes"
+            ),
+            {
+                True: "cache_lookup" if semantic_cache else retrieved_step,
+                False: END,
+            },
+        )
+    else:
+        workflow.add_conditional_edges(
+            "scan_question",
+            lambda state: state["question_status"],
+            {
+                "valid": "cache_lookup" if semantic_cache else "topic_classifier",
+                "invalid": END,
+            },
+        )
+        workflow.add_conditional_edges(
+            "topic_classifier",
+            lambda state: state["on_topic"],
+            {
+                "Yes": "retrieve_docs",
+                "No": END,
+            },
+        )
+        workflow.add_edge("retrieve_docs", retrieved_step)
+        workflow.set_entry_point("scan_question")
+    if semantic_cache is not None:
+        workflow.add_conditional_edges(
+            "cache_lookup",
+            lambda state: state["cache_hit"],
+            {
+                True: END,
+                False: retrieved_step if speculative else "topic_classifier",
+            },
+        )
+    if direct:
+        workflow.add_conditional_edges(
+            "direct_answer",
+            lambda state: state.get("answer_path") == "direct",
+            {
+                True: "check_answer" if settings.DIRECT_ANSWER_SCAN_OUTPUT else END,
+                False: docs_step,
+            },
+        )
+    if reranker is not None:
+        workflow.add_conditional_edges(
+            "rerank_docs",
+            lambda state: bool(state["pending_documents"]),
+            {
+                True: "docs_grader",
+                False: "generate_answer",
+            },
+        )
     workflow.add_edge("docs_grader", "generate_answer")
     workflow.add_edge("generate_answer", "check_answer")
-    workflow.add_edge("check_answer", END)
-    workflow.set_entry_point("scan_question")
+    if semantic_cache is not None:
+        workflow.add_edge("check_answer", "cache_store")
+        workflow.add_edge("cache_store", END)
+    else:
+        workflow.add_edge("check_answer", END)
     return workflow
 
 
 if __name__ == "__main__":
-    from llm_guard.input_scanners import PromptInjection, TokenLimit, Toxicity
+    from src.graph.question_check_node import default_input_scanners
 
     # Load the FAISS index
     faiss_retriever = load_faiss_index()
-    input_scanners = [
-        PromptInjection(),
-        TokenLimit(),
-        Toxicity(),
-    ]
+    input_scanners = default_input_scanners()
 
     workflow = create_workflow(faiss_retriever, input_scanners)
     app = workflow.compile()
@@ -0,0 +1,160 @@
+"""
+Hybrid retrieval: dense FAISS search fused with BM25 keyword search.
+
+Dense retrieval misses exact tokens such as order numbers, while BM25 misses
+paraphrases. Both retrievers are searched concurrently and their rankings are
+fused, either with reciprocal rank fusion (RRF) or with a weighted sum of
+min-max normalized scores.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+from src.config import settings
+from src.graph.utils import search_positions
+from src.indexing.bm25 import BM25Index
+
+# Dedicated pool for the BM25 leg: the dense leg runs in the calling thread,
+# which may itself be a CPU executor thread.
+_bm25_executor = ThreadPoolExecutor(
+    max_workers=settings.CPU_EXECUTOR_WORKERS, thread_name_prefix="bm25"
+)
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[int]], weights: List[float], k: int = settings.HYBRID_RRF_K
+) -> Dict[int, float]:
+    """
+    Fuse rankings with weighted reciprocal rank fusion.
+
+    Args:
+        rankings (List[List[int]]): Document numbers of each ranking, best first.
+        weights (List[float]): Weight of each ranking.
+        k (int): RRF constant, damping the weight of the first ranks.
+
+    Returns:
+        Dict[int, float]: The fused score of each document.
+    """
+    scores: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking):
+            scores[doc] = scores.get(doc, 0.0) + weight / (k + rank + 1)
+    return scores
+
+
+def weighted_fusion(
+    results: List[List[Tuple[int, float]]], weights: List[float]
+) -> Dict[int, float]:
+    """
+    Fuse scored results with a weighted sum of min-max normalized scores.
+
+    Args:
+        results (List[List[Tuple[int, float]]]): Document numbers and scores
+            (higher is better) of each retriever.
+        weights (List[float]): Weight of each retriever.
+
+    Returns:
+        Dict[int, float]: The fused score of each document.
+    """
+    scores: Dict[int, float] = {}
+    for result, weight in zip(results, weights):
+        if not result:
+            continue
+        values = np.asarray([score for _, score in result])
+        low, high = values.min(), values.max()
+        normalized = (
+            (values - low) / (high - low) if high > low else np.ones_like(values)
+        )
+        for (doc, _), value in zip(result, normalized):
+            scores[doc] = scores.get(doc, 0.0) + weight * float(value)
+    return scores
+
+
+class HybridRetriever:
+    """
+    Retriever fusing FAISS and BM25 results.
+
+    Args:
+        vectorstore (FAISS): The FAISS vector store.
+        bm25 (BM25Index): The BM25 index, numbered by FAISS index position.
+        k (int): Number of documents returned.
+        dense_k (int): Number of documents from the FAISS search.
+        sparse_k (int): Number of documents from the BM25 search.
+        fusion (str): "rrf" or "weighted".
+        dense_weight (float): Weight of the FAISS results, BM25 gets the rest.
+    """
+
+    def __init__(
+        self,
+        vectorstore: FAISS,
+        bm25: BM25Index,
+        k: int = settings.FAISS_TOP_K,
+        dense_k: int = settings.HYBRID_DENSE_K,
+        sparse_k: int = settings.HYBRID_SPARSE_K,
+        fusion: str = settings.HYBRID_FUSION,
+        dense_weight: float = settings.HYBRID_DENSE_WEIGHT,
+    ):
+        self.vectorstore = vectorstore
+        self.bm25 = bm25
+        self.search_kwargs = {"k": k}
+        self.dense_k = dense_k
+        self.sparse_k = sparse_k
+        self.fusion = fusion
+        self.dense_weight = dense_weight
+
+    def _dense_results(self, questions: List[str]) -> List[List[Tuple[int, float]]]:
+        distances, positions = search_positions(
+            self.vectorstore, questions, self.dense_k
+        )
+        # Higher is better for the fusion
+        sign = (
+            1.0
+            if self.vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+            else -1.0
+        )
+        return [
+            [
+                (int(i), sign * float(d))
+                for d, i in zip(row_distances, row_positions)
+                if i != -1
+            ]
+            for row_distances, row_positions in zip(distances, positions)
+        ]
+
+    def _sparse_results(self, questions: List[str]) -> List[List[Tuple[int, float]]]:
+        return [self.bm25.search(question, self.sparse_k) for question in questions]
+
+    def _fuse(
+        self, dense: List[Tuple[int, float]], sparse: List[Tuple[int, float]]
+    ) -> List[Document]:
+        weights = [self.dense_weight, 1 - self.dense_weight]
+        if self.fusion == "weighted":
+            scores = weighted_fusion([dense, sparse], weights)
+        else:
+            # Equal weights are the standard RRF, 2x scales both legs alike
+            scores = reciprocal_rank_fusion(
+                [[doc for doc, _ in dense], [doc for doc, _ in sparse]],
+                [2 * weight for weight in weights],
+            )
+        best = sorted(scores, key=scores.get, reverse=True)[: self.search_kwargs["k"]]
+        return [
+            self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[i])
+            for i in best
+        ]
+
+    def batch_invoke(self, questions: List[str]) -> List[List[Document]]:
+        """Retrieve the documents of many questions, both legs concurrently."""
+        if not questions:
+            return []
+        sparse_future = _bm25_executor.submit(self._sparse_results, questions)
+        dense = self._dense_results(questions)
+        sparse = sparse_future.result()
+        return [self._fuse(d, s) for d, s in zip(dense, sparse)]
+
+    def invoke(self, question: str, *args, **kwargs) -> List[Document]:
+        return self.batch_invoke([question])[0]
@@ -0,0 +1,62 @@
+"""
+Join node of the speculative workflow.
+
+In the speculative mode the input scan, the topic classification and the
+retrieval start together on the raw question. The join node waits for the
+three of them and applies the gates: a rejected question discards the topic
+and retrieval results, and a question rewritten by the scanners has its topic
+and documents recomputed on the sanitized question.
+"""
+
+from typing import Any, Dict, Optional
+
+from src.graph.question_check_node import INVALID_QUESTION_MESSAGE
+from src.graph.retriever_node import aretrieve, retrieve
+from src.graph.state import AgentState
+from src.graph.topic_check_node import atopic_classifier, topic_classifier
+
+
+def _apply_gates(state: AgentState) -> bool:
+    """
+    Discard the speculative results of a rejected question.
+
+    Returns:
+        bool: True if the speculative results must be recomputed.
+    """
+    if state["question_status"] == "invalid":
+        state["llm_output"] = INVALID_QUESTION_MESSAGE
+        state["documents"] = []
+        return False
+    if state.get("question_sanitized"):
+        return True
+    if state["on_topic"] == "No":
+        state["documents"] = []
+    return False
+
+
+def join_gates(
+    state: AgentState, faiss_retriever, vectorstore: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Join the speculative scan, topic classification and retrieval.
+    """
+    if _apply_gates(state):
+        state = topic_classifier(state, vectorstore)
+        state["documents"] = []
+        if state["on_topic"] == "Yes":
+            state = retrieve(state, faiss_retriever)
+    return state
+
+
+async def ajoin_gates(
+    state: AgentState, faiss_retriever, vectorstore: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Join the speculative scan, topic classification and retrieval (async).
+    """
+    if _apply_gates(state):
+        state = await atopic_classifier(state, vectorstore)
+        state["documents"] = []
+        if state["on_topic"] == "Yes":
+            state = await aretrieve(state, faiss_retriever)
+    return state
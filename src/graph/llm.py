@@ -0,0 +1,134 @@
+"""
+Registry of long-lived chat models and chains shared by the graph nodes.
+
+Creating a `ChatOllama`/`ChatOpenAI` object creates new HTTP clients, so
+building one per call pays the client setup and a fresh connection handshake
+every time. The registry builds each model once, with a keep-alive connection
+pool, and caches the prompt | model chains built on top of it.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+import httpx
+from loguru import logger
+
+from src.config import settings
+from src.graph.metrics import token_usage_callback
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS
+    )
+
+
+class LLMRegistry:
+    """Build chat models and chains once and share them across requests."""
+
+    def __init__(self):
+        self._builders: Dict[str, Callable[[Any], Any]] = {}
+        self._llms: Dict[bool, Any] = {}
+        self._chains: Dict[Tuple[str, bool], Any] = {}
+        self._http_clients: list = []
+        self._lock = threading.Lock()
+
+    def _create_llm(self, local_llm: bool):
+        callbacks = [token_usage_callback] if settings.METRICS_ENABLED else None
+        if local_llm:
+            from langchain_ollama import ChatOllama
+
+            return ChatOllama(
+                model=settings.OLLAMA_MODEL_NAME,
+                temperature=settings.LLM_TEMPERATURE,
+                max_tokens=settings.LLM_MAX_TOKENS,
+                client_kwargs={"timeout": _http_timeout(), "limits": _http_limits()},
+                callbacks=callbacks,
+            )
+
+        from langchain_openai import ChatOpenAI
+
+        http_client = httpx.Client(limits=_http_limits(), timeout=_http_timeout())
+        http_async_client = httpx.AsyncClient(
+            limits=_http_limits(), timeout=_http_timeout()
+        )
+        self._http_clients.extend([http_client, http_async_client])
+        return ChatOpenAI(
+            model=settings.LLM_MODEL_NAME,
+            api_key=settings.OPENAI_API_KEY.get_secret_value(),
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            callbacks=callbacks,
+        )
+
+    def llm(self, local_llm: bool = True):
+        """
+        Get the shared chat model.
+
+        Args:
+            local_llm (bool): Use the local Ollama model instead of OpenAI.
+        """
+        if local_llm not in self._llms:
+            with self._lock:
+                if local_llm not in self._llms:
+                    self._llms[local_llm] = self._create_llm(local_llm)
+        return self._llms[local_llm]
+
+    def is_local(self, llm) -> bool:
+        """Whether the chat model is the local Ollama model."""
+        return llm is self._llms.get(True)
+
+    def register(self, name: str, builder: Callable[[Any], Any]) -> None:
+        """
+        Register a chain builder.
+
+        Args:
+            name (str): Unique name of the chain.
+            builder (Callable): Function building the chain from the chat model.
+        """
+        self._builders[name] = builder
+
+    def chain(self, name: str, local_llm: bool = True):
+        """
+        Get a registered chain, built on top of the shared chat model.
+
+        Args:
+            name (str): Name of the chain.
+            local_llm (bool): Use the local Ollama model instead of OpenAI.
+        """
+        key = (name, local_llm)
+        if key not in self._chains:
+            llm = self.llm(local_llm)
+            with self._lock:
+                if key not in self._chains:
+                    self._chains[key] = self._builders[name](llm)
+        return self._chains[key]
+
+    def warmup(self, local_llm: bool = True) -> None:
+        """Build the chat model and every registered chain ahead of the first request."""
+        logger.info("Creating the LLM clients...")
+        for name in self._builders:
+            self.chain(name, local_llm)
+
+    async def aclose(self):
+        """Close the HTTP connection pools and drop the cached models."""
+        for client in self._http_clients:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                client.close()
+        self._http_clients.clear()
+        self._chains.clear()
+        self._llms.clear()
+
+
+llm_registry = LLMRegistry()
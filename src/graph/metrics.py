@@ -0,0 +1,402 @@
+"""
+Per-node instrumentation of the workflow and metrics in the Prometheus text
+format.
+
+Every node registered in `create_workflow` records its duration in a
+histogram, and the nodes that can end a request early count the exits
+(invalid question, off-topic, cache hit, direct answer, invalid answer). LLM
+token counts are recorded by a callback attached to the shared chat models.
+Recording is a few dictionary updates under a lock, the text is only rendered
+on scrape.
+
+A request can also collect its stage breakdown with `trace_request`.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stage timings of the current request, when traced
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "trace", default=None
+)
+# Node running in the current context, used to attribute LLM tokens
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic counter with labels.
+
+    Args:
+        name (str): Metric name.
+        help (str): Metric description.
+        labels (Sequence[str]): Label names.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets and labels.
+
+    Args:
+        name (str): Metric name.
+        help (str): Metric description.
+        labels (Sequence[str]): Label names.
+        buckets (Sequence[float]): Upper bounds of the buckets, increasing.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label values: bucket counts (the last one is +Inf), sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                label_values, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, *label_values: str) -> int:
+        values = self._values.get(label_values)
+        return sum(values[0]) if values else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [
+                (label_values, list(counts), total[0])
+                for label_values, (counts, total) in self._values.items()
+            ]
+        for label_values, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _format_labels(
+                    (*self.labels, "le"),
+                    (*label_values, bound if bound == "+Inf" else repr(bound)),
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackMetric:
+    """
+    Metric whose values are read from a function at scrape time, e.g. the
+    counters kept by a cache.
+
+    Args:
+        name (str): Metric name.
+        help (str): Metric description.
+        type (str): Prometheus metric type ("counter" or "gauge").
+        labels (Sequence[str]): Label names.
+        func (Callable): Returns the value of each label values tuple.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        type: str,
+        labels: Sequence[str],
+        func: Callable[[], Dict[Tuple[str, ...], float]],
+    ):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = tuple(labels)
+        self.func = func
+
+    def samples(self) -> Iterator[str]:
+        for label_values, value in self.func().items():
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        type: str,
+        labels: Sequence[str],
+        func: Callable[[], Dict[Tuple[str, ...], float]],
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, type, labels, func))
+
+    def render(self) -> str:
+        """Render all the metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+NODE_DURATION = registry.histogram(
+    "rag_node_duration_seconds",
+    "Duration of the workflow nodes.",
+    ("node", "status"),
+)
+REQUEST_DURATION = registry.histogram(
+    "rag_request_duration_seconds",
+    "Duration of the requests answered by the workflow.",
+    ("endpoint",),
+)
+EXITS = registry.counter(
+    "rag_exits_total",
+    "Requests ending before the answer is generated, or with an invalid answer.",
+    ("reason",),
+)
+TOPIC_DECISIONS = registry.counter(
+    "rag_topic_decisions_total",
+    "Topic classifications by deciding classifier.",
+    ("classifier",),
+)
+CONTEXT_TOKENS = registry.histogram(
+    "rag_context_tokens",
+    "Tokens of the context sent to the answer generation.",
+    buckets=(32, 64, 128, 256, 384, 512, 768, 1024, 2048),
+)
+ADMISSIONS = registry.counter(
+    "rag_admissions_total",
+    "Admission decisions of the downstream calls and the requests.",
+    ("downstream", "outcome"),
+)
+LLM_TOKENS = registry.counter(
+    "rag_llm_tokens_total",
+    "LLM tokens used by the workflow nodes.",
+    ("node", "type"),
+)
+
+# Caches with `stats()` hits and misses counters, by name
+_caches: Dict[str, Any] = {}
+
+
+def register_cache(name: str, cache: Any) -> None:
+    """Expose the hits and misses of a cache (e.g. the semantic cache)."""
+    _caches[name] = cache
+
+
+def _cache_lookups() -> Dict[Tuple[str, ...], float]:
+    values = {}
+    for name, cache in list(_caches.items()):
+        stats = cache.stats()
+        values[(name, "hit")] = stats["hits"]
+        values[(name, "miss")] = stats["misses"]
+    return values
+
+
+registry.callback(
+    "rag_cache_lookups_total",
+    "Cache lookups by result.",
+    "counter",
+    ("cache", "result"),
+    _cache_lookups,
+)
+
+
+def _join_exit_reason(state: Dict[str, Any]) -> Optional[str]:
+    if state.get("question_status") == "invalid":
+        return "invalid_question"
+    if state.get("on_topic") == "No":
+        return "off_topic"
+    return None
+
+
+# Exit reason of the nodes that can end a request, from their output state. The
+# speculative nodes run in parallel, their exit is decided by the join node.
+EXIT_REASONS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "scan_question": lambda state: (
+        "invalid_question" if state.get("question_status") == "invalid" else None
+    ),
+    "cache_lookup": lambda state: "cache_hit" if state.get("cache_hit") else None,
+    "direct_answer": lambda state: (
+        "direct_answer" if state.get("answer_path") == "direct" else None
+    ),
+    "topic_classifier": lambda state: (
+        "off_topic" if state.get("on_topic") == "No" else None
+    ),
+    "check_answer": lambda state: (
+        "invalid_answer" if state.get("answer_status") == "invalid" else None
+    ),
+    "join_gates": _join_exit_reason,
+}
+
+
+def _record(node: str, elapsed: float, state: Any, exits: bool = True) -> None:
+    NODE_DURATION.observe(elapsed, node, "ok" if state is not None else "error")
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((node, elapsed))
+    exit_reason = EXIT_REASONS.get(node) if exits else None
+    if state is not None and exit_reason is not None:
+        reason = exit_reason(state)
+        if reason is not None:
+            EXITS.inc(reason)
+
+
+def instrument(
+    node: str, func: Callable, afunc: Callable, exits: bool = True
+) -> Tuple[Callable, Callable]:
+    """
+    Wrap the sync and async variants of a node with timing and outcome
+    recording.
+
+    Args:
+        node (str): Name of the node in the graph.
+        func (Callable): The node function.
+        afunc (Callable): The async node function.
+        exits (bool): Count the exit reason of the node, False for the nodes
+            whose output may still be discarded (speculative nodes).
+    """
+
+    def wrapped(state, *args, **kwargs):
+        token = current_node.set(node)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(state, *args, **kwargs)
+            return result
+        finally:
+            _record(node, time.perf_counter() - start, result, exits)
+            current_node.reset(token)
+
+    async def awrapped(state, *args, **kwargs):
+        token = current_node.set(node)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await afunc(state, *args, **kwargs)
+            return result
+        finally:
+            _record(node, time.perf_counter() - start, result, exits)
+            current_node.reset(token)
+
+    return wrapped, awrapped
+
+
+@contextmanager
+def trace_request() -> Iterator[List[Tuple[str, float]]]:
+    """
+    Collect the (node, seconds) timings of the nodes run in this context.
+    """
+    trace: List[Tuple[str, float]] = []
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def server_timing(trace: List[Tuple[str, float]], total: float) -> str:
+    """Format a stage breakdown as a `Server-Timing` header value."""
+    stages = [f"{node};dur={seconds * 1000:.1f}" for node, seconds in trace]
+    return ", ".join([*stages, f"total;dur={total * 1000:.1f}"])
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Count the LLM tokens of each node, from the usage of the responses."""
+
+    # Called in the calling context, so that `current_node` is the node
+    run_inline = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        node = current_node.get() or "unknown"
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(node, "input", amount=usage.get("input_tokens", 0))
+                    LLM_TOKENS.inc(node, "output", amount=usage.get("output_tokens", 0))
+
+
+token_usage_callback = TokenUsageCallback()
@@ -1,27 +1,68 @@
-from typing import Any, Dict
-
-from llm_guard import scan_prompt
+from typing import Any, Dict, Optional
 
+from src.config import settings
+from src.graph.admission import SCANNERS, limit
+from src.graph.executor import run_in_cpu_executor
 from src.graph.state import AgentState
+from src.inference import configure_threads, scanner_kwargs
+
+INVALID_QUESTION_MESSAGE = "Please provide a valid question with clear intent."
+
+_default_input_scanners: Optional[list] = None
+
+
+def default_input_scanners() -> list:
+    """Get the default input scanners, on the configured inference backend."""
+    global _default_input_scanners
+    if _default_input_scanners is None:
+        # llm_guard imports transformers and torch, only when the models load
+        from llm_guard.input_scanners import PromptInjection, TokenLimit, Toxicity
+
+        configure_threads()
+        _default_input_scanners = [
+            PromptInjection(**scanner_kwargs("PromptInjection")),
+            TokenLimit(),
+            Toxicity(**scanner_kwargs("Toxicity")),
+        ]
+    return _default_input_scanners
 
 
 def scan_input_question(state: AgentState, input_scanners) -> Dict[str, Any]:
     """
     Scan the input question.
+
+    `input_scanners` is a scanner engine (a `ScannerEngine` or its inference host
+    proxy) or a list of llm_guard scanners.
     """
     question = state["question"]
 
-    sanitized_prompt, results_valid, _ = scan_prompt(input_scanners, question)
+    if not isinstance(input_scanners, list):
+        sanitized_prompt, results_valid, _ = input_scanners.scan_prompt(question)
+    else:
+        from llm_guard import scan_prompt
+
+        sanitized_prompt, results_valid, _ = scan_prompt(
+            input_scanners, question, fail_fast=settings.SCANNER_FAIL_FAST
+        )
     if any(not result for result in results_valid.values()):
         state["question_status"] = "invalid"
-        state["llm_output"] = "Please provide a valid question with clear intent."
+        state["llm_output"] = INVALID_QUESTION_MESSAGE
     else:
         state["question_status"] = "valid"
 
+    state["question_sanitized"] = sanitized_prompt != question
     state["question"] = sanitized_prompt
     return state
 
 
+async def ascan_input_question(state: AgentState, input_scanners) -> Dict[str, Any]:
+    """
+    Scan the input question in the CPU executor.
+    """
+    async with limit(SCANNERS):
+        return await run_in_cpu_executor(scan_input_question, state, input_scanners)
+
+
 if "__name__" == "__main__":
     from llm_guard.input_scanners import PromptInjection, TokenLimit, Toxicity
 
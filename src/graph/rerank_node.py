@@ -0,0 +1,88 @@
+"""
+Cross-encoder reranking of the retrieved documents.
+
+A small cross-encoder scores every (question, document) pair of a request in
+one batched forward pass on the CPU. Documents scoring below
+`settings.RERANK_DROP_THRESHOLD` are dropped, documents above
+`settings.RERANK_ACCEPT_THRESHOLD` are kept, and only the borderline ones in
+between are left for the LLM grader (or kept without grading when
+`settings.RERANK_SKIP_GRADER` is set).
+"""
+
+from typing import Any, Dict, List
+
+from src.config import settings
+from src.graph.executor import run_in_cpu_executor
+from src.graph.state import AgentState
+
+
+def document_text(doc: Dict[str, Any]) -> str:
+    """Text of a retrieved document scored against the question."""
+    return f"{doc.get('question', '')}\n{doc.get('answer', '')}"
+
+
+class Reranker:
+    """
+    Cross-encoder relevance scorer.
+
+    Args:
+        model_name (str): Name of the sentence-transformers cross-encoder.
+        batch_size (int): Number of pairs per forward pass.
+    """
+
+    def __init__(
+        self,
+        model_name: str = settings.RERANK_MODEL_NAME,
+        batch_size: int = settings.RERANK_BATCH_SIZE,
+    ):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+
+    def score(self, question: str, docs: List[Dict[str, Any]]) -> List[float]:
+        """
+        Score the relevance of the documents to the question.
+
+        Returns:
+            List[float]: One score in [0, 1] per document.
+        """
+        if not docs:
+            return []
+        # A single output label is passed through a sigmoid by default
+        scores = self.model.predict(
+            [(question, document_text(doc)) for doc in docs],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        return [float(score) for score in scores]
+
+
+def rerank(state: AgentState, reranker: Reranker) -> Dict[str, Any]:
+    """
+    Rerank the retrieved documents and split them by score.
+
+    `documents` keeps the accepted documents, best first, and
+    `pending_documents` the borderline ones left to the LLM grader.
+    """
+    docs = state["documents"]
+    scores = reranker.score(state["question"], docs)
+    ranked = sorted(zip(scores, docs), key=lambda pair: pair[0], reverse=True)
+    accepted, pending = [], []
+    for score, doc in ranked:
+        if score >= settings.RERANK_ACCEPT_THRESHOLD or (
+            settings.RERANK_SKIP_GRADER and score >= settings.RERANK_DROP_THRESHOLD
+        ):
+            accepted.append(doc)
+        elif score >= settings.RERANK_DROP_THRESHOLD:
+            pending.append(doc)
+    state["documents"] = accepted
+    state["pending_documents"] = pending
+    return state
+
+
+async def arerank(state: AgentState, reranker: Reranker) -> Dict[str, Any]:
+    """
+    Rerank the retrieved documents in the CPU executor.
+    """
+    return await run_in_cpu_executor(rerank, state, reranker)
@@ -1,5 +1,6 @@
 from typing import Any, Dict
 
+from src.graph.executor import run_in_cpu_executor
 from src.graph.state import AgentState
 
 
@@ -27,3 +28,19 @@ def retrieve(state: AgentState, faiss_retriever) -> Dict[str, Any]:
     state["documents"] = metadata
 
     return state
+
+
+async def aretrieve(state: AgentState, faiss_retriever) -> Dict[str, Any]:
+    """
+    Retrieve documents from the FAISS index without blocking the event loop.
+
+    The question embedding and the FAISS search are CPU-bound, so they run in
+    the bounded CPU executor.
+
+    Args:
+        state (AgentState): The graph state.
+
+    Returns:
+        Dict[str, Any]: The updated graph state.
+    """
+    return await run_in_cpu_executor(retrieve, state, faiss_retriever)
@@ -0,0 +1,245 @@
+"""
+Scanner execution engine for the llm_guard input and output scanners.
+
+`scan_prompt`/`scan_output` run the scanners one after the other and every
+transformer model runs one request at a time. The engine instead:
+
+- runs the cheap scanners without a model (e.g. `TokenLimit`) first and stops
+  as soon as one rejects the text (fail-fast),
+- runs the model-based scanners in parallel,
+- micro-batches the transformers pipeline calls of concurrent requests: the
+  `_pipeline` of each scanner is wrapped in a `BatchingPipeline` that waits up
+  to `settings.SCANNER_MAX_WAIT_MS` for other inputs and runs them in a
+  single batched forward pass.
+
+Scanners running in parallel all see the same text, the sanitized text of the
+last one in the configured order that changed it is kept.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, List, Tuple
+
+from loguru import logger
+
+from src.config import settings
+
+MODEL_ATTRIBUTES = ("_pipeline", "_model", "_classifier")
+
+
+class BatchingPipeline:
+    """
+    Dynamic batching wrapper of a transformers pipeline.
+
+    List inputs of concurrent calls are queued and run together, at most
+    `max_batch_size` inputs at a time, waiting at most `max_wait_ms` for a
+    batch to fill up. A single worker thread calls the pipeline, which also
+    serializes the use of the (not thread-safe) model.
+
+    Args:
+        pipeline (Callable): The transformers pipeline.
+        max_batch_size (int): Maximum number of inputs per forward pass.
+        max_wait_ms (float): Maximum time to wait for more inputs.
+    """
+
+    def __init__(
+        self,
+        pipeline: Callable,
+        max_batch_size: int = settings.SCANNER_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.SCANNER_MAX_WAIT_MS,
+    ):
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.inputs = 0
+        self._queue: "Queue[Tuple[list, dict, Future]]" = Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(
+            target=self._run, name="scanner-batching", daemon=True
+        )
+        self._worker.start()
+
+    def __getattr__(self, name: str) -> Any:
+        # Scanners may read attributes of their pipeline (e.g. the tokenizer)
+        return getattr(self.pipeline, name)
+
+    def __call__(self, inputs, **kwargs):
+        if not isinstance(inputs, list) or not inputs:
+            # Single strings change the output shape of the pipelines
+            with self._lock:
+                return self.pipeline(inputs, **kwargs)
+        future: Future = Future()
+        self._queue.put((inputs, kwargs, future))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[list, dict, Future]]:
+        requests = [self._queue.get()]
+        size = len(requests[0][0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except Empty:
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    def _run(self) -> None:
+        while True:
+            requests = self._collect()
+            # Calls with different keyword arguments are run separately
+            groups: Dict[str, List[Tuple[list, dict, Future]]] = {}
+            for request in requests:
+                groups.setdefault(repr(sorted(request[1].items())), []).append(request)
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group: List[Tuple[list, dict, Future]]) -> None:
+        inputs = [item for request in group for item in request[0]]
+        kwargs = {"batch_size": min(len(inputs), self.max_batch_size), **group[0][1]}
+        try:
+            with self._lock:
+                outputs = self.pipeline(inputs, **kwargs)
+        except Exception as e:
+            for _, _, future in group:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.inputs += len(inputs)
+        offset = 0
+        for request_inputs, _, future in group:
+            future.set_result(outputs[offset : offset + len(request_inputs)])
+            offset += len(request_inputs)
+
+
+def _is_model_scanner(scanner) -> bool:
+    return any(hasattr(scanner, attribute) for attribute in MODEL_ATTRIBUTES)
+
+
+class ScannerEngine:
+    """
+    Run a set of llm_guard scanners with fail-fast, parallelism and batching.
+
+    Args:
+        scanners (list): The llm_guard input or output scanners.
+        fail_fast (bool): Stop at the first scanner rejecting the text.
+        max_batch_size (int): Maximum number of inputs per forward pass.
+        max_wait_ms (float): Maximum time to wait for a batch to fill up.
+    """
+
+    def __init__(
+        self,
+        scanners: list,
+        fail_fast: bool = settings.SCANNER_FAIL_FAST,
+        max_batch_size: int = settings.SCANNER_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.SCANNER_MAX_WAIT_MS,
+    ):
+        self.scanners = scanners
+        self.fail_fast = fail_fast
+        self.cheap_scanners = [s for s in scanners if not _is_model_scanner(s)]
+        self.model_scanners = [s for s in scanners if _is_model_scanner(s)]
+        for scanner in self.model_scanners:
+            pipeline = getattr(scanner, "_pipeline", None)
+            if callable(pipeline) and not isinstance(pipeline, BatchingPipeline):
+                scanner._pipeline = BatchingPipeline(
+                    pipeline, max_batch_size, max_wait_ms
+                )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.SCANNER_WORKERS),
+            thread_name_prefix="scanner",
+        )
+        logger.info(
+            f"Scanner engine: {len(self.cheap_scanners)} cheap and "
+            f"{len(self.model_scanners)} model scanners."
+        )
+
+    @classmethod
+    def of(cls, scanners):
+        """
+        Get an engine for a list of scanners, other values are engines already
+        (e.g. the proxy of an inference host engine).
+        """
+        return cls(scanners) if isinstance(scanners, list) else scanners
+
+    def _scan(
+        self, text: str, scan: Callable[[Any, str], Tuple[str, bool, float]]
+    ) -> Tuple[str, Dict[str, bool], Dict[str, float]]:
+        results_valid: Dict[str, bool] = {}
+        results_score: Dict[str, float] = {}
+        for scanner in self.cheap_scanners:
+            name = type(scanner).__name__
+            text, results_valid[name], results_score[name] = scan(scanner, text)
+            if self.fail_fast and not results_valid[name]:
+                return text, results_valid, results_score
+        if not self.model_scanners:
+            return text, results_valid, results_score
+
+        futures = {
+            self._executor.submit(scan, scanner, text): scanner
+            for scanner in self.model_scanners
+        }
+        outputs: Dict[int, str] = {}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                scanner = futures[future]
+                name = type(scanner).__name__
+                output, results_valid[name], results_score[name] = future.result()
+                outputs[id(scanner)] = output
+                if self.fail_fast and not results_valid[name]:
+                    for other in pending:
+                        other.cancel()
+                    return text, results_valid, results_score
+        sanitized = text
+        for scanner in self.model_scanners:
+            if outputs[id(scanner)] != text:
+                sanitized = outputs[id(scanner)]
+        return sanitized, results_valid, results_score
+
+    def scan_prompt(self, prompt: str) -> Tuple[str, Dict[str, bool], Dict[str, float]]:
+        """
+        Scan a prompt with input scanners, like `llm_guard.scan_prompt`.
+
+        Returns:
+            Tuple[str, Dict[str, bool], Dict[str, float]]: The sanitized prompt,
+            and the validity and risk score of each scanner that ran.
+        """
+        return self._scan(prompt, lambda scanner, text: scanner.scan(text))
+
+    def scan_output(
+        self, prompt: str, output: str
+    ) -> Tuple[str, Dict[str, bool], Dict[str, float]]:
+        """
+        Scan an output with output scanners, like `llm_guard.scan_output`.
+
+        Returns:
+            Tuple[str, Dict[str, bool], Dict[str, float]]: The sanitized output,
+            and the validity and risk score of each scanner that ran.
+        """
+        return self._scan(output, lambda scanner, text: scanner.scan(prompt, text))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the batching counters of the model scanners."""
+        stats = {}
+        for scanner in self.model_scanners:
+            pipeline = getattr(scanner, "_pipeline", None)
+            if isinstance(pipeline, BatchingPipeline):
+                stats[type(scanner).__name__] = {
+                    "batches": pipeline.batches,
+                    "inputs": pipeline.inputs,
+                    "mean_batch_size": pipeline.inputs / pipeline.batches
+                    if pipeline.batches
+                    else 0.0,
+                }
+        return stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,207 @@
+"""
+Semantic answer cache keyed on question embeddings.
+
+Validated answers are stored with the embedding of the (sanitized) question in
+a small dedicated FAISS inner-product index. A new question whose embedding is
+close enough to a cached one is answered from the cache, skipping topic
+classification, retrieval, grading, generation and answer checking.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from src.config import settings
+
+
+@dataclass
+class CacheEntry:
+    """A cached answer."""
+
+    question: str
+    answer: str
+    created_at: float
+
+
+class SemanticCache:
+    """
+    Semantic cache with similarity threshold, TTL and LRU eviction.
+
+    Args:
+        embeddings: LangChain embeddings model used to embed the questions.
+        threshold (float): Minimum cosine similarity for a hit.
+        ttl_seconds (float): Time to live of an entry, 0 disables expiry.
+        max_size (int): Maximum number of entries, least recently used first out.
+        path (str): Directory where the cache is persisted, None disables it.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: float = settings.SEMANTIC_CACHE_TTL_SECONDS,
+        max_size: int = settings.SEMANTIC_CACHE_MAX_SIZE,
+        path: Optional[str] = settings.SEMANTIC_CACHE_PATH,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._index: Optional[faiss.IndexIDMap2] = None
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        # Embeddings of recently looked up questions, reused when storing
+        self._recent_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(self._index_path):
+            self.load()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "semantic_cache.faiss")
+
+    @property
+    def _entries_path(self) -> str:
+        return os.path.join(self.path, "semantic_cache.json")
+
+    def _embed(self, question: str) -> np.ndarray:
+        with self._lock:
+            vector = self._recent_vectors.get(question)
+        if vector is None:
+            vector = np.asarray([self.embeddings.embed_query(question)], "float32")
+            faiss.normalize_L2(vector)
+            with self._lock:
+                self._recent_vectors[question] = vector
+                if len(self._recent_vectors) > 256:
+                    self._recent_vectors.popitem(last=False)
+        return vector
+
+    def _expired(self, entry: CacheEntry) -> bool:
+        return (
+            bool(self.ttl_seconds) and time.time() - entry.created_at > self.ttl_seconds
+        )
+
+    def _remove(self, ids: List[int]) -> None:
+        for entry_id in ids:
+            self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def lookup(self, question: str) -> Optional[str]:
+        """
+        Look up the answer of a semantically similar question.
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        vector = self._embed(question)
+        with self._lock:
+            if self._index is None or not self._entries:
+                self.misses += 1
+                return None
+            scores, ids = self._index.search(vector, min(4, len(self._entries)))
+            expired = []
+            answer = None
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    # In the index but not in the entries, e.g. after a crash
+                    # between the writes of the two files
+                    continue
+                if self._expired(entry):
+                    expired.append(int(entry_id))
+                    continue
+                self._entries.move_to_end(int(entry_id))
+                answer = entry.answer
+                break
+            if expired:
+                self._remove(expired)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def store(self, question: str, answer: str) -> None:
+        """Cache a validated answer."""
+        vector = self._embed(question)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.asarray([entry_id], dtype="int64"))
+            self._entries[entry_id] = CacheEntry(question, answer, time.time())
+            if len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove([oldest])
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self) -> None:
+        """Persist the cache to `self.path`."""
+        if not self.path or self._index is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # Written to temporary files then renamed, so that a crash never leaves
+        # a partially written file
+        with self._lock:
+            faiss.write_index(self._index, self._index_path + ".tmp")
+            with open(self._entries_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "next_id": self._next_id,
+                        "entries": [
+                            {"id": entry_id, **asdict(entry)}
+                            for entry_id, entry in self._entries.items()
+                        ],
+                    },
+                    f,
+                )
+            os.replace(self._entries_path + ".tmp", self._entries_path)
+            os.replace(self._index_path + ".tmp", self._index_path)
+        logger.info(f"Semantic cache saved to {self.path}")
+
+    def load(self) -> None:
+        """Load the cache persisted in `self.path`, dropping expired entries."""
+        try:
+            index = faiss.read_index(self._index_path)
+            with open(self._entries_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            logger.exception("Failed to load the semantic cache, starting empty.")
+            return
+        with self._lock:
+            self._index = index
+            self._next_id = data["next_id"]
+            self._entries = OrderedDict(
+                (item.pop("id"), CacheEntry(**item)) for item in data["entries"]
+            )
+            expired = [
+                entry_id
+                for entry_id, entry in self._entries.items()
+                if self._expired(entry)
+            ]
+            if expired:
+                self._remove(expired)
+        logger.info(f"Loaded semantic cache with {len(self._entries)} entries.")
@@ -1,4 +1,9 @@
-from typing import List, TypedDict
+from typing import Annotated, List, TypedDict
+
+
+def _last_value(current: str, new: str) -> str:
+    """Keep the last value, also when parallel nodes write it in one step."""
+    return new
 
 
 class AgentState(TypedDict):
@@ -11,6 +16,8 @@ class AgentState(TypedDict):
         The question.
     question_status: str
         The question status.
+    question_sanitized: bool
+        Whether the input scanners rewrote the question.
     on_topic: bool
         The topic status.
     prompt: str
@@ -19,15 +26,28 @@ class AgentState(TypedDict):
         The LLM generation.
     documents: List[str]
         The retrieved documents.
+    pending_documents: List[str]
+        The borderline documents left to the LLM grader by the reranker.
     answer_status: str
         The answer status.
+    cache_hit: bool
+        Whether the answer was served from the semantic cache.
+    answer_path: str
+        How the answer was obtained: "cache", "direct" (stored answer of a
+        near-exact match) or "generated".
 
     """
 
     question: str
     question_status: str
+    question_sanitized: bool
     on_topic: bool
     prompt: str
-    llm_output: str
+    # In the speculative mode, the scanners and the topic classifier can both
+    # set a rejection message in the same step
+    llm_output: Annotated[str, _last_value]
     documents: List[str]
+    pending_documents: List[str]
     answer_status: str
+    cache_hit: bool
+    answer_path: str
@@ -1,13 +1,20 @@
 from functools import lru_cache
-from typing import Any, Dict, Literal
+from typing import Any, Dict, Literal, Optional
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
 
 from src.config import settings
+from src.graph.admission import LLM, limit
+from src.graph.executor import run_in_cpu_executor
+from src.graph.llm import llm_registry
+from src.graph.metrics import TOPIC_DECISIONS
 from src.graph.state import AgentState
+from src.graph.utils import async_lru_cache, cosine_similarities, search_positions
+
+OFF_TOPIC_MESSAGE = (
+    "Please ask a question about customer support so I can help you better."
+)
 
 
 # Structured output for topic classification
@@ -23,8 +30,8 @@ class GradeTopic(BaseModel):
     reason: str = Field(description="Brief explanation for the classification.")
 
 
-@lru_cache(maxsize=100)
-def classify_topic(question: str, local_llm: bool = True) -> Dict[str, Any]:
+def _topic_grader(llm):
+    """Create the chain classifying whether a question is about customer support."""
     system = """You are a grader assessing whether a user's question is related to customer support.
     Customer support topics include:
     - Questions about purchasing products (e.g., "How do I place an order?")
@@ -43,30 +50,83 @@ def classify_topic(question: str, local_llm: bool = True) -> Dict[str, Any]:
         ]
     )
 
-    if local_llm:
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL_NAME,
-            temperature=settings.LLM_TEMPERATURE,
-            max_tokens=settings.LLM_MAX_TOKENS,
-        )
-    else:
-        llm = ChatOpenAI(
-            model=settings.LLM_MODEL_NAME,
-            api_key=settings.OPENAI_API_KEY.get_secret_value(),
-        )
-
     # Use structured output for better results
     structured_llm = llm.with_structured_output(GradeTopic)
-    grader_llm = grade_prompt | structured_llm
+    return grade_prompt | structured_llm
+
+
+llm_registry.register("topic", _topic_grader)
+
+
+@lru_cache(maxsize=100)
+def classify_topic(question: str, local_llm: bool = True) -> Dict[str, Any]:
+    grader_llm = llm_registry.chain("topic", local_llm)
     result = grader_llm.invoke({"question": question})
     return result
 
 
-def topic_classifier(state: AgentState):
-    """Classify the topic of the question."""
-    question = state["question"]
-    result = classify_topic(question)
+@async_lru_cache(maxsize=100)
+async def aclassify_topic(question: str, local_llm: bool = True) -> Dict[str, Any]:
+    grader_llm = llm_registry.chain("topic", local_llm)
+    async with limit(LLM):
+        result = await grader_llm.ainvoke({"question": question})
+    return result
+
+
+def topic_similarity(
+    question: str, vectorstore, k: int = settings.TOPIC_NEIGHBORS
+) -> float:
+    """
+    Mean cosine similarity of the question to its k nearest indexed support
+    questions.
+    """
+    distances, positions = search_positions(vectorstore, [question], k)
+    similarities = cosine_similarities(vectorstore, distances)[0][positions[0] != -1]
+    return float(similarities.mean()) if len(similarities) else 0.0
+
+
+def grade_topic_similarity(
+    similarity: float,
+    accept_threshold: float = settings.TOPIC_ACCEPT_THRESHOLD,
+    reject_threshold: Optional[float] = settings.TOPIC_REJECT_THRESHOLD,
+) -> Optional[GradeTopic]:
+    """
+    Decide the topic from the similarity to the support questions.
+
+    Returns:
+        Optional[GradeTopic]: The classification, confident enough to be
+        routed as is, or None if the similarity is in the uncertainty band
+        left to the LLM.
+    """
+    if similarity >= accept_threshold:
+        margin = (similarity - accept_threshold) / max(1 - accept_threshold, 1e-6)
+        return GradeTopic(
+            score="Yes",
+            confidence=min(1.0, 0.7 + 0.3 * margin),
+            reason=f"Similar to support questions ({similarity:.2f}).",
+        )
+    if reject_threshold is not None and similarity <= reject_threshold:
+        margin = (reject_threshold - similarity) / max(reject_threshold + 1, 1e-6)
+        return GradeTopic(
+            score="No",
+            confidence=min(1.0, 0.7 + 0.3 * margin),
+            reason=f"Unlike any support question ({similarity:.2f}).",
+        )
+    return None
+
+
+def embedding_topic(question: str, vectorstore) -> Optional[GradeTopic]:
+    """
+    Classify the topic of the question from its embedding.
+
+    Returns:
+        Optional[GradeTopic]: The classification, or None if uncertain.
+    """
+    return grade_topic_similarity(topic_similarity(question, vectorstore))
+
 
+def _route_topic(state: AgentState, result) -> AgentState:
+    """Update the state from the topic classification result."""
     # Default to "on topic" if confidence is low
     if result.confidence < 0.7:
         state["on_topic"] = "Yes"
@@ -75,7 +135,34 @@ def topic_classifier(state: AgentState):
 
     # Provide feedback to the user
     if state["on_topic"] == "No":
-        state["llm_output"] = (
-            "Please ask a question about customer support so I can help you better."
-        )
+        state["llm_output"] = OFF_TOPIC_MESSAGE
     return state
+
+
+def topic_classifier(state: AgentState, vectorstore: Optional[Any] = None):
+    """
+    Classify the topic of the question.
+
+    If a vector store is given, the question embedding decides, and the LLM
+    only classifies the uncertain questions.
+    """
+    question = state["question"]
+    result = None
+    if vectorstore is not None:
+        result = embedding_topic(question, vectorstore)
+    TOPIC_DECISIONS.inc("embedding" if result is not None else "llm")
+    if result is None:
+        result = classify_topic(question)
+    return _route_topic(state, result)
+
+
+async def atopic_classifier(state: AgentState, vectorstore: Optional[Any] = None):
+    """Classify the topic of the question (async)."""
+    question = state["question"]
+    result = None
+    if vectorstore is not None:
+        result = await run_in_cpu_executor(embedding_topic, question, vectorstore)
+    TOPIC_DECISIONS.inc("embedding" if result is not None else "llm")
+    if result is None:
+        result = await aclassify_topic(question)
+    return _route_topic(state, result)
@@ -1,8 +1,18 @@
+import asyncio
+from collections import OrderedDict
+from functools import wraps
+from typing import List, Tuple
+
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
 from loguru import logger
 
 from src.config import settings
+from src.embeddings import shared_embeddings_model
+from src.indexing.ann import configure_search
+from src.indexing.store import is_compact, load_compact_index
 
 
 def load_faiss_index() -> FAISS:
@@ -10,25 +20,164 @@ def load_faiss_index() -> FAISS:
     Load the FAISS index.
 
     Returns:
-        FAISS retriever object.
+        FAISS retriever object, fused with BM25 in the hybrid retrieval mode.
     """
     try:
         logger.info("Loading FAISS index...")
-        embeddings_model = HuggingFaceEmbeddings(
-            model_name=settings.EMBEDDINGS_MODEL_NAME
-        )
-        vector_store = FAISS.load_local(
-            settings.FAISS_INDEX_PATH,
-            embeddings_model,
-            allow_dangerous_deserialization=True,
-        )
+        embeddings_model = shared_embeddings_model()
+        if is_compact(settings.FAISS_INDEX_PATH):
+            # Memory-mapped, read lazily and shared between workers
+            vector_store = load_compact_index(
+                settings.FAISS_INDEX_PATH, embeddings_model
+            )
+        else:
+            logger.warning(
+                "FAISS index is in the pickled format, re-run the indexing "
+                "pipeline to convert it."
+            )
+            vector_store = FAISS.load_local(
+                settings.FAISS_INDEX_PATH,
+                embeddings_model,
+                allow_dangerous_deserialization=True,
+            )
+        # IVF/HNSW search parameters from the settings
+        configure_search(vector_store.index)
     except Exception as e:
         logger.exception("Failed to load FAISS index.")
         raise e
 
+    if settings.RETRIEVAL_MODE == "hybrid":
+        from src.graph.hybrid_retriever import HybridRetriever
+        from src.indexing.bm25 import BM25Index
+
+        if BM25Index.exists(settings.FAISS_INDEX_PATH):
+            return HybridRetriever(
+                vector_store, BM25Index.load(settings.FAISS_INDEX_PATH)
+            )
+        logger.warning(
+            "No BM25 index found, falling back to dense retrieval. Re-run the "
+            "indexing pipeline to build it."
+        )
+
     retriever = vector_store.as_retriever(
         search_type="similarity",
         search_kwargs={"k": settings.FAISS_TOP_K},
     )
 
     return retriever
+
+
+def search_positions(
+    vector_store: FAISS, queries: List[str], k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search the FAISS index for many queries at once.
+
+    All the queries are embedded in a single call and searched with a single
+    multi-query FAISS search.
+
+    Args:
+        vector_store (FAISS): The vector store.
+        queries (List[str]): The queries.
+        k (int): Number of documents per query.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (len(queries), k) distances and index
+        positions, -1 for missing results.
+    """
+    # Questions go through the in-memory query embedding cache, not the disk
+    # cache of the indexed documents
+    embeddings = vector_store.embeddings
+    if len(queries) == 1:
+        embedded = [embeddings.embed_query(queries[0])]
+    elif hasattr(embeddings, "embed_queries"):
+        embedded = embeddings.embed_queries(queries)
+    else:
+        embedded = embeddings.embed_documents(queries)
+    vectors = np.asarray(embedded, dtype=np.float32)
+    if vector_store._normalize_L2:
+        import faiss
+
+        faiss.normalize_L2(vectors)
+    return vector_store.index.search(vectors, k)
+
+
+def cosine_similarities(vector_store: FAISS, distances: np.ndarray) -> np.ndarray:
+    """
+    Convert FAISS search distances to cosine similarities.
+
+    Inner products of normalized vectors are cosine similarities already, and
+    the squared L2 distance of unit vectors is d = 2 - 2 * cos.
+    """
+    if vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return distances
+    return 1 - distances / 2
+
+
+def batch_similarity_search(
+    vector_store: FAISS, queries: List[str], k: int
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Search the FAISS index for many queries at once.
+
+    Args:
+        vector_store (FAISS): The vector store.
+        queries (List[str]): The queries.
+        k (int): Number of documents per query.
+
+    Returns:
+        List[List[Tuple[Document, float]]]: The documents and their distance for
+        each query.
+    """
+    if not queries:
+        return []
+    scores, indices = search_positions(vector_store, queries, k)
+    results = []
+    for query_scores, query_indices in zip(scores, indices):
+        docs = []
+        for score, i in zip(query_scores, query_indices):
+            if i == -1:
+                continue
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            docs.append((doc, float(score)))
+        results.append(docs)
+    return results
+
+
+def async_lru_cache(maxsize: int = 128):
+    """
+    LRU cache decorator for coroutine functions.
+
+    Concurrent calls with the same arguments share a single in-flight task, so a
+    burst of identical questions triggers only one LLM call.
+
+    Args:
+        maxsize (int): Maximum number of cached results.
+    """
+
+    def decorator(func):
+        cache: OrderedDict = OrderedDict()
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            if key in cache:
+                cache.move_to_end(key)
+                task = cache[key]
+            else:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                cache[key] = task
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            try:
+                return await asyncio.shield(task)
+            except Exception:
+                # Do not cache failures
+                if cache.get(key) is task:
+                    del cache[key]
+                raise
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
@@ -0,0 +1,193 @@
+"""
+Approximate nearest neighbour (ANN) FAISS indexes.
+
+LangChain's FAISS vector store always creates a flat (exact, brute-force)
+index. This module builds the index type selected in `settings` (IVF, HNSW,
+optionally compressed with PQ or SQ8) from the vectors of a vector store,
+training the quantizers on a sample, and applies the search-time parameters
+when an index is loaded.
+"""
+
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from loguru import logger
+
+from src.config import settings
+
+ADD_CHUNK_SIZE = 100_000
+
+
+def index_spec() -> Dict[str, Any]:
+    """Build-time index parameters from `settings`, recorded in the manifest."""
+    spec: Dict[str, Any] = {"type": settings.FAISS_INDEX_TYPE}
+    if settings.FAISS_INDEX_TYPE == "flat":
+        return spec
+    spec["compression"] = settings.FAISS_INDEX_COMPRESSION
+    if settings.FAISS_INDEX_TYPE == "ivf":
+        spec["nlist"] = settings.FAISS_IVF_NLIST
+    else:
+        spec["m"] = settings.FAISS_HNSW_M
+        spec["ef_construction"] = settings.FAISS_HNSW_EF_CONSTRUCTION
+    if settings.FAISS_INDEX_COMPRESSION == "pq":
+        spec["pq_m"] = settings.FAISS_PQ_M
+        spec["pq_nbits"] = settings.FAISS_PQ_NBITS
+    return spec
+
+
+def index_factory_string(spec: Dict[str, Any], dim: int, n_vectors: int) -> str:
+    """
+    Get the `faiss.index_factory` description of an index spec.
+
+    Args:
+        spec (Dict[str, Any]): The index parameters, see `index_spec`.
+        dim (int): Dimension of the vectors.
+        n_vectors (int): Number of vectors, used to cap the number of clusters.
+    """
+    if spec["type"] == "flat":
+        return "Flat"
+    compression = spec.get("compression", "none")
+    if compression == "pq":
+        if dim % spec["pq_m"]:
+            raise ValueError(
+                f"FAISS_PQ_M={spec['pq_m']} must divide the dimension {dim}."
+            )
+        if n_vectors < 2 ** spec["pq_nbits"]:
+            raise ValueError(
+                f"PQ with {spec['pq_nbits']} bits needs at least "
+                f"{2 ** spec['pq_nbits']} vectors to train, got {n_vectors}."
+            )
+    if spec["type"] == "ivf":
+        # FAISS wants at least 39 training points per cluster
+        nlist = max(1, min(spec["nlist"], n_vectors // 39))
+        codec = {
+            "none": "Flat",
+            "pq": f"PQ{spec.get('pq_m')}x{spec.get('pq_nbits')}",
+            "sq8": "SQ8",
+        }[compression]
+        return f"IVF{nlist},{codec}"
+    suffix = {
+        "none": "",
+        "pq": f"_PQ{spec.get('pq_m')}x{spec.get('pq_nbits')}",
+        "sq8": "_SQ8",
+    }[compression]
+    return f"HNSW{spec['m']}{suffix}"
+
+
+def _metric(vector_store: FAISS) -> int:
+    if vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return faiss.METRIC_INNER_PRODUCT
+    return faiss.METRIC_L2
+
+
+def build_index(
+    vectors: np.ndarray,
+    spec: Optional[Dict[str, Any]] = None,
+    metric: int = faiss.METRIC_L2,
+) -> faiss.Index:
+    """
+    Build an index and add the vectors, in order.
+
+    Args:
+        vectors (np.ndarray): The (n, dim) float32 vectors.
+        spec (Dict[str, Any]): The index parameters, `index_spec()` by default.
+        metric (int): The FAISS metric.
+
+    Returns:
+        faiss.Index: The populated index.
+    """
+    spec = spec or index_spec()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    description = index_factory_string(spec, dim, n_vectors)
+    index = faiss.index_factory(dim, description, metric)
+    if spec["type"] == "hnsw":
+        index.hnsw.efConstruction = spec["ef_construction"]
+    if not index.is_trained:
+        sample_size = min(n_vectors, settings.FAISS_TRAIN_SAMPLE_SIZE)
+        logger.info(f"Training {description} index on {sample_size} vectors...")
+        sample = vectors[
+            np.random.default_rng(0).choice(n_vectors, sample_size, replace=False)
+        ]
+        index.train(sample)
+    for start in range(0, n_vectors, ADD_CHUNK_SIZE):
+        index.add(vectors[start : start + ADD_CHUNK_SIZE])
+    configure_search(index)
+    logger.info(f"Built {description} index with {index.ntotal} vectors.")
+    return index
+
+
+def configure_search(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> None:
+    """
+    Set the search-time parameters of an index, from `settings` by default.
+
+    Args:
+        index (faiss.Index): The index.
+        nprobe (int): Number of IVF clusters searched.
+        ef_search (int): HNSW search beam width.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe or settings.FAISS_IVF_NPROBE
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search or settings.FAISS_HNSW_EF_SEARCH
+
+
+def is_flat(index: faiss.Index) -> bool:
+    """Whether the index is an exact flat index."""
+    return isinstance(index, faiss.IndexFlat)
+
+
+def stored_vectors(vector_store: FAISS) -> np.ndarray:
+    """
+    Get the vectors of a vector store, in index order.
+
+    Flat indexes are reconstructed directly. Other indexes may be lossy or not
+    support reconstruction, so the documents are embedded again, which is
+    cheap with the embedding cache.
+    """
+    if is_flat(vector_store.index):
+        return vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    texts = [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+        for i in range(vector_store.index.ntotal)
+    ]
+    vectors = np.asarray(vector_store.embeddings.embed_documents(texts), np.float32)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def to_flat(vector_store: FAISS) -> None:
+    """Replace the index of a vector store with a flat one, e.g. before deletes."""
+    if is_flat(vector_store.index):
+        return
+    vectors = stored_vectors(vector_store)
+    index = faiss.IndexFlat(vectors.shape[1], _metric(vector_store))
+    index.add(vectors)
+    vector_store.index = index
+
+
+def apply_index_type(
+    vector_store: FAISS, spec: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Rebuild the index of a vector store with the configured index type.
+
+    The document order is kept, so `index_to_docstore_id` stays valid.
+    """
+    spec = spec or index_spec()
+    if spec["type"] == "flat" and is_flat(vector_store.index):
+        return
+    if vector_store.index.ntotal == 0:
+        return
+    vector_store.index = build_index(
+        stored_vectors(vector_store), spec, _metric(vector_store)
+    )
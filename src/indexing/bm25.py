@@ -0,0 +1,144 @@
+"""
+BM25 inverted index built next to the FAISS index.
+
+Documents are numbered by their FAISS index position, so that results of the
+sparse and dense retrievers can be fused directly. The BM25 weight of every
+posting does not depend on the query, so it is computed at build time and a
+search only sums the weights of the postings of the query terms.
+
+The index is stored as `.npy` arrays (memory-mapped when loaded) and a JSON
+vocabulary in the `bm25` sub-directory of the index directory.
+"""
+
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from loguru import logger
+
+BM25_DIR = "bm25"
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, numbers (e.g. order numbers) included."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over documents numbered 0..n-1.
+
+    Args:
+        vocabulary (Dict[str, int]): Term to term number.
+        indptr (np.ndarray): Postings of term t are indptr[t]:indptr[t + 1].
+        doc_ids (np.ndarray): Document of each posting.
+        weights (np.ndarray): BM25 weight of each posting.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+    ):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        Build the index.
+
+        Args:
+            texts (List[str]): The documents, in FAISS index order.
+            k1 (float): Term frequency saturation.
+            b (float): Document length normalization.
+        """
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+
+        n_docs = len(texts)
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        vocabulary = {term: number for number, term in enumerate(sorted(postings))}
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_ids, weights = [], []
+        for term, number in vocabulary.items():
+            term_postings = np.asarray(postings[term], dtype=np.float32)
+            ids = term_postings[:, 0].astype(np.int32)
+            tf = term_postings[:, 1]
+            df = len(ids)
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * doc_lengths[ids] / (avg_length or 1.0))
+            doc_ids.append(ids)
+            weights.append((idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+            indptr[number + 1] = indptr[number] + df
+        return cls(
+            vocabulary,
+            indptr,
+            np.concatenate(doc_ids) if doc_ids else np.zeros(0, np.int32),
+            np.concatenate(weights) if weights else np.zeros(0, np.float32),
+        )
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Get the k best documents of a query.
+
+        Returns:
+            List[Tuple[int, float]]: Document numbers and BM25 scores, best
+            first.
+        """
+        slices = [
+            slice(self.indptr[number], self.indptr[number + 1])
+            for number in (self.vocabulary.get(term) for term in tokenize(query))
+            if number is not None
+        ]
+        if not slices:
+            return []
+        doc_ids = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        candidates, inverse = np.unique(doc_ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def save(self, index_path: str) -> None:
+        """Save the index in the `bm25` sub-directory of the index directory."""
+        path = os.path.join(index_path, BM25_DIR)
+        os.makedirs(path, exist_ok=True)
+        for name in ("indptr", "doc_ids", "weights"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocabulary, f)
+        logger.info(f"BM25 index with {len(self.vocabulary)} terms saved to {path}")
+
+    @classmethod
+    def load(cls, index_path: str) -> "BM25Index":
+        """Load the index saved in an index directory, memory-mapping the arrays."""
+        path = os.path.join(index_path, BM25_DIR)
+        with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("indptr", "doc_ids", "weights")
+        }
+        return cls(vocabulary, **arrays)
+
+    @staticmethod
+    def exists(index_path: str) -> bool:
+        return os.path.exists(os.path.join(index_path, BM25_DIR, "vocabulary.json"))
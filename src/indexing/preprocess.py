@@ -1,91 +1,556 @@
-"""
-Preprocess the dataset and create a FAISS index.
-"""
-
-import os
-
-import polars as pl
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
-from loguru import logger
-
-# local imports
-from src.config import settings
-
-
-# Load the dataset using Polars
-def download_and_preprocess_dataset() -> pl.DataFrame:
-    """Download and preprocess the dataset using Polars."""
-    # Load the dataset
-    customer_care_df = pl.read_csv(settings.DATA_URL)
-    logger.info(f"Loaded dataset with {customer_care_df.height} records.")
-
-    # Preprocess the dataset
-    customer_care_df = customer_care_df.select(["instruction", "response"]).rename(
-        {"instruction": "question", "response": "answer"}
-    )
-    customer_care_df = customer_care_df.drop_nulls()
-    logger.info(f"Preprocessed dataset with {customer_care_df.height} records.")
-
-    return customer_care_df
-
-
-def generate_documents(customer_care_df: pl.DataFrame) -> list[Document]:
-    """Generate documents from a Polars DataFrame."""
-    documents = [
-        Document(
-            page_content=row["question"],
-            metadata=row,
-            id=idx,
-        )
-        for idx, row in enumerate(customer_care_df.to_dicts())
-    ]
-    logger.info(f"Generated {len(documents)} documents.")
-    return documents
-
-
-def create_faiss_index(documents: list[Document]) -> None:
-    """Create or update FAISS index, avoiding duplicates."""
-    embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDINGS_MODEL_NAME)
-    index_path = settings.FAISS_INDEX_PATH
-
-    if os.path.exists(index_path):
-        # Load existing index
-        logger.info("Loading existing FAISS index...")
-        faiss_index = FAISS.load_local(
-            index_path, embeddings, allow_dangerous_deserialization=True
-        )
-        # Get existing document IDs
-        existing_ids = set(faiss_index.index_to_docstore_id.values())
-        # Filter new documents
-        new_docs = [doc for doc in documents if doc.id not in existing_ids]
-        if new_docs:
-            logger.info(f"Adding {len(new_docs)} new documents.")
-            faiss_index.add_documents(new_docs)
-            faiss_index.save_local(index_path)
-            logger.info(f"Updated index saved to {index_path}")
-        else:
-            logger.info("No new documents to add.")
-    else:
-        # Create new index
-        logger.info("Creating new FAISS index...")
-        faiss_index = FAISS.from_documents(documents, embeddings)
-        faiss_index.save_local(index_path)
-        logger.info(f"New index saved to {index_path}")
-
-
-def embed_and_index():
-    """Embed and index the dataset."""
-    # Download and preprocess the dataset
-    customer_care_df = download_and_preprocess_dataset()
-
-    # Generate documents
-    documents = generate_documents(customer_care_df)
-
-    # Create or update the FAISS index
-    create_faiss_index(documents)
-
-
-if __name__ == "__main__":
-    embed_and_index()
+"""
+Preprocess the dataset and create a FAISS index.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+import fsspec
+import polars as pl
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+# local imports
+from src.config import settings
+from src.embeddings import CachedEmbeddings, get_embeddings_model
+from src.indexing.ann import apply_index_type, index_spec, to_flat
+from src.indexing.bm25 import BM25Index
+from src.indexing.store import load_editable_index, save_compact_index
+
+MANIFEST_FILE = "manifest.json"
+
+
+def preprocess_dataset(customer_care_df: pl.DataFrame) -> pl.DataFrame:
+    """Keep the question and answer columns and drop incomplete rows."""
+    customer_care_df = customer_care_df.select(["instruction", "response"]).rename(
+        {"instruction": "question", "response": "answer"}
+    )
+    return customer_care_df.drop_nulls()
+
+
+# Load the dataset using Polars
+def download_and_preprocess_dataset(raw_path: Optional[str] = None) -> pl.DataFrame:
+    """
+    Download and preprocess the dataset using Polars.
+
+    Args:
+        raw_path (str): Local copy of the raw CSV, `download_raw_dataset()` by
+            default.
+    """
+    # Load the dataset
+    customer_care_df = pl.read_csv(raw_path or download_raw_dataset())
+    logger.info(f"Loaded dataset with {customer_care_df.height} records.")
+
+    # Preprocess the dataset
+    customer_care_df = preprocess_dataset(customer_care_df)
+    logger.info(f"Preprocessed dataset with {customer_care_df.height} records.")
+
+    return customer_care_df
+
+
+def document_id(row: dict) -> str:
+    """Stable document ID: hash of the question and answer content."""
+    content = f"{row['question']}\x1f{row['answer']}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def question_key(question: str) -> str:
+    """Hash of the question, used to tell updated rows from added ones."""
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()[:16]
+
+
+def generate_documents(customer_care_df: pl.DataFrame) -> list[Document]:
+    """Generate documents from a Polars DataFrame, dropping duplicate rows."""
+    documents = {}
+    for row in customer_care_df.to_dicts():
+        doc_id = document_id(row)
+        if doc_id not in documents:
+            documents[doc_id] = Document(
+                page_content=row["question"],
+                metadata=row,
+                id=doc_id,
+            )
+    logger.info(f"Generated {len(documents)} documents.")
+    return list(documents.values())
+
+
+def read_manifest(index_path: str) -> Optional[dict]:
+    """Read the manifest of the documents in the index, if any."""
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_manifest_documents(faiss_index: FAISS) -> Dict[str, str]:
+    """Map the document IDs in the index to their question key."""
+    return {
+        doc_id: question_key(faiss_index.docstore.search(doc_id).page_content)
+        for doc_id in faiss_index.index_to_docstore_id.values()
+    }
+
+
+def _bm25_params() -> Dict[str, float]:
+    return {"k1": settings.BM25_K1, "b": settings.BM25_B}
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def write_manifest(index_path: str, documents: Dict[str, str]) -> None:
+    """
+    Write the manifest of the documents in the index.
+
+    Args:
+        index_path (str): The index directory.
+        documents (Dict[str, str]): Document IDs mapped to their question key.
+    """
+    _write_json(
+        os.path.join(index_path, MANIFEST_FILE),
+        {
+            "model": settings.EMBEDDINGS_MODEL_NAME,
+            "index": index_spec(),
+            "bm25": _bm25_params(),
+            "documents": documents,
+        },
+    )
+
+
+def record_dataset_hash(index_path: str, dataset_hash: str) -> None:
+    """Record the hash of the raw dataset the index is in sync with."""
+    manifest = read_manifest(index_path)
+    if manifest is None or manifest.get("dataset") == dataset_hash:
+        return
+    manifest["dataset"] = dataset_hash
+    _write_json(os.path.join(index_path, MANIFEST_FILE), manifest)
+
+
+def _index_settings_changed(manifest: Optional[dict], index_path: str) -> bool:
+    """Whether the index must be rebuilt for the index or BM25 settings."""
+    return (
+        manifest is None
+        or manifest.get("index") != index_spec()
+        or manifest.get("bm25") != _bm25_params()
+        or not BM25Index.exists(index_path)
+    )
+
+
+def is_index_in_sync(dataset_hash: str) -> bool:
+    """
+    Whether the index was synced with this raw dataset and the current
+    settings, so that the dataset does not even need to be parsed.
+    """
+    index_path = settings.FAISS_INDEX_PATH
+    manifest = read_manifest(index_path) if os.path.exists(index_path) else None
+    return (
+        manifest is not None
+        and manifest.get("dataset") == dataset_hash
+        and manifest["model"] == settings.EMBEDDINGS_MODEL_NAME
+        and not _index_settings_changed(manifest, index_path)
+    )
+
+
+def _embedded(embeddings: Embeddings, default: int) -> int:
+    """Number of texts sent to the model, `default` without the cache counters."""
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.misses
+    return default
+
+
+def save_faiss_index(faiss_index: FAISS, index_path: str) -> None:
+    """
+    Build the configured index type, then save the index, its BM25 index and
+    its manifest.
+    """
+    apply_index_type(faiss_index)
+    save_compact_index(faiss_index, index_path)
+    texts = [
+        faiss_index.docstore.search(faiss_index.index_to_docstore_id[i]).page_content
+        for i in range(faiss_index.index.ntotal)
+    ]
+    BM25Index.build(texts, settings.BM25_K1, settings.BM25_B).save(index_path)
+    write_manifest(index_path, index_manifest_documents(faiss_index))
+
+
+def create_faiss_index(documents: list[Document]) -> int:
+    """
+    Create or update FAISS index, avoiding duplicates.
+
+    Returns:
+        int: The number of documents embedded by the model (not found in the
+        embedding cache).
+    """
+    embeddings = get_embeddings_model(lazy=True)
+    index_path = settings.FAISS_INDEX_PATH
+
+    if os.path.exists(index_path):
+        # Load existing index
+        logger.info("Loading existing FAISS index...")
+        faiss_index = load_editable_index(index_path, embeddings)
+        # Get existing document IDs
+        existing_ids = set(faiss_index.index_to_docstore_id.values())
+        # Filter new documents
+        new_docs = [doc for doc in documents if doc.id not in existing_ids]
+        if new_docs:
+            logger.info(f"Adding {len(new_docs)} new documents.")
+            to_flat(faiss_index)
+            faiss_index.add_documents(new_docs)
+            save_faiss_index(faiss_index, index_path)
+            logger.info(f"Updated index saved to {index_path}")
+        else:
+            logger.info("No new documents to add.")
+        return _embedded(embeddings, len(new_docs))
+    # Create new index
+    logger.info("Creating new FAISS index...")
+    faiss_index = FAISS.from_documents(documents, embeddings)
+    save_faiss_index(faiss_index, index_path)
+    logger.info(f"New index saved to {index_path}")
+    return _embedded(embeddings, len(documents))
+
+
+def sync_faiss_index(documents: list[Document]) -> int:
+    """
+    Incrementally sync the FAISS index with the dataset.
+
+    The content-hash IDs of the dataset are diffed against the manifest of
+    the index: new or edited rows are embedded and added, rows that are gone
+    (or whose previous version was edited) are deleted. When nothing changed,
+    the embeddings model is never loaded.
+
+    Returns:
+        int: The number of documents embedded by the model (not found in the
+        embedding cache).
+    """
+    index_path = settings.FAISS_INDEX_PATH
+    manifest = read_manifest(index_path) if os.path.exists(index_path) else None
+    if manifest is not None and manifest["model"] != settings.EMBEDDINGS_MODEL_NAME:
+        logger.info(
+            f"Index was built with {manifest['model']}, rebuilding it with "
+            f"{settings.EMBEDDINGS_MODEL_NAME}."
+        )
+        shutil.rmtree(index_path)
+        manifest = None
+    if not os.path.exists(index_path):
+        return create_faiss_index(documents)
+
+    embeddings = get_embeddings_model(lazy=True)
+    faiss_index = None
+    if manifest is None:
+        logger.info("No manifest found, reading document IDs from the index...")
+        faiss_index = load_editable_index(index_path, embeddings)
+        indexed = index_manifest_documents(faiss_index)
+    else:
+        indexed = manifest["documents"]
+
+    target = {doc.id: doc for doc in documents}
+    to_add = [doc for doc_id, doc in target.items() if doc_id not in indexed]
+    to_delete = [doc_id for doc_id in indexed if doc_id not in target]
+    updated = len(
+        {question_key(doc.page_content) for doc in to_add}
+        & {indexed[doc_id] for doc_id in to_delete}
+    )
+    logger.info(
+        f"Sync: {len(to_add) - updated} added, {updated} updated, "
+        f"{len(to_delete) - updated} deleted."
+    )
+    index_changed = _index_settings_changed(manifest, index_path)
+    if not to_add and not to_delete and not index_changed:
+        logger.info("Index is up to date.")
+        return 0
+
+    if faiss_index is None:
+        faiss_index = load_editable_index(index_path, embeddings)
+    if to_add or to_delete:
+        # ANN indexes may not support removals, edit a flat copy and rebuild
+        to_flat(faiss_index)
+    if to_delete:
+        faiss_index.delete(to_delete)
+    if to_add:
+        faiss_index.add_documents(to_add)
+    save_faiss_index(faiss_index, index_path)
+    logger.info(f"Synced index saved to {index_path}")
+    return _embedded(embeddings, len(to_add))
+
+
+def _remote_fingerprint() -> Optional[dict]:
+    """
+    Size and ETag (or content hash) of the remote dataset, from its metadata
+    only. None if they cannot be fetched, e.g. offline.
+    """
+    try:
+        fs, path = fsspec.core.url_to_fs(settings.DATA_URL)
+        info = fs.info(path)
+    except Exception as e:
+        logger.warning(f"Could not check {settings.DATA_URL} for updates: {e!r}")
+        return None
+    lfs = info.get("lfs") or {}
+    return {
+        "url": settings.DATA_URL,
+        "size": info.get("size"),
+        "etag": info.get("ETag") or lfs.get("sha256") or info.get("blob_id"),
+    }
+
+
+def download_raw_dataset(refresh: bool = False) -> str:
+    """
+    Download the raw CSV to `settings.RAW_DATA_PATH` without parsing it.
+
+    The local copy is reused as long as the size and ETag of the remote file
+    are the ones it was downloaded with (or they cannot be checked).
+
+    Args:
+        refresh (bool): Download the dataset again anyway.
+    """
+    fingerprint_path = settings.RAW_DATA_PATH + ".json"
+    fingerprint = None
+    if os.path.exists(settings.RAW_DATA_PATH) and not refresh:
+        fingerprint = _remote_fingerprint()
+        if fingerprint is None or not os.path.exists(fingerprint_path):
+            return settings.RAW_DATA_PATH
+        with open(fingerprint_path, encoding="utf-8") as f:
+            if json.load(f) == fingerprint:
+                return settings.RAW_DATA_PATH
+        logger.info("The remote dataset changed.")
+    settings.ensure_directories()
+    logger.info(f"Downloading {settings.DATA_URL}...")
+    tmp_path = settings.RAW_DATA_PATH + ".tmp"
+    with fsspec.open(settings.DATA_URL, "rb") as src, open(tmp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, length=1 << 20)
+    os.replace(tmp_path, settings.RAW_DATA_PATH)
+    fingerprint = fingerprint or _remote_fingerprint()
+    if fingerprint is not None:
+        _write_json(fingerprint_path, fingerprint)
+    return settings.RAW_DATA_PATH
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_dataset_batches(
+    path: str, skip_rows: int = 0, batch_size: int = settings.INDEXING_BATCH_SIZE
+) -> Iterator[Tuple[int, pl.DataFrame]]:
+    """
+    Read the raw CSV in batches.
+
+    Args:
+        path (str): The raw CSV path.
+        skip_rows (int): Number of data rows to skip (already indexed).
+        batch_size (int): Number of rows per batch.
+
+    Yields:
+        Tuple[int, pl.DataFrame]: The number of raw rows read in the batch and
+        the preprocessed batch.
+    """
+    reader = pl.read_csv_batched(
+        path,
+        columns=["instruction", "response"],
+        batch_size=batch_size,
+        skip_rows_after_header=skip_rows,
+    )
+    while True:
+        batches = reader.next_batches(1)
+        if not batches:
+            return
+        for batch in batches:
+            yield batch.height, preprocess_dataset(batch)
+
+
+def embed_texts(
+    embeddings: Embeddings,
+    texts: list[str],
+    executor: ThreadPoolExecutor,
+    workers: int,
+) -> list[list[float]]:
+    """Embed texts, split across `workers` concurrent encode calls."""
+    chunk_size = max(1, -(-len(texts) // workers))
+    chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    vectors = []
+    for chunk_vectors in executor.map(embeddings.embed_documents, chunks):
+        vectors.extend(chunk_vectors)
+    return vectors
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process in MB (0 if unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _checkpoint_paths() -> Tuple[str, str]:
+    index_path = settings.FAISS_INDEX_PATH
+    return index_path + ".partial", index_path + ".checkpoint.json"
+
+
+def _save_checkpoint(faiss_index: FAISS, rows_read: int) -> None:
+    """Save the partial index, then atomically record the progress."""
+    partial_path, checkpoint_path = _checkpoint_paths()
+    faiss_index.save_local(partial_path)
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"rows_read": rows_read}, f)
+    os.replace(tmp_path, checkpoint_path)
+    logger.info(f"Checkpoint saved after {rows_read} rows.")
+
+
+def create_faiss_index_streaming() -> int:
+    """
+    Create or update the FAISS index from the dataset read in batches.
+
+    Each batch is embedded with `settings.INDEXING_WORKERS` concurrent encode
+    calls and appended to the index, so peak memory is bounded by the batch
+    size instead of the dataset size. A checkpoint is saved every
+    `settings.INDEXING_CHECKPOINT_EVERY` batches and an interrupted run
+    resumes from the last one.
+
+    Returns:
+        int: The number of documents embedded.
+    """
+    embeddings = get_embeddings_model(settings.EMBEDDINGS_BATCH_SIZE, lazy=True)
+    index_path = settings.FAISS_INDEX_PATH
+    partial_path, checkpoint_path = _checkpoint_paths()
+
+    faiss_index = None
+    rows_read = 0
+    existing_ids = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding="utf-8") as f:
+            rows_read = json.load(f)["rows_read"]
+        logger.info(f"Resuming from checkpoint after {rows_read} rows.")
+        faiss_index = FAISS.load_local(
+            partial_path, embeddings, allow_dangerous_deserialization=True
+        )
+    elif os.path.exists(index_path):
+        logger.info("Loading existing FAISS index...")
+        faiss_index = load_editable_index(index_path, embeddings)
+    if faiss_index is not None:
+        to_flat(faiss_index)
+        existing_ids = set(faiss_index.index_to_docstore_id.values())
+
+    raw_path = download_raw_dataset()
+    embedded = 0
+    with ThreadPoolExecutor(max_workers=settings.INDEXING_WORKERS) as executor:
+        for batch_number, (batch_rows, batch_df) in enumerate(
+            iter_dataset_batches(raw_path, skip_rows=rows_read), start=1
+        ):
+            rows_read += batch_rows
+            rows = []
+            for row in batch_df.to_dicts():
+                doc_id = document_id(row)
+                if doc_id not in existing_ids:
+                    existing_ids.add(doc_id)
+                    rows.append((doc_id, row))
+            if rows:
+                texts = [row["question"] for _, row in rows]
+                vectors = embed_texts(
+                    embeddings, texts, executor, settings.INDEXING_WORKERS
+                )
+                text_embeddings = list(zip(texts, vectors))
+                metadatas = [row for _, row in rows]
+                ids = [doc_id for doc_id, _ in rows]
+                if faiss_index is None:
+                    faiss_index = FAISS.from_embeddings(
+                        text_embeddings, embeddings, metadatas=metadatas, ids=ids
+                    )
+                else:
+                    faiss_index.add_embeddings(
+                        text_embeddings, metadatas=metadatas, ids=ids
+                    )
+                embedded += len(rows)
+            logger.info(f"Indexed {rows_read} rows ({embedded} embedded).")
+            if embedded and batch_number % settings.INDEXING_CHECKPOINT_EVERY == 0:
+                _save_checkpoint(faiss_index, rows_read)
+
+    if faiss_index is None:
+        logger.info("No documents to index.")
+        return 0
+    if embedded or os.path.exists(checkpoint_path):
+        save_faiss_index(faiss_index, index_path)
+        logger.info(f"Index saved to {index_path}")
+    else:
+        logger.info("No new documents to add.")
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+        shutil.rmtree(partial_path, ignore_errors=True)
+    return embedded
+
+
+def embed_and_index(mode: str = settings.INDEXING_MODE, refresh: bool = False):
+    """
+    Embed and index the dataset.
+
+    Args:
+        mode (str): Indexing mode, see `settings.INDEXING_MODE`.
+        refresh (bool): Download the dataset again even if it did not change.
+    """
+    start = time.perf_counter()
+    if mode == "streaming":
+        embedded = create_faiss_index_streaming()
+    elif mode == "sync":
+        raw_path = download_raw_dataset(refresh)
+        dataset_hash = file_hash(raw_path)
+        if is_index_in_sync(dataset_hash):
+            logger.info("Dataset unchanged since the last sync, index is up to date.")
+            embedded = 0
+        else:
+            documents = generate_documents(download_and_preprocess_dataset(raw_path))
+            embedded = sync_faiss_index(documents)
+            record_dataset_hash(settings.FAISS_INDEX_PATH, dataset_hash)
+    else:
+        # Download and preprocess the dataset
+        customer_care_df = download_and_preprocess_dataset(
+            download_raw_dataset(refresh)
+        )
+
+        # Generate documents
+        documents = generate_documents(customer_care_df)
+
+        # Create or update the FAISS index
+        embedded = create_faiss_index(documents)
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Indexing finished in {elapsed:.1f}s: {embedded} documents embedded "
+        f"({embedded / elapsed:.1f} docs/sec), peak RSS {peak_rss_mb():.0f} MB."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed and index the dataset.")
+    parser.add_argument(
+        "--mode",
+        choices=["full", "streaming", "sync"],
+        default=settings.INDEXING_MODE,
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Download the dataset again even if it did not change.",
+    )
+    args = parser.parse_args()
+    settings.ensure_directories()
+    embed_and_index(args.mode, args.refresh)
@@ -0,0 +1,230 @@
+"""
+Compact, pickle-free on-disk format of the FAISS vector store.
+
+`FAISS.save_local` pickles the whole docstore, so every process loading the
+index unpickles a Python object per document. The compact format instead
+stores, in the index directory:
+
+- `index.faiss`: the FAISS index, memory-mapped read-only when serving. FAISS
+  only memory-maps inverted lists, so exact flat indexes are stored as an
+  equivalent single-list IVF index.
+- `docstore.arrow`: an uncompressed Arrow IPC file with one row per index
+  position (`id`, `page_content` and `metadata` as JSON), memory-mapped and
+  decoded only for the hits of a search.
+- `store.json`: the vector store options.
+
+Processes serving the same index share its pages through the OS page cache.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from typing import Iterator, List, Union
+
+import faiss
+import numpy as np
+import pyarrow as pa
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.arrow"
+STORE_META_FILE = "store.json"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+
+class ArrowDocstore(Docstore):
+    """Read-only docstore over a memory-mapped Arrow file, addressed by row."""
+
+    def __init__(self, path: str):
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        self._ids = table.column("id")
+        self._contents = table.column("page_content")
+        self._metadata = table.column("metadata")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def ids(self) -> List[str]:
+        """Get the document IDs, in index order."""
+        return self._ids.to_pylist()
+
+    def search(self, search: Union[int, str]) -> Union[Document, str]:
+        """Get the document at a row of the docstore."""
+        if not isinstance(search, (int, np.integer)) or not 0 <= search < len(self):
+            return f"ID {search} not found."
+        return Document(
+            id=self._ids[search].as_py(),
+            page_content=self._contents[search].as_py(),
+            metadata=json.loads(self._metadata[search].as_py()),
+        )
+
+
+class PositionalIds(Mapping):
+    """Identity `index_to_docstore_id` mapping: index positions are rows."""
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, position: int) -> int:
+        if not 0 <= position < self._size:
+            raise KeyError(position)
+        return int(position)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def is_compact(index_path: str) -> bool:
+    """Whether the index directory is in the compact format."""
+    return os.path.exists(os.path.join(index_path, DOCSTORE_FILE))
+
+
+def _to_mappable(index: faiss.Index) -> faiss.Index:
+    """Wrap a flat index as a single-list IVF index, which FAISS can mmap."""
+    if not isinstance(index, faiss.IndexFlat):
+        return index
+    # A single centroid: every vector goes to the same list, no training
+    quantizer = faiss.IndexFlat(index.d, index.metric_type)
+    quantizer.add(np.zeros((1, index.d), dtype=np.float32))
+    ivf = faiss.IndexIVFFlat(quantizer, index.d, 1, index.metric_type)
+    ivf.own_fields = True
+    quantizer.this.disown()
+    if index.ntotal:
+        ivf.add(index.reconstruct_n(0, index.ntotal))
+    return ivf
+
+
+def _from_mappable(index: faiss.Index) -> faiss.Index:
+    """Turn a single-list IVF index back into the flat index it wraps."""
+    if not isinstance(index, faiss.IndexIVFFlat) or index.nlist != 1:
+        return index
+    flat = faiss.IndexFlat(index.d, index.metric_type)
+    if index.ntotal:
+        index.make_direct_map()
+        flat.add(index.reconstruct_n(0, index.ntotal))
+    return flat
+
+
+def save_compact_index(vector_store: FAISS, index_path: str) -> None:
+    """
+    Save a vector store in the compact format, replacing any pickled docstore.
+
+    Args:
+        vector_store (FAISS): The vector store.
+        index_path (str): The index directory.
+    """
+    os.makedirs(index_path, exist_ok=True)
+    ids, contents, metadata = [], [], []
+    for position in range(vector_store.index.ntotal):
+        doc_id = vector_store.index_to_docstore_id[position]
+        doc = vector_store.docstore.search(doc_id)
+        ids.append(str(doc_id))
+        contents.append(doc.page_content)
+        metadata.append(json.dumps(doc.metadata))
+    table = pa.table(
+        {
+            "id": pa.array(ids, pa.string()),
+            "page_content": pa.array(contents, pa.string()),
+            "metadata": pa.array(metadata, pa.string()),
+        }
+    )
+
+    docstore_path = os.path.join(index_path, DOCSTORE_FILE)
+    with pa.OSFile(docstore_path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(docstore_path + ".tmp", docstore_path)
+
+    faiss_path = os.path.join(index_path, INDEX_FILE)
+    faiss.write_index(_to_mappable(vector_store.index), faiss_path + ".tmp")
+    os.replace(faiss_path + ".tmp", faiss_path)
+
+    meta_path = os.path.join(index_path, STORE_META_FILE)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "normalize_L2": vector_store._normalize_L2,
+                "distance_strategy": vector_store.distance_strategy.value,
+            },
+            f,
+        )
+    os.replace(meta_path + ".tmp", meta_path)
+
+    legacy_path = os.path.join(index_path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def _read_store_meta(index_path: str) -> dict:
+    with open(os.path.join(index_path, STORE_META_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_compact_index(
+    index_path: str, embeddings: Embeddings, mmap: bool = True
+) -> FAISS:
+    """
+    Load a compact index for serving.
+
+    The FAISS index and the docstore are memory-mapped, so only the pages
+    touched by searches are read, and they are shared between processes.
+    The vector store is read-only.
+
+    Args:
+        index_path (str): The index directory.
+        embeddings (Embeddings): The embeddings model of the index.
+        mmap (bool): Memory-map the FAISS index instead of reading it.
+    """
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(index_path, INDEX_FILE), flags)
+    meta = _read_store_meta(index_path)
+    return FAISS(
+        embeddings,
+        index,
+        ArrowDocstore(os.path.join(index_path, DOCSTORE_FILE)),
+        PositionalIds(index.ntotal),
+        normalize_L2=meta["normalize_L2"],
+        distance_strategy=DistanceStrategy(meta["distance_strategy"]),
+    )
+
+
+def load_editable_index(index_path: str, embeddings: Embeddings) -> FAISS:
+    """
+    Load an index into memory so that documents can be added or deleted.
+
+    Both the compact and the pickled (`FAISS.save_local`) formats are read.
+
+    Args:
+        index_path (str): The index directory.
+        embeddings (Embeddings): The embeddings model of the index.
+    """
+    if not is_compact(index_path):
+        logger.info("Loading index in the pickled format...")
+        return FAISS.load_local(
+            index_path, embeddings, allow_dangerous_deserialization=True
+        )
+    index = _from_mappable(faiss.read_index(os.path.join(index_path, INDEX_FILE)))
+    arrow_docstore = ArrowDocstore(os.path.join(index_path, DOCSTORE_FILE))
+    ids = arrow_docstore.ids()
+    docstore = InMemoryDocstore(
+        {doc_id: arrow_docstore.search(row) for row, doc_id in enumerate(ids)}
+    )
+    meta = _read_store_meta(index_path)
+    return FAISS(
+        embeddings,
+        index,
+        docstore,
+        dict(enumerate(ids)),
+        normalize_L2=meta["normalize_L2"],
+        distance_strategy=DistanceStrategy(meta["distance_strategy"]),
+    )
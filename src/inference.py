@@ -0,0 +1,254 @@
+"""
+Inference backend of the embeddings model and the llm_guard scanners.
+
+With `settings.INFERENCE_BACKEND = "onnx"`, the models run on ONNX Runtime
+instead of PyTorch. They are exported (and int8 dynamically quantized if
+`settings.ONNX_QUANTIZE`) at build time into `settings.ONNX_MODELS_DIR`:
+
+    python -m src.inference
+
+which requires `optimum[onnxruntime]`. Each exported model directory holds an
+`export.json` naming the ONNX file to load, the app never exports at runtime.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import re
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from src.config import settings
+
+EXPORT_FILE = "export.json"
+
+# Default model of each transformer scanner: module, attribute, model task
+SCANNER_MODELS = {
+    "PromptInjection": (
+        "llm_guard.input_scanners.prompt_injection",
+        "V2_MODEL",
+        "text-classification",
+    ),
+    "Toxicity": (
+        "llm_guard.input_scanners.toxicity",
+        "DEFAULT_MODEL",
+        "text-classification",
+    ),
+    "LanguageSame": (
+        "llm_guard.input_scanners.language",
+        "DEFAULT_MODEL",
+        "text-classification",
+    ),
+    "Relevance": (
+        "llm_guard.output_scanners.relevance",
+        "MODEL_EN_BGE_BASE",
+        "feature-extraction",
+    ),
+}
+
+
+def model_dir(name: str) -> str:
+    """Directory of an exported model."""
+    return os.path.join(settings.ONNX_MODELS_DIR, re.sub(r"[^\w.-]", "_", name))
+
+
+def configure_threads() -> None:
+    """Apply `settings.INFERENCE_NUM_THREADS` to the PyTorch backend."""
+    if settings.INFERENCE_BACKEND == "torch" and settings.INFERENCE_NUM_THREADS > 0:
+        import torch
+
+        torch.set_num_threads(settings.INFERENCE_NUM_THREADS)
+
+
+def session_options():
+    """ONNX Runtime session options with the configured thread count."""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if settings.INFERENCE_NUM_THREADS > 0:
+        options.intra_op_num_threads = settings.INFERENCE_NUM_THREADS
+        options.inter_op_num_threads = 1
+    return options
+
+
+def read_export(name: str) -> Dict[str, Any]:
+    """
+    Read the export description of a model.
+
+    Raises:
+        FileNotFoundError: If the model was not exported.
+    """
+    path = os.path.join(model_dir(name), EXPORT_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No ONNX export of {name} in {settings.ONNX_MODELS_DIR}, "
+            "run `python -m src.inference` first."
+        )
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def embeddings_model_id() -> str:
+    """Identifier of the embeddings model and backend, used as cache key."""
+    if settings.INFERENCE_BACKEND == "torch":
+        return settings.EMBEDDINGS_MODEL_NAME
+    export = read_export(settings.EMBEDDINGS_MODEL_NAME)
+    return f"{settings.EMBEDDINGS_MODEL_NAME}@onnx-{export['quantization']}"
+
+
+def embeddings_kwargs() -> Dict[str, Any]:
+    """
+    Keyword arguments of `HuggingFaceEmbeddings` for the configured backend.
+    """
+    if settings.INFERENCE_BACKEND == "torch":
+        return {"model_name": settings.EMBEDDINGS_MODEL_NAME}
+    export = read_export(settings.EMBEDDINGS_MODEL_NAME)
+    return {
+        "model_name": model_dir(settings.EMBEDDINGS_MODEL_NAME),
+        "model_kwargs": {
+            "backend": "onnx",
+            "device": "cpu",
+            "model_kwargs": {
+                "file_name": export["file_name"],
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options(),
+            },
+        },
+    }
+
+
+def _default_model(scanner: str):
+    import importlib
+
+    module, attribute, _ = SCANNER_MODELS[scanner]
+    return getattr(importlib.import_module(module), attribute)
+
+
+def scanner_kwargs(scanner: str) -> Dict[str, Any]:
+    """
+    Keyword arguments of an llm_guard scanner for the configured backend.
+
+    Args:
+        scanner (str): Class name of the scanner, e.g. "PromptInjection".
+
+    Returns:
+        Dict[str, Any]: Empty for PyTorch, else the exported ONNX model and
+        `use_onnx=True`.
+    """
+    if settings.INFERENCE_BACKEND == "torch" or scanner not in SCANNER_MODELS:
+        return {}
+    model = _default_model(scanner)
+    export = read_export(model.path)
+    onnx_model = dataclasses.replace(
+        model,
+        onnx_path=model_dir(model.path),
+        onnx_subfolder="",
+        onnx_revision=None,
+        onnx_filename=export["file_name"],
+        kwargs={**model.kwargs, "session_options": session_options()},
+    )
+    return {"model": onnx_model, "use_onnx": True}
+
+
+def _find_onnx(path: str, file_name: str = "model.onnx") -> str:
+    for root, _, files in os.walk(path):
+        if file_name in files:
+            return os.path.relpath(os.path.join(root, file_name), path)
+    raise FileNotFoundError(f"No {file_name} exported in {path}")
+
+
+def _quantize(path: str, file_name: str) -> str:
+    """
+    Quantize an ONNX model to int8 (dynamic quantization) next to it.
+
+    Returns:
+        str: The quantized file, relative to `path`.
+    """
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    subfolder = os.path.dirname(file_name)
+    quantizer = ORTQuantizer.from_pretrained(
+        os.path.join(path, subfolder), file_name=os.path.basename(file_name)
+    )
+    config = getattr(AutoQuantizationConfig, settings.ONNX_QUANTIZATION_CONFIG)(
+        is_static=False, per_channel=False
+    )
+    quantizer.quantize(
+        save_dir=os.path.join(path, subfolder), quantization_config=config
+    )
+    return os.path.join(subfolder, "model_quantized.onnx")
+
+
+def _write_export(name: str, path: str, file_name: str) -> None:
+    if settings.ONNX_QUANTIZE:
+        file_name = _quantize(path, file_name)
+    export = {
+        "model": name,
+        "file_name": file_name,
+        "quantization": f"qint8-{settings.ONNX_QUANTIZATION_CONFIG}"
+        if settings.ONNX_QUANTIZE
+        else "fp32",
+    }
+    with open(os.path.join(path, EXPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(export, f, indent=2)
+    logger.info(f"Exported {name} to {os.path.join(path, file_name)}")
+
+
+def export_embeddings_model(model_name: Optional[str] = None) -> None:
+    """Export the sentence-transformers embeddings model to ONNX."""
+    from sentence_transformers import SentenceTransformer
+
+    model_name = model_name or settings.EMBEDDINGS_MODEL_NAME
+    path = model_dir(model_name)
+    model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+    model.save_pretrained(path)
+    _write_export(model_name, path, _find_onnx(path))
+
+
+def export_scanner_model(scanner: str) -> None:
+    """Export the default model of an llm_guard scanner to ONNX."""
+    from optimum.onnxruntime import (
+        ORTModelForFeatureExtraction,
+        ORTModelForSequenceClassification,
+    )
+    from transformers import AutoTokenizer
+
+    model = _default_model(scanner)
+    task = SCANNER_MODELS[scanner][2]
+    model_class = (
+        ORTModelForFeatureExtraction
+        if task == "feature-extraction"
+        else ORTModelForSequenceClassification
+    )
+    path = model_dir(model.path)
+    ort_model = model_class.from_pretrained(
+        model.path, subfolder=model.subfolder, revision=model.revision, export=True
+    )
+    ort_model.save_pretrained(path)
+    AutoTokenizer.from_pretrained(
+        model.path, subfolder=model.subfolder, revision=model.revision
+    ).save_pretrained(path)
+    _write_export(model.path, path, _find_onnx(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the models to ONNX.")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        choices=["embeddings", *SCANNER_MODELS],
+        default=["embeddings", *SCANNER_MODELS],
+    )
+    args = parser.parse_args()
+    for name in args.models:
+        if name == "embeddings":
+            export_embeddings_model()
+        else:
+            export_scanner_model(name)
+
+
+if __name__ == "__main__":
+    main()